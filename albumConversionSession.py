@@ -15,13 +15,21 @@ import reportlab.lib.pagesizes
 from reportlab.pdfgen import canvas
 
 from albumIndex import AlbumIndex
+from assetPipeline import createAssetPipeline
 from ceweInfo import AlbumInfo, CeweInfo, ProductStyle
+from cewePageResolver import resolvePages
+from configUtils import getConfigurationBool, getConfigurationInt
 from conversionSetup import prepareConversion
 from conversionState import ConversionState
 from extraLoggers import ConversionMessageCounters, configlogger, mustsee
+from imageCache import DEFAULT_DECODED_IMAGE_CACHE_MB, DecodedImageCache
+from outputBudget import OUTPUT_PROFILES, planImageBudgets, reportOutputSize
 from pageNumbering import PageNumberingInfo
+from persistentCache import (DEFAULT_CLIPART_CACHE_MB, DEFAULT_PASSEPARTOUT_MASK_CACHE_MB,
+                             DEFAULT_PREPARED_IMAGE_CACHE_MB, PersistentBlobCache, getCacheDirectory)
 from pages import processPages
 from renderContext import RenderContext
+from vectorClipart import isVectorClipartAvailable
 from versionInfo import logVersionInformation
 
 
@@ -35,7 +43,8 @@ class AlbumConversionSession:
 
     def __init__(self, albumName, keepDoublePages, pageNumbers, mcfxTmpDir,
                  appDataDir, outputFileName, mcfToReportlab, imageQuality,
-                 pilAntialias, automaticWindows=False):
+                 pilAntialias, automaticWindows=False, jobs=1, targetSize=None,
+                 profile=None):
         self.album_name = albumName
         self.keep_double_pages = keepDoublePages
         self.page_numbers = pageNumbers
@@ -46,6 +55,9 @@ class AlbumConversionSession:
         self.image_quality = imageQuality
         self.pil_antialias = pilAntialias
         self.automatic_windows = automaticWindows
+        self.jobs = jobs
+        self.target_size = targetSize
+        self.profile = profile
         self.automatic_log_file_name = None
         self.automatic_log_handler = None
         self.automatic_loggers = []
@@ -64,6 +76,25 @@ class AlbumConversionSession:
 
     def __exit__(self, exceptionType, exceptionValue, traceback):
         """Report diagnostics and release files owned by this session."""
+        logging.info(self.state.decoded_images.summaryText())
+        self.state.decoded_images.clear()
+        if self.state.prepared_images is not None:
+            logging.info(self.state.prepared_images.summaryText('Prepared image'))
+        logging.info(self.state.rasterised_cliparts.summaryText())
+        if self.state.rasterised_cliparts.persistent_cache is not None:
+            logging.info(self.state.rasterised_cliparts.persistent_cache.summaryText('Rasterised clipart'))
+        logging.info(self.state.passepartout_masks.summaryText())
+        if self.state.passepartout_masks.persistent_cache is not None:
+            logging.info(self.state.passepartout_masks.persistent_cache.summaryText('Passepartout mask'))
+        if self.state.vector_cliparts.placements > 0:
+            logging.info(self.state.vector_cliparts.summaryText())
+        logging.info(self.state.resource_locator.summaryText())
+        if self.state.font_resolver is not None:
+            logging.info(self.state.font_resolver.summaryText())
+        if self.state.deferred_fonts is not None:
+            logging.info(self.state.deferred_fonts.summaryText())
+            self.state.deferred_fonts.font_metadata.save()
+        self.state.passepartout_index.close()
         objectsCollected = gc.collect()
         logging.info(f'GC collected objects : {objectsCollected}')
 
@@ -76,7 +107,7 @@ class AlbumConversionSession:
 
         unpackedFolder = self.setup.unpacked_folder if self.setup is not None else None
         try:
-            cleanUpTemporaryFiles(self.state.temporary_files, unpackedFolder)
+            cleanUpTemporaryFiles(unpackedFolder)
         finally:
             self._closeAutomaticLog()
         return False
@@ -131,6 +162,33 @@ class AlbumConversionSession:
             self.album_name, self.mcfx_tmp_dir, self.app_data_dir, self.state,
             self.automatic_windows)
         albumIndex = self._createAlbumIndex()
+        decodedImageCacheMB = getConfigurationInt(
+            self.setup.default_config_section, 'decodedImageCacheMB',
+            str(DEFAULT_DECODED_IMAGE_CACHE_MB), 0)
+        self.state.decoded_images = DecodedImageCache(decodedImageCacheMB * 1024 * 1024)
+        preparedImageCacheMB = getConfigurationInt(
+            self.setup.default_config_section, 'preparedImageCacheMB',
+            str(DEFAULT_PREPARED_IMAGE_CACHE_MB), 0)
+        if preparedImageCacheMB > 0:
+            self.state.prepared_images = PersistentBlobCache(
+                getCacheDirectory(self.app_data_dir, 'preparedImages'),
+                preparedImageCacheMB * 1024 * 1024)
+        clipartCacheMB = getConfigurationInt(
+            self.setup.default_config_section, 'clipartCacheMB',
+            str(DEFAULT_CLIPART_CACHE_MB), 0)
+        if clipartCacheMB > 0:
+            self.state.rasterised_cliparts.persistent_cache = PersistentBlobCache(
+                getCacheDirectory(self.app_data_dir, 'rasterisedCliparts'),
+                clipartCacheMB * 1024 * 1024)
+        passepartoutMaskCacheMB = getConfigurationInt(
+            self.setup.default_config_section, 'passepartoutMaskCacheMB',
+            str(DEFAULT_PASSEPARTOUT_MASK_CACHE_MB), 0)
+        if passepartoutMaskCacheMB > 0:
+            self.state.passepartout_masks.persistent_cache = PersistentBlobCache(
+                getCacheDirectory(self.app_data_dir, 'passepartoutMasks'),
+                passepartoutMaskCacheMB * 1024 * 1024)
+        self.state.passepartout_index.database_path = str(
+            getCacheDirectory(self.app_data_dir, 'indexes') / 'passepartouts.sqlite')
 
         articleConfigElement = self.setup.fotobook.find('articleConfig')
         if articleConfigElement is None:
@@ -142,12 +200,31 @@ class AlbumConversionSession:
         pageSize, productStyle = self._getProductDetails()
         pageCount = self._getPageCount(articleConfigElement, productStyle)
         imageFolder = self.setup.fotobook.get('imagedir')
+        maxImageMegapixels = getConfigurationInt(
+            self.setup.default_config_section, 'maxImageMegapixels', '0', 0)
+        imageResolution = self.setup.image_resolution
+        backgroundResolution = self.setup.background_resolution
+        imageQuality = self.image_quality
+        if self.profile is not None:
+            outputProfile = OUTPUT_PROFILES[self.profile]
+            imageResolution = outputProfile.image_resolution
+            backgroundResolution = outputProfile.background_resolution
+            imageQuality = outputProfile.image_quality
+            logging.info(f'Using the {self.profile} profile: images {imageResolution} dpi, '
+                         f'backgrounds {backgroundResolution} dpi, JPEG quality {imageQuality}')
         renderContext = RenderContext(
-            self.mcf_to_reportlab, self.setup.image_resolution, self.image_quality,
-            self.setup.background_resolution, self.pil_antialias,
+            self.mcf_to_reportlab, imageResolution, imageQuality,
+            backgroundResolution, self.pil_antialias,
             self.setup.default_config_section, self.setup.clipart_files,
             self.setup.clipart_paths, self.setup.passepartout_folders,
-            self.setup.line_scales)
+            self.setup.line_scales, maxImageMegapixels * 1000 * 1000)
+        # getConfigurationBool returns its string default when there is no configuration.
+        if getConfigurationBool(self.setup.default_config_section, 'vectorCliparts', 'False') is True:
+            if isVectorClipartAvailable():
+                renderContext.vector_cliparts = True
+            else:
+                logging.warning('vectorCliparts = True needs the svglib package, which is not installed; '
+                                'clip art is rasterised instead')
 
         pdf = canvas.Canvas(self.output_file_name, pagesize=pageSize)
         pdf.setTitle(self.setup.album_title)
@@ -155,16 +232,38 @@ class AlbumConversionSession:
         processElementsForAlbum = partial(
             processElements, state=self.state, albumIndex=albumIndex)
 
-        processPages(
-            self.setup.fotobook, self.setup.mcf_base_folder, imageFolder,
-            productStyle, pdf, pageCount, self.page_numbers,
-            self.setup.available_fonts, self.setup.background_locations, self.state,
-            renderContext, pageNumberingInfo, processElementsForAlbum)
+        resolvedPages = None
+        if self.jobs > 1 or self.target_size is not None:
+            # Planning uses the same resolved pages which are rendered, so
+            # resolution messages are not repeated.
+            resolvedPages = list(resolvePages(
+                self.setup.fotobook, productStyle, pageCount, self.page_numbers))
+        if self.target_size is not None:
+            self.state.image_budgets = planImageBudgets(
+                self.target_size, resolvedPages, self.setup.fotobook, productStyle, imageFolder,
+                self.setup.mcf_base_folder, self.setup.background_locations, renderContext, self.state)
+        if self.jobs > 1:
+            self.state.photo_pipeline = createAssetPipeline(
+                self.jobs, resolvedPages, self.setup.fotobook, productStyle, imageFolder,
+                self.setup.mcf_base_folder, renderContext, self.state)
+        try:
+            processPages(
+                self.setup.fotobook, self.setup.mcf_base_folder, imageFolder,
+                productStyle, pdf, pageCount, self.page_numbers,
+                self.setup.available_fonts, self.setup.background_locations, self.state,
+                renderContext, pageNumberingInfo, processElementsForAlbum, resolvedPages)
+        finally:
+            if self.state.photo_pipeline is not None:
+                self.state.photo_pipeline.shutdown()
+                logging.info(self.state.photo_pipeline.summaryText())
+                self.state.photo_pipeline = None
 
         try:
             pdf.save()
         except Exception as exception:  # pylint: disable=broad-exception-caught
             logging.error(f'Could not save the output file: {str(exception)}')
+        if self.target_size is not None:
+            reportOutputSize(self.output_file_name, self.target_size)
 
         self._createIndexOutput(albumIndex, pageSize)
         if productStyle == ProductStyle.MemoryCard:
@@ -226,10 +325,11 @@ class AlbumConversionSession:
             os.remove(indexPngFileName)
 
 
-def cleanUpTemporaryFiles(fileList, unpackedFolder):
-    """Remove temporary images and unpacked MCFX data owned by a session."""
-    for temporaryFileName in fileList:
-        if os.path.exists(temporaryFileName):
-            os.remove(temporaryFileName)
+def cleanUpTemporaryFiles(unpackedFolder):
+    """Remove the unpacked MCFX data owned by a session.
+
+    Images are handed to ReportLab in memory, so this is the only temporary
+    data a conversion leaves on disk.
+    """
     if unpackedFolder is not None:
         unpackedFolder.cleanup()
@@ -0,0 +1,222 @@
+"""Prepare photos in worker processes ahead of the single-threaded PDF canvas.
+
+ReportLab's canvas must be driven from one thread, but preparing a photo's
+pixels does not involve the canvas at all.  The pipeline walks the resolved
+pages in drawing order, describes each image element with
+:func:`imageareas.getPhotoPreparation`, and keeps a bounded number of those
+preparations running in a process pool.  :func:`photoPreparation.getPreparedPhoto`
+then takes each result as the page renderer reaches the image area.
+
+Planning deliberately over-approximates: it visits every image element of
+each page element which may be drawn.  An element which the renderer skips
+is dropped from the window when a later element is requested.  When the
+renderer asks for an element beyond the window, for example after skipping
+a page which failed, the window moves on to follow it.  A result which is
+not planned, or whose worker failed, is simply prepared on the canvas thread
+as it would be without a pipeline, which also reports any error.
+"""
+
+import logging
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from conversionState import ConversionState
+from imageareas import (getAreaSize, getImagePath, getPassepartoutLayout, getPhotoPreparation,
+                        iterPageImageTags)
+from pdfImages import isUnchangedJpegUsable
+from passepartoutMasks import PassepartoutMaskCache
+from persistentCache import PersistentBlobCache
+from photoPreparation import preparePhotoData
+from renderContext import RenderContext
+
+# Preparations allowed to run or wait for the canvas, per worker process.
+PIPELINE_WINDOW_PER_JOB = 2
+# Planned preparations beyond the window searched for a requested one.
+PIPELINE_LOOKAHEAD = 200
+
+
+class _WorkerLogRecords(logging.Handler):
+    """Collects a worker's log records so the main process can report them."""
+
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        # Format the message now: its arguments may not be picklable.
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        self.records.append(record)
+
+
+_workerLogRecords = None
+_workerPassepartoutMasks = None
+
+
+def _initialiseWorker(logLevel, maskCacheDirectory=None, maskCacheBytes=0):
+    global _workerLogRecords, _workerPassepartoutMasks # pylint: disable=global-statement
+    _workerLogRecords = _WorkerLogRecords()
+    # Each worker process serves one conversion, so it keeps its own masks
+    # and shares the persistent tier with the main process.
+    _workerPassepartoutMasks = PassepartoutMaskCache(
+        persistentCache=PersistentBlobCache(maskCacheDirectory, maskCacheBytes)
+        if maskCacheDirectory is not None else None)
+    rootLogger = logging.getLogger()
+    for handler in list(rootLogger.handlers):
+        rootLogger.removeHandler(handler)
+    rootLogger.addHandler(_workerLogRecords)
+    rootLogger.setLevel(logLevel)
+
+
+def _preparePhotoInWorker(preparation):
+    _workerLogRecords.records = []
+    return preparePhotoData(preparation, _workerPassepartoutMasks), _workerLogRecords.records
+
+
+def planPhotoPreparations(resolvedPages, fotobook, productStyle, imageDirectory, mcfBaseFolder,
+                          context: RenderContext, state: ConversionState):
+    """Yield the preparation of each photo which is likely to be drawn, in order."""
+    for resolvedPage, _page, area, imageTag in iterPageImageTags(resolvedPages, fotobook, productStyle):
+        try:
+            areaWidth, areaHeight = getAreaSize(area)
+            imagePath = getImagePath(imageTag, imageDirectory, mcfBaseFolder)
+            layout = getPassepartoutLayout(imageTag, areaHeight, areaWidth, context, state,
+                                           warnIfMissing=False)
+            preparation = getPhotoPreparation(
+                imageTag, area, areaHeight, areaWidth, imagePath, resolvedPage.page_type,
+                layout, context, state.image_budgets.get(imageTag))
+        except Exception: # pylint: disable=broad-exception-caught
+            # The renderer reports the problem when it reaches the area.
+            continue
+        yield preparation
+
+
+class AssetPipeline:
+    """Photo preparations running in a process pool, consumed in page order."""
+
+    def __init__(self, executor, preparations, window, state: ConversionState):
+        self._executor = executor
+        self._planned = iter(preparations)
+        self._window = window
+        self._state = state
+        self._pending = deque()
+        self._lookahead = deque()
+        self._futures = {}
+        self.prepared = 0
+        self.unplanned = 0
+        self._fill()
+
+    def _needsWorker(self, preparation):
+        try:
+            if (preparation.mayBeUnchanged()
+                    and isUnchangedJpegUsable(preparation.image_path, preparation.crop_box)):
+                return False
+            cache = self._state.prepared_images
+            if cache is not None and cache.contains(preparation.getCacheKey(cache, self._state)):
+                return False
+        except OSError:
+            # A missing photo is reported by the renderer.
+            return False
+        return True
+
+    def _nextPlanned(self):
+        if self._lookahead:
+            return self._lookahead.popleft()
+        return next(self._planned, None)
+
+    def _fill(self):
+        while len(self._pending) < self._window:
+            preparation = self._nextPlanned()
+            if preparation is None:
+                return
+            if not self._needsWorker(preparation):
+                continue
+            self._pending.append(preparation)
+            if preparation not in self._futures:
+                self._futures[preparation] = self._executor.submit(_preparePhotoInWorker, preparation)
+
+    def _resynchronise(self, preparation):
+        """Move the window to follow *preparation*, which is planned beyond it.
+
+        Everything planned before it was not drawn.  Return False, leaving
+        the window as it is, if *preparation* is not planned soon.
+        """
+        while preparation not in self._lookahead and len(self._lookahead) < PIPELINE_LOOKAHEAD:
+            planned = next(self._planned, None)
+            if planned is None:
+                break
+            self._lookahead.append(planned)
+        if preparation not in self._lookahead:
+            return False
+        while self._lookahead.popleft() != preparation:
+            pass
+        for planned in self._pending:
+            future = self._futures.pop(planned, None)
+            if future is not None:
+                future.cancel()
+        self._pending.clear()
+        self._fill()
+        return True
+
+    def getPreparedPhotoData(self, preparation):
+        """Return the worker's encoded data for *preparation*, or None."""
+        if preparation not in self._pending:
+            # It is prepared on the canvas thread, and the window then continues after it.
+            self._resynchronise(preparation)
+            self.unplanned += 1
+            return None
+        # Anything planned before this preparation was not drawn after all.
+        while True:
+            planned = self._pending.popleft()
+            if planned == preparation:
+                break
+            if planned not in self._pending:
+                self._futures.pop(planned).cancel()
+        # The future is shared by any later planned placement of the same photo.
+        if preparation in self._pending:
+            future = self._futures[preparation]
+        else:
+            future = self._futures.pop(preparation)
+        self._fill()
+        try:
+            encodedBytes, logRecords = future.result()
+        except Exception as exception: # pylint: disable=broad-exception-caught
+            logging.debug(f'Photo preparation in a worker process failed, retrying: {exception!r}')
+            return None
+        for record in logRecords:
+            logger = logging.getLogger(record.name)
+            if logger.isEnabledFor(record.levelno):
+                logger.handle(record)
+        self.prepared += 1
+        return encodedBytes
+
+    def shutdown(self):
+        """Cancel the remaining preparations and stop the worker processes."""
+        self._pending.clear()
+        self._lookahead.clear()
+        self._futures.clear()
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def summaryText(self):
+        return (f'Asset pipeline: {self.prepared} photos prepared by worker processes, '
+                f'{self.unplanned} prepared while drawing')
+
+
+def createAssetPipeline(jobs, resolvedPages, fotobook, productStyle, imageDirectory, mcfBaseFolder,
+                        context: RenderContext, state: ConversionState):
+    """Return an AssetPipeline with its own process pool of *jobs* workers.
+
+    The caller must call :meth:`AssetPipeline.shutdown` when rendering ends.
+    """
+    maskCache = state.passepartout_masks.persistent_cache
+    executor = ProcessPoolExecutor(
+        max_workers=jobs, initializer=_initialiseWorker,
+        initargs=(logging.getLogger().getEffectiveLevel(),
+                  None if maskCache is None else str(maskCache.directory),
+                  0 if maskCache is None else maskCache.max_bytes))
+    preparations = planPhotoPreparations(resolvedPages, fotobook, productStyle, imageDirectory,
+                                         mcfBaseFolder, context, state)
+    return AssetPipeline(executor, preparations, jobs * PIPELINE_WINDOW_PER_JOB, state)
@@ -1,23 +1,76 @@
 """Background rendering for CEWE book pages."""
 
-from io import BytesIO
 import logging
+from math import sqrt
 
 # Background discovery tries several optional file locations; failure in one
 # location is expected and is reported before processing continues.
 # pylint: disable=broad-exception-caught
 
-import PIL
-from reportlab.lib.utils import ImageReader
+from PIL import Image
 
 from ceweInfo import AlbumInfo
 from configUtils import getConfigurationBool
 from conversionState import ConversionState
-from pathutils import findFileInDirs
+from imageCache import chooseDecodeReduction, decodeReduced, getMaxDecodeReduction
+from pdfImages import PreparedImage, readPlainJpeg
 from pageTypes import PageProcessingType
 from renderContext import RenderContext
 
 
+def getBackgroundOutputSize(sourceSize, areaWidth, areaHeight, resolution):
+    """Return the pixel size to resample a background to, or None to keep it.
+
+    *areaWidth* and *areaHeight* are in MCF units.  As for photos, an image
+    is only resampled if that shrinks it to 80% or less of its linear size.
+    """
+    newWidth = max(1, int(0.5 + areaWidth * resolution / 254.0))
+    newHeight = max(1, int(0.5 + areaHeight * resolution / 254.0))
+    factor = sqrt(newWidth * newHeight / float(sourceSize[0] * sourceSize[1]))
+    return (newWidth, newHeight) if factor <= 0.8 else None
+
+
+def getBackgroundImage(designElementId, state: ConversionState, backgroundLocations,
+                       areaWidth, areaHeight, context: RenderContext):
+    """Return the PDF image of a stock background, loading it only once.
+
+    Themed albums use the same few backgrounds on most pages.  The caller
+    releases the image data once the background is drawn, and the cached
+    object then keeps only the name under which ReportLab embedded it, so
+    later pages draw a reference to the embedded image.  Backgrounds are resampled to
+    ``pdfBackgroundResolution`` for the area they fill, and are cached per
+    resulting size.  A .jpg background which needs no resampling is embedded
+    byte for byte rather than decoded and encoded again.
+    """
+    backgroundFile = state.background_files.get(designElementId)
+    if backgroundFile is None:
+        bgPath = state.resource_locator.findFile([designElementId + '.bmp', designElementId + '.webp',
+                                                  designElementId + '.jpg'], backgroundLocations)
+        with Image.open(bgPath) as image:
+            backgroundFile = (bgPath, image.size)
+        state.background_files[designElementId] = backgroundFile
+    bgPath, sourceSize = backgroundFile
+
+    outputSize = getBackgroundOutputSize(sourceSize, areaWidth, areaHeight, context.background_resolution)
+    backgroundImage = state.background_images.get((designElementId, outputSize))
+    if backgroundImage is None:
+        logging.debug(f"Reading background file: {bgPath}")
+        if outputSize is None:
+            backgroundImage = readPlainJpeg(bgPath)
+        if backgroundImage is None:
+            with Image.open(bgPath) as image:
+                if outputSize is None:
+                    backgroundImage = PreparedImage(image.convert('RGB'))
+                else:
+                    factor = sqrt(outputSize[0] * outputSize[1] / float(sourceSize[0] * sourceSize[1]))
+                    reduction = chooseDecodeReduction(image, getMaxDecodeReduction(factor))
+                    decodedImage, _scale = decodeReduced(image, reduction)
+                    backgroundImage = PreparedImage(
+                        decodedImage.convert('RGB').resize(outputSize, context.image_resampling_filter))
+        state.background_images[(designElementId, outputSize)] = backgroundImage
+    return backgroundImage
+
+
 def processBackground(backgroundTags, state: ConversionState, backgroundLocations,
                       productstyle, pagetype, pdf, ph, pw, context: RenderContext):  # noqa: C901
     """Draw the page background, including special handling for inside covers."""
@@ -69,17 +122,13 @@ def processBackground(backgroundTags, state: ConversionState, backgroundLocation
             if 'type' in backgroundTag.attrib and int(backgroundTag.get('type')) != 1:
                 logging.warning(f"value of background attribute not supported: type = {backgroundTag.get('type')}")
 
-            bgPath = ''
             try:
-                bgPath = findFileInDirs([bg + '.bmp', bg + '.webp', bg + '.jpg'], backgroundLocations)
-                logging.debug(f"Reading background file: {bgPath}")
-                image = PIL.Image.open(bgPath).convert('RGB')
-                memFileHandle = BytesIO()
-                image.save(memFileHandle, 'jpeg')
-                memFileHandle.seek(0)
-                pdf.drawImage(ImageReader(memFileHandle), context.mcf_to_reportlab * areaXOffset, 0,
+                backgroundImage = getBackgroundImage(bg, state, backgroundLocations,
+                                                     areaWidth, areaHeight, context)
+                pdf.drawImage(backgroundImage, context.mcf_to_reportlab * areaXOffset, 0,
                               width=context.mcf_to_reportlab * areaWidth,
                               height=context.mcf_to_reportlab * areaHeight)
+                backgroundImage.release()
             except Exception:
                 if bg not in state.background_not_found_paths:
                     logging.warning(
@@ -76,6 +76,7 @@ import os.path
 import os
 
 import argparse  # to parse arguments
+import multiprocessing
 
 import reportlab.lib.pagesizes
 # from reportlab.pdfbase.pdfmetrics import stringWidth as _stringWidth
@@ -85,6 +86,7 @@ import PIL
 
 from packaging.version import parse as parse_version
 from albumConversionSession import AlbumConversionSession
+from outputBudget import OUTPUT_PROFILES, parseByteSize
 from pageElements import processElements
 from windowsIntegration import (confirmInstallation, installWindowsIntegration,
                                 isWindowsFrozenExecutable, showMessage,
@@ -136,15 +138,29 @@ mcf2rl = reportlab.lib.pagesizes.mm/10 # == 72/254, converts from mcf (unit=0.1m
 
 
 def convertMcf(albumname, keepDoublePages: bool, pageNumbers=None, mcfxTmpDir=None,
-               appDataDir=None, outputFileName=None, automaticWindows=False):
+               appDataDir=None, outputFileName=None, automaticWindows=False, jobs=1,
+               targetSize=None, profile=None):
     """Convert one MCF or MCFX album while preserving the established API."""
     with AlbumConversionSession(
             albumname, keepDoublePages, pageNumbers, mcfxTmpDir, appDataDir,
             outputFileName, mcf2rl, image_quality, pil_antialias,
-            automaticWindows) as session:
+            automaticWindows, jobs, targetSize, profile) as session:
         return session.render(processElements)
 
 
+def getConversionOptions(parser, args):
+    """Return the checked conversion keyword arguments of the command line options."""
+    if args.jobs < 1:
+        parser.error('--jobs must be at least 1')
+    targetSize = None
+    if args.targetSize is not None:
+        try:
+            targetSize = parseByteSize(args.targetSize)
+        except ValueError as exception:
+            parser.error(f'--target-size: {exception}')
+    return {'jobs': args.jobs, 'targetSize': targetSize, 'profile': args.profile}
+
+
 def collectArgsAndConvert():
     class CustomArgFormatter(argparse.ArgumentDefaultsHelpFormatter, argparse.RawDescriptionHelpFormatter):
         pass
@@ -167,7 +183,18 @@ def collectArgsAndConvert():
                         help='Directory for .mcfx file extraction')
     parser.add_argument('--appdata-dir', dest='appData',
                         default=None,
-                        help='Directory for persistent app data, eg ttf fonts converted from otf fonts')
+                        help='Directory for persistent app data, eg ttf fonts converted from otf fonts and cached prepared images')
+    parser.add_argument('--jobs', dest='jobs', type=int, default=1,
+                        help='Number of worker processes preparing photos while pages are drawn. '
+                        'With 1, all photos are prepared by the main process.')
+    parser.add_argument('--profile', dest='profile', choices=sorted(OUTPUT_PROFILES),
+                        default=None,
+                        help='Image resolutions and JPEG quality for screen or print delivery, '
+                        'instead of those in the configuration file.')
+    parser.add_argument('--target-size', dest='targetSize', action='store',
+                        default=None,
+                        help='Approximate size of the output file, e.g. 25MB. Photo resolution and '
+                        'JPEG quality are lowered photo by photo to fit, and the achieved size is reported.')
     parser.add_argument('--version', action='version',
                         version=getVersionInformationText(),
                         help='Show version and build identification, then exit')
@@ -186,6 +213,7 @@ def collectArgsAndConvert():
                         help='Just one mcf(x) input file must be specified')
 
     args = parser.parse_args()
+    conversionOptions = getConversionOptions(parser, args)
 
     if args.install:
         if not isWindowsFrozenExecutable():
@@ -278,7 +306,7 @@ def collectArgsAndConvert():
     # convert the file
     result = convertMcf(
         args.inputFile, args.keepDoublePages, pages, mcfxTmp, appData,
-        outputFileName=outFile, automaticWindows=args.automatic)
+        outputFileName=outFile, automaticWindows=args.automatic, **conversionOptions)
     if args.automatic and result:
         outputName = outFile or os.path.abspath(args.inputFile + '.pdf')
         logName = os.path.abspath(args.inputFile + '.log')
@@ -290,4 +318,6 @@ def collectArgsAndConvert():
 if __name__ == '__main__':
     # only executed when this file is run directly.
     # we need trick to have both: default and fixed formats.
+    # The frozen Windows executable must start --jobs worker processes itself.
+    multiprocessing.freeze_support()
     resultFlag = collectArgsAndConvert()
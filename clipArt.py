@@ -1,7 +1,7 @@
-import glob
 import logging
 import os.path
 import os
+import time
 
 from pathlib import Path
 from lxml import etree
@@ -10,42 +10,56 @@ from ceweInfo import CeweInfo
 from clpFile import ClpFile  # for clipart .CLP and .SVG files
 from extraLoggers import configlogger
 from pathutils import findFileInDirs
+from xmlFileIndex import XmlFileIndex
 
 
-def loadClipart(fileName, clipartPathList) -> ClpFile:
-    """Tries to load a clipart file. Either from .CLP or .SVG file
-    returns a clpFile object"""
-    newClpFile = ClpFile("")
+def findClipartFile(fileName, clipartPathList, resourceLocator=None):
+    """Return the Path of the .clp or .svg file for a clipart, or None if it is missing.
 
+    The file is searched for with *resourceLocator* if one is given."""
     if os.path.isabs(fileName):
         filePath = Path(fileName)
         if not filePath.exists():
             filePath = filePath.parent.joinpath(filePath.stem+".clp")
             if not filePath.exists():
                 logging.error(f"Missing .clp: {fileName}")
-                return ClpFile("")   # return an empty ClpFile
-    else:
-        pathObj = Path(fileName)
-        # the name can actually be "correct", but its stem may not be in the clipartPathList. This will
-        # happen at least for passepartout clip masks when we're using a local test hps structure rather
-        # than an installed cewe_folder. For that reason we add the file's own folder to the clipartPathList
-        # before searching for a clp or svg file matching the stem
-        baseFileName = pathObj.stem
-        fileFolder = pathObj.parent
-        try:
-            filePath = findFileInDirs([baseFileName+'.clp', baseFileName+'.svg'], (fileFolder,) + clipartPathList)
-            filePath = Path(filePath)
-        except Exception as ex: # pylint: disable=broad-exception-caught
-            logging.error(f" {baseFileName}, {ex}")
-            return ClpFile("")   # return an empty ClpFile
+                return None
+        return filePath
+
+    pathObj = Path(fileName)
+    # the name can actually be "correct", but its stem may not be in the clipartPathList. This will
+    # happen at least for passepartout clip masks when we're using a local test hps structure rather
+    # than an installed cewe_folder. For that reason we add the file's own folder to the clipartPathList
+    # before searching for a clp or svg file matching the stem
+    baseFileName = pathObj.stem
+    fileFolder = pathObj.parent
+    try:
+        findFile = resourceLocator.findFile if resourceLocator is not None else findFileInDirs
+        return Path(findFile([baseFileName+'.clp', baseFileName+'.svg'], (fileFolder,) + clipartPathList))
+    except Exception as ex: # pylint: disable=broad-exception-caught
+        logging.error(f" {baseFileName}, {ex}")
+        return None
 
+
+def loadClipartFile(filePath) -> ClpFile:
+    """Load a clipart from the .clp or .svg file found by findClipartFile."""
+    newClpFile = ClpFile("")
     if filePath.suffix == '.clp':
         newClpFile.readClp(filePath)
     else:
         newClpFile.loadFromSVG(filePath)
-
     return newClpFile
 
+
+def loadClipart(fileName, clipartPathList, resourceLocator=None) -> ClpFile:
+    """Tries to load a clipart file. Either from .CLP or .SVG file
+    returns a clpFile object. The file is searched for with *resourceLocator*
+    if one is given."""
+    filePath = findClipartFile(fileName, clipartPathList, resourceLocator)
+    if filePath is None:
+        return ClpFile("")   # return an empty ClpFile
+    return loadClipartFile(filePath)
+
 def getClipConfig(Element):
     colorreplacements = []
     flipX = False
@@ -67,21 +81,60 @@ def getClipConfig(Element):
     return colorreplacements, flipX, flipY
 
 
-def readClipArtConfigXML(baseFolder, keyaccountFolder, clipartDict):
+class ClipartCatalogue(XmlFileIndex):
+    """Clipart file names by designElementId, read from the clipart XML files.
+
+    The entries of each XML file are kept between conversions, see
+    :mod:`xmlFileIndex`, so a later conversion only parses changed files.
+    """
+
+    DESCRIPTION = 'clipart index'
+
+    def parseFile(self, xmlFile):
+        return readClipartConfigEntries(xmlFile)
+
+    def addFiles(self, xmlFiles, clipartDict):
+        self.run(lambda connection: self._addEntries(connection, xmlFiles, clipartDict))
+
+    def addTree(self, folder, clipartDict):
+        """Add the cliparts of every XML file below *folder*."""
+        self.run(lambda connection: self._addEntries(connection, self.walk(connection, folder), clipartDict))
+
+    def addGlob(self, clipartDict, root, *patterns):
+        """Add the cliparts of the XML files matching ``os.path.join(root, *patterns)``."""
+        self.run(lambda connection: self._addEntries(
+            connection, self.glob(connection, root, *patterns), clipartDict))
+
+    def _addEntries(self, connection, xmlFiles, clipartDict):
+        for xmlFile in xmlFiles:
+            for designElementId, fileName in self.getRecords(connection, xmlFile):
+                clipartDict[designElementId] = fileName
+
+
+def readClipArtConfigXML(baseFolder, keyaccountFolder, clipartDict, catalogue: ClipartCatalogue = None):
     """Parse the configuration XML file and generate a dictionary of designElementId to fileName
-    currently only cliparts_default.xml is supported !"""
+    currently only cliparts_default.xml is supported !
+
+    The XML files are read through *catalogue*, if given, which keeps
+    their entries between conversions."""
     # A conversion without CEWE resources simply has no delivered clipart
     # catalogue.  Explicitly configured cliparts remain in clipartDict.
     if baseFolder is None:
         return tuple()
+    if catalogue is None:
+        catalogue = ClipartCatalogue()
+    startTime = time.perf_counter()
 
     clipartPathList = CeweInfo.getBaseClipartLocations(baseFolder) # append instead of overwrite global variable
     xmlConfigFileName = 'cliparts_default.xml'
     try:
         xmlFileName = findFileInDirs(xmlConfigFileName, clipartPathList)
-        loadClipartConfigXML(xmlFileName, clipartDict)
-        configlogger.info(f'{xmlFileName} listed {len(clipartDict)} cliparts')
     except: # noqa: E722 # pylint: disable=bare-except
+        xmlFileName = None
+    if xmlFileName is not None:
+        catalogue.addFiles([xmlFileName], clipartDict)
+        configlogger.info(f'{xmlFileName} listed {len(clipartDict)} cliparts')
+    else:
         configlogger.info(f'Could not locate and load the clipart definition file: {xmlConfigFileName}')
         configlogger.info('Trying a search for cliparts instead')
         # cliparts_default.xml went missing in 7.3.4 so we have to go looking for all the individual xml
@@ -89,10 +142,7 @@ def readClipArtConfigXML(baseFolder, keyaccountFolder, clipartDict):
         # if we can build our internal dictionary from them.
         decorations = CeweInfo.getCeweDecorationsFolder(baseFolder)
         configlogger.info(f'clipart xml path: {decorations}')
-        for (root, dirs, files) in os.walk(decorations): # walk returns a 3-tuple so pylint: disable=unused-variable
-            for decorationfile in files:
-                if decorationfile.endswith(".xml"):
-                    loadClipartConfigXML(os.path.join(root, decorationfile), clipartDict)
+        catalogue.addTree(decorations, clipartDict)
         numberClipartsLocated = len(clipartDict)
         if numberClipartsLocated > 0:
             configlogger.info(f'{numberClipartsLocated} clipart xmls found')
@@ -105,20 +155,17 @@ def readClipArtConfigXML(baseFolder, keyaccountFolder, clipartDict):
         # stuff from the installation) it isn't really an error because there is a local folder
         # tests/Resources/photofun/decorations with the clipart files needed for the tests.
         configlogger.error("No downloaded clipart folder found")
+        logClipartCatalogue(catalogue, clipartDict, startTime)
         return clipartPathList
 
     # from (at least) 7.3.4 the addon cliparts might be in more than one structure, so ... first the older layout
-    addonclipartxmls = os.path.join(keyaccountFolder, "addons", "*", "cliparts", "v1", "decorations", "*.xml")
-    for file in glob.glob(addonclipartxmls):
-        loadClipartConfigXML(file, clipartDict)
+    catalogue.addGlob(clipartDict, keyaccountFolder, "addons", "*", "cliparts", "v1", "decorations", "*.xml")
 
     # then the newer layout
     currentClipartCount = len(clipartDict)
     localDecorations = os.path.join(keyaccountFolder, 'photofun', 'decorations')
-    xmlfiles = glob.glob(os.path.join(localDecorations, "*", "*", "*.xml"))
     configlogger.info(f'local clipart xml path: {localDecorations}')
-    for xmlfile in xmlfiles:
-        loadClipartConfigXML(xmlfile, clipartDict)
+    catalogue.addGlob(clipartDict, localDecorations, "*", "*", "*.xml")
     numberClipartsLocated = len(clipartDict) - currentClipartCount
     if numberClipartsLocated > 0:
         configlogger.info(f'{numberClipartsLocated} local clipart xmls found')
@@ -126,10 +173,19 @@ def readClipArtConfigXML(baseFolder, keyaccountFolder, clipartDict):
     if len(clipartDict) == 0:
         configlogger.error('No cliparts found')
 
+    logClipartCatalogue(catalogue, clipartDict, startTime)
     return clipartPathList
 
 
-def loadClipartConfigXML(xmlFileName, clipartDict):
+def logClipartCatalogue(catalogue: ClipartCatalogue, clipartDict, startTime):
+    configlogger.info(f'Clipart catalogue: {len(clipartDict)} cliparts, {catalogue.summaryText()}, '
+                      f'{time.perf_counter() - startTime:.3f}s')
+
+
+def readClipartConfigEntries(xmlFileName):
+    """Return the (designElementId, fileName) pairs listed in a clipart XML file,
+    or None if the file cannot be read."""
+    entries = []
     try:
         with open(xmlFileName, 'rb') as clipArtXml:
             xmlInfo = etree.parse(clipArtXml)
@@ -140,6 +196,8 @@ def loadClipartConfigXML(xmlFileName, clipartDict):
                 continue
             fileName = os.path.join(os.path.dirname(xmlFileName), clipartElement.get('file'))
             designElementId = int(clipartElement.get('designElementId'))    # assume these IDs are always integers.
-            clipartDict[designElementId] = fileName
+            entries.append((designElementId, fileName))
     except Exception as clpOpenEx: # pylint: disable=broad-exception-caught
         logging.error(f"Cannot open clipart file {xmlFileName}: {repr(clpOpenEx)}")
+        return None
+    return entries
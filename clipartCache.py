@@ -0,0 +1,64 @@
+"""Rasterised clip art shared by the clip art placements of one conversion.
+
+Decorative corners, stickers and passepartout frames are usually placed many
+times at the same size.  Loading a .clp file, replacing its colours and
+rasterising the SVG is by far the slowest part of drawing one, so each
+finished PNG is kept here and rasterised only once.  An optional persistent
+tier keeps the PNG data for later conversions of the same album.
+"""
+
+import os
+
+from memoryCache import ByteBoundedCache
+from persistentCache import PersistentBlobCache
+
+# The memory for one conversion's clip art; the persistent tier is sized by
+# clipartCacheMB, see persistentCache.DEFAULT_CLIPART_CACHE_MB.
+DEFAULT_RASTERISED_CLIPART_CACHE_MB = 64
+
+# Change this when rasterising a clip art gives different pixels, so that
+# persistent entries made by earlier code are no longer used.
+CLIPART_RASTERISER_VERSION = 1
+
+
+class RasterisedClipartCache(ByteBoundedCache):
+    """Least-recently-used cache of clip art PNG data.
+
+    Entries are keyed by everything which affects the PNG: the clip art
+    file and its modification time, the colour replacements, the pixel size,
+    the alpha value and the mirroring.
+    """
+
+    def __init__(self, maxBytes=DEFAULT_RASTERISED_CLIPART_CACHE_MB * 1024 * 1024,
+                 persistentCache: PersistentBlobCache = None):
+        super().__init__('Rasterised clipart', maxBytes)
+        self.persistent_cache = persistentCache
+
+    def getPngData(self, clipartPath, colorReplacements, size, alpha, flipX, flipY,
+                   rasterise, fileDigests):
+        """Return the PNG data for a clip art placement.
+
+        *rasterise* is called without arguments to produce the data when it
+        is not cached, and may return None if the clip art cannot be loaded.
+        *fileDigests* supplies the file's digest for the persistent tier.
+        """
+        clipartPath = os.path.abspath(clipartPath)
+        renderParameters = (tuple(colorReplacements), tuple(size), alpha, flipX, flipY)
+        key = (clipartPath, os.stat(clipartPath).st_mtime_ns) + renderParameters
+        pngData = self.get(key)
+        if pngData is not None:
+            return pngData
+
+        persistentKey = None
+        if self.persistent_cache is not None:
+            persistentKey = PersistentBlobCache.makeKey(
+                'clipart', CLIPART_RASTERISER_VERSION, fileDigests.getDigest(clipartPath), renderParameters)
+            pngData = self.persistent_cache.get(persistentKey)
+        if pngData is None:
+            pngData = rasterise()
+            if pngData is None:
+                return None
+            if persistentKey is not None:
+                self.persistent_cache.put(persistentKey, pngData)
+        self.put(key, pngData, len(pngData))
+        return pngData
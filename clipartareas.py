@@ -2,14 +2,14 @@
 
 import logging
 
-from reportlab.lib.utils import ImageReader
-
-from clipArt import getClipConfig, loadClipart
+from clipArt import findClipartFile, getClipConfig, loadClipartFile
+from conversionState import ConversionState
+from pdfImages import EncodedImage
 from renderContext import RenderContext
 
 
 def processAreaClipartTag(clipartElement, areaHeight, areaRot, areaWidth, pdf, transx, transy,
-                          clipArtDecoration, context: RenderContext,
+                          clipArtDecoration, context: RenderContext, state: ConversionState,
                           borderProcessor):
     """Render one clipart area and its optional border."""
     clipartID = int(clipartElement.get('designElementId'))
@@ -29,29 +29,70 @@ def processAreaClipartTag(clipartElement, areaHeight, areaRot, areaWidth, pdf, t
 
     colorReplacements, flipX, flipY = getClipConfig(clipartElement)
     insertClipartFile(fileName, colorReplacements, transx, areaWidth, areaHeight, alpha, pdf,
-                      transy, areaRot, flipX, flipY, clipArtDecoration, context, borderProcessor)
+                      transy, areaRot, flipX, flipY, clipArtDecoration, context, borderProcessor, state)
 
 
 def insertClipartFile(fileName, colorReplacements, transx, areaWidth, areaHeight, alpha, pdf,
                       transy, areaRot, flipX, flipY, decoration, context: RenderContext,
-                      borderProcessor=None):
-    """Rasterise a clipart file and draw it at the supplied area geometry."""
+                      borderProcessor=None, state: ConversionState = None):
+    """Draw a clipart file at the supplied area geometry.
+
+    The clipart is rasterised unless it can be drawn as vector graphics.
+    """
     newWidth = int(0.5 + areaWidth * context.image_resolution / 254.0)
     newHeight = int(0.5 + areaHeight * context.image_resolution / 254.0)
 
-    clipart = loadClipart(fileName, context.clipart_paths)
-    if len(clipart.svgData) <= 0:
-        logging.error(f"Clipart file could not be loaded: {fileName}")
+    clipartPath = findClipartFile(fileName, context.clipart_paths,
+                                  state.resource_locator if state is not None else None)
+
+    def loadClipart():
+        clipart = loadClipartFile(clipartPath)
+        if len(clipart.svgData) > 0 and len(colorReplacements) > 0:
+            clipart.replaceColors(colorReplacements)
+        return clipart
+
+    def rasterise():
+        clipart = loadClipart()
+        if len(clipart.svgData) <= 0:
+            return None
+        clipart.convertToPngInBuffer(newWidth, newHeight, alpha, flipX, flipY)
+        return clipart.pngMemFile.getvalue()
+
+    # Transparent placements are always rasterised, which is how their alpha
+    # value is applied.
+    vectorForm = None
+    if context.vector_cliparts and state is not None and clipartPath is not None and alpha == 255:
+        vectorForm = state.vector_cliparts.getForm(
+            pdf, clipartPath, colorReplacements, lambda: loadClipart().svgData)
+    if vectorForm is not None:
+        logging.debug(f"Clipart file: {fileName}, as vector graphics")
+        pdf.translate(transx, transy)
+        pdf.rotate(-areaRot)
+        state.vector_cliparts.drawForm(pdf, vectorForm, context.mcf_to_reportlab * areaWidth,
+                                       context.mcf_to_reportlab * areaHeight, flipX, flipY)
+        if decoration is not None and borderProcessor is not None:
+            borderProcessor(decoration, areaHeight, areaWidth, pdf)
+        pdf.rotate(areaRot)
+        pdf.translate(-transx, -transy)
         return
 
-    if len(colorReplacements) > 0:
-        clipart.replaceColors(colorReplacements)
+    pngData = None
+    if clipartPath is not None:
+        if state is not None:
+            # The same decoration is often placed on many pages at one size.
+            pngData = state.rasterised_cliparts.getPngData(
+                clipartPath, colorReplacements, (newWidth, newHeight), alpha, flipX, flipY,
+                rasterise, state.file_digests)
+        else:
+            pngData = rasterise()
+    if pngData is None:
+        logging.error(f"Clipart file could not be loaded: {fileName}")
+        return
 
-    clipart.convertToPngInBuffer(newWidth, newHeight, alpha, flipX, flipY)
     logging.debug(f"Clipart file: {fileName}")
     pdf.translate(transx, transy)
     pdf.rotate(-areaRot)
-    pdf.drawImage(ImageReader(clipart.pngMemFile),
+    pdf.drawImage(EncodedImage(pngData),
                   context.mcf_to_reportlab * -0.5 * areaWidth,
                   context.mcf_to_reportlab * -0.5 * areaHeight,
                   width=context.mcf_to_reportlab * areaWidth,
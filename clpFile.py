@@ -2,16 +2,72 @@
 
 # Copyright (c) 2020 by BarchSteel
 
+import functools
 import logging
 from pathlib import Path
 from io import BytesIO
 import re
 import cairosvg
+from lxml import etree
 import PIL
 from PIL import Image
 # from PIL import ImageOps
 # from PIL.ExifTags import TAGS
 
+class ColorReplacer():
+    """A set of clipart color replacements, compiled to be made in one pass over the SVG text.
+
+    Colors are replaced in the fill, stop-color and stroke properties of style attributes,
+    with the original color matched without regard to case, and in fill attributes. All the
+    replacements are made at once, so a color produced by one replacement is not changed
+    again by a later one. The first replacement of a color takes precedence."""
+
+    _attributePattern = re.compile(r'style="([^"]*)"|fill="(#[^"]*)"')
+    _stylePattern = re.compile(r'(fill|stop-color|stroke):(#[0-9a-f]{6})', re.IGNORECASE)
+
+    def __init__(self, colorReplacements):
+        self.replacement_count = len(colorReplacements)
+        self._styleColors = {}
+        self._attributeColors = {}
+        for index, (oldColor, newColor) in enumerate(colorReplacements):
+            if oldColor == newColor:
+                # color was not changed
+                continue
+            self._styleColors.setdefault(oldColor.upper(), (index, newColor))
+            self._attributeColors.setdefault(oldColor, (index, newColor))
+
+    def apply(self, svgText):
+        """Return the replaced text and the number of substitutions made by each replacement"""
+        substitutionCounts = [0] * self.replacement_count
+
+        def replaceStyleColor(match):
+            replacement = self._styleColors.get(match.group(2).upper())
+            if replacement is None:
+                return match.group(0)
+            index, newColor = replacement
+            substitutionCounts[index] += 1
+            return f'{match.group(1)}:{newColor}'
+
+        def replaceAttribute(match):
+            if match.group(1) is not None:
+                return f'style="{self._stylePattern.sub(replaceStyleColor, match.group(1))}"'
+            # handle: <path fill="#5E0B23" d="M218.23,..."/>
+            replacement = self._attributeColors.get(match.group(2))
+            if replacement is None:
+                return match.group(0)
+            index, newColor = replacement
+            substitutionCounts[index] += 1
+            return f'fill="{newColor}"'
+
+        return self._attributePattern.sub(replaceAttribute, svgText), substitutionCounts
+
+
+@functools.lru_cache(maxsize=256)
+def getColorReplacer(colorReplacements: tuple) -> ColorReplacer:
+    """Return the compiled ColorReplacer for a tuple of (original, new) color tuples"""
+    return ColorReplacer(colorReplacements)
+
+
 class ClpFile():
     _invalidContent = r"? illegal clp content"
 
@@ -61,17 +117,7 @@ class ClpFile():
         scaledImage = self.rasterSvgData(width, height)
 
         if scaledImage.mode == "RGB":
-            # create a mask the same size as the original. For all pixels which are
-            # non zero ("not used") set the mask value to the required transparency
-            # L = 8-bit gray-scale
-            # Important: .convert('L') should not be used on RGBA images -> very bad quality. Not supported.
-            alphamask = scaledImage.copy().convert('L').resize(scaledImage.size)
-            pixels = alphamask.load()
-            for i in range(alphamask.size[0]): # for every pixel:
-                for j in range(alphamask.size[1]):
-                    if (pixels[i, j] != 0):
-                        pixels[i, j] = alpha
-            scaledImage.putalpha(alphamask)
+            scaledImage.putalpha(ClpFile.makeAlphaMask(scaledImage, alpha))
 
         if flipX:
             scaledImage = scaledImage.transpose(Image.Transpose.FLIP_LEFT_RIGHT)
@@ -82,25 +128,84 @@ class ClpFile():
         self.pngMemFile.seek(0)
         return self
 
+    # The pixels per unit of the absolute SVG length units, at the 96 dpi which cairosvg uses
+    _svgUnitPixels = {'px': 1.0, 'pt': 96 / 72.0, 'pc': 96 / 6.0, 'in': 96.0, 'cm': 96 / 2.54, 'mm': 96 / 25.4}
+
+    @staticmethod
+    def _svgLength(text):
+        """The length of a width or height attribute in pixels, 0 if it is missing or relative
+        (when cairosvg uses the viewBox instead), or None if it is in font-relative units."""
+        if text is None or text.strip() == '' or text.strip().endswith('%'):
+            return 0.0
+        match = re.fullmatch(r'\s*([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)\s*([a-z]*)\s*', text)
+        if match is None:
+            return None
+        number, unit = match.groups()
+        if unit == '':
+            return float(number)
+        if unit in ClpFile._svgUnitPixels:
+            return float(number) * ClpFile._svgUnitPixels[unit]
+        return None
+
+    def getSvgSize(self):
+        """Return the pixel size cairosvg renders the SVG data at without scaling.
+
+        It is worked out from the root element's width, height and viewBox
+        attributes, as cairosvg does.  None is returned if that is not possible
+        without rendering the SVG."""
+        try:
+            root = etree.fromstring(self.svgData, etree.XMLParser(resolve_entities=False, huge_tree=True))
+        except (etree.XMLSyntaxError, ValueError):
+            return None
+        viewBox = None
+        if root.get('viewBox'):
+            try:
+                viewBox = [float(value) for value in re.split(r'[\s,]+', root.get('viewBox').strip())]
+            except ValueError:
+                return None
+            if len(viewBox) != 4:
+                return None
+        size = []
+        for attribute, viewBoxIndex in (('width', 2), ('height', 3)):
+            length = ClpFile._svgLength(root.get(attribute))
+            if length is None:
+                return None
+            if length == 0 and viewBox is not None:
+                length = viewBox[viewBoxIndex]
+            # cairosvg truncates the size of the PNG surface
+            size.append(int(length))
+        if size[0] <= 0 or size[1] <= 0:
+            return None
+        return tuple(size)
+
+    @staticmethod
+    def makeAlphaMask(rgbImage, alpha:int):
+        """Return an alpha mask for an RGB image which is 0 where its gray-scale value is 0, else alpha"""
+        # L = 8-bit gray-scale
+        # Important: .convert('L') should not be used on RGBA images -> very bad quality. Not supported.
+        # The lookup table maps every pixel value in one pass instead of a Python loop over the pixels.
+        return rgbImage.convert('L').point([0] + [alpha] * 255)
+
     def rasterSvgData(self, width:int, height:int):
 
         # We are using cairosvg, but this does not allow to scale the output image to the dimensions that we like.
-        # we need to do a two-pass convertion, to get the desired result
-        # 1. Do the first conversion and see what the output size is
+        # 1. Find the size of the unscaled output image, from the SVG's attributes if that is possible,
+        #    otherwise by doing a first conversion and looking at the output size
         # 2. calculate the scaling in x-, and y-direction that is needed
         # 3. use the maxium of these x-, and y-scaling and do a aspect-ratio-preserving scaling of the image
         #    convert the image again from svg to png with this max. scale factor
         # 4. do a raster-image scaling to skew the image to the final dimension.
         #    This should only scale in x- or y-direction, as the other direction should alread be the desired one.
 
-        # create a byte buffer that can be used like a file and use it as the output of svg2png.
-        tmpMemFile = BytesIO()
         # Step 1.
-        cairosvg.svg2png(bytestring=self.svgData, write_to=tmpMemFile, unsafe=True)
-        tmpMemFile.seek(0)
-        tempImage = PIL.Image.open(tmpMemFile)
-        origWidth = tempImage.width
-        origHeight = tempImage.height
+        svgSize = self.getSvgSize()
+        if svgSize is None:
+            # create a byte buffer that can be used like a file and use it as the output of svg2png.
+            tmpMemFile = BytesIO()
+            cairosvg.svg2png(bytestring=self.svgData, write_to=tmpMemFile, unsafe=True)
+            tmpMemFile.seek(0)
+            svgSize = PIL.Image.open(tmpMemFile).size
+        origWidth, origHeight = svgSize
         # Step 2.
         scale_x = width/origWidth
         scale_y = height/origHeight
@@ -126,33 +231,39 @@ class ClpFile():
     #     self.pngMemFile.seek(0)
     #     return self
 
-    def applyAsAlphaMaskToFoto(self, photo:PIL.Image):
-        """" Use the currently loaded mask clipart to create a alpha mask on the input image."""
+    def rasterAlphaChannel(self, width:int, height:int):
+        """" Rasterise the currently loaded mask clipart to an L-mode alpha channel of the given size."""
         # create the PNG as RBGA in internal buffer
         # create a byte buffer that can be used like a file and use it as the output of svg2png.
-        maskImgPng:PIL.Image = self.rasterSvgData(photo.width, photo.height)
+        maskImgPng:PIL.Image = self.rasterSvgData(width, height)
 
         # get the alpha channel
         #  if the .svg is fully filled by the mask, then only a black rectangle with RGA (=no background!) is returned.
         #  if the mask does not fully fill the mask, then an RGBA image is returned. In this case, use the alpha value directly.
+        # Each step is a whole-image Pillow operation; ImageOps.invert is a single lookup table pass.
+        if maskImgPng.mode not in ("RGB", "RGBA"):
+            # e.g. a palette or grey-scale raster, which may or may not have transparency
+            maskImgPng = maskImgPng.convert("RGBA")
         if maskImgPng.mode == "RGBA":
             # an RGBA image mask does not always use transparency
             # some images still use white to indicate transparent parts
             # to support both transparent and white RGBA svg masks,
             # convert transparency to white and use white as alpha channel.
-            #  alphaChannel = maskImgPng.getchannel("A")
-            #  maskImgPng.paste("white", None, "RGBA")
-
             white = PIL.Image.new("RGBA", maskImgPng.size, "WHITE")
             white.paste(maskImgPng, (0, 0), maskImgPng)
-            alphaChannel = white.convert('L')
-            alphaChannel = PIL.ImageOps.invert(alphaChannel)
-        elif maskImgPng.mode == "RGB":
+            alphaChannel = PIL.ImageOps.invert(white.convert('L'))
+        else:
             # convert image to gray-scale and use that as alpha channel.
             # we need to invert, otherwise black whould be transparent.
             # normally the whole image is a black rectangle
-            alphaChannel = maskImgPng.convert('L')
-            alphaChannel = PIL.ImageOps.invert(alphaChannel)
+            alphaChannel = PIL.ImageOps.invert(maskImgPng.convert('L'))
+        return alphaChannel
+
+    def applyAsAlphaMaskToFoto(self, photo:PIL.Image, alphaChannel:PIL.Image = None):
+        """" Use the currently loaded mask clipart, or an alpha channel it has already been rasterised
+        to at the photo's size, to create a alpha mask on the input image."""
+        if alphaChannel is None:
+            alphaChannel = self.rasterAlphaChannel(photo.width, photo.height)
 
         # apply it the input photo. They must have the same dimensions. But that is ensured by rasterSvgData
         if (photo.mode != "RGB") or (photo.mode != "RGBA"):
@@ -223,36 +334,14 @@ class ClpFile():
         # seems to be specified by the *absence* of the colour keyword.
         # But parsing svg is a much bigger job!
 
-        for curReplacement in colorReplacementList:
-            if curReplacement[0] == curReplacement[1]:
-                # color was not changed
-                continue
-
-            # print (curReplacement)
-            # Old, simple, but buggy code: self.svgData = self.svgData.replace(oldColorString.encode(encoding="utf-8"),newColorString.encode(encoding="utf-8") )
-            # A general replace would look like this:
-            #     re.sub("(style=\".*?)(fill:\#[0-9a-fA-F]+)(.*?\")", r"\1"+XXX+r"\3", self.svgData)
-            # This does the replacements "fairly carefully" for both fill and stroke. As an attempt
-            # at a "sanity" check we insist that each color replacement should be used at least once
-            subsmade = 0
-            colorkeys = ("fill", "stop-color", "stroke")
-            for colorkey in colorkeys:
-                oldColorString = colorkey+':'+curReplacement[0]
-                newColorString = colorkey+':'+curReplacement[1]
-                replacement, subcount = re.subn(
-                    "(style=\".*?)("+oldColorString+")(.*?\")", r"\1"+newColorString+r"\3", self.svgData.decode(),flags=re.MULTILINE | re.IGNORECASE)
-                self.svgData = replacement.encode(encoding="utf-8")
-                subsmade += subcount
-
-            # handle: <path fill="#5E0B23" d="M218.23,..."/>
-            attributes = ("fill") # pylint: disable=superfluous-parens
-            for attribute in attributes:
-                replacement, subcount = re.subn(
-                    attribute+"=\""+curReplacement[0]+"\"", r""+attribute+"=\""+curReplacement[1]+"\"", self.svgData.decode(),flags=re.MULTILINE)
-                self.svgData = replacement.encode(encoding="utf-8")
-                subsmade += subcount
-
-            if subsmade == 0:
+        # All the replacements are made in one pass over the style and fill attributes
+        # of the SVG text. As an attempt at a "sanity" check we insist that each color
+        # replacement should be used at least once
+        replacer = getColorReplacer(tuple(tuple(curReplacement) for curReplacement in colorReplacementList))
+        svgDataText, substitutionCounts = replacer.apply(svgDataText)
+        self.svgData = svgDataText.encode(encoding="utf-8")
+        for curReplacement, subsmade in zip(colorReplacementList, substitutionCounts):
+            if curReplacement[0] != curReplacement[1] and subsmade == 0:
                 logging.warning(f"Clipart color substitution defined but not made from {curReplacement[0]} to {curReplacement[1]}")
         return self
 
@@ -19,15 +19,19 @@ from typing import Any
 from lxml import etree
 
 from ceweInfo import CeweInfo
-from clipArt import readClipArtConfigXML
+from clipArt import ClipartCatalogue, readClipArtConfigXML
 from configUtils import getConfigurationInt
 from conversionState import ConversionState
 from extraLoggers import mustsee
 from fontHandling import findAndRegisterFonts
 from lineScales import LineScales
 from mcfx import unpackMcfx
+from persistentCache import getCacheDirectory
 from windowsIntegration import findInstalledCeweFolder
 
+# The least pdfImageResolution and pdfBackgroundResolution accepted.
+MINIMUM_RESOLUTION = 100
+
 
 @dataclass
 class ConversionSetup:
@@ -56,13 +60,23 @@ class ConversionSetup:
     fotobook: Any       # Root <fotobook> XML element used by the page-processing stage.
     album_title: str    # Human-readable album name, used as the PDF document title.
 
-    available_fonts: Any        # Font faces successfully registered with ReportLab for this conversion.
+    available_fonts: Any        # Font faces available to this conversion; see ConversionState.deferred_fonts.
     line_scales: LineScales     # Default and per-font line-spacing rules read from the INI configuration.
 
     image_resolution: int       # Target DPI for ordinary images.
     background_resolution: int  # Target DPI for page-background images.
 
 
+def readClipartPaths(ceweFolder, keyAccountFolder, clipartFiles, appDataDir):
+    """Add the delivered cliparts to *clipartFiles* and return the clipart folders.
+
+    The clipart XML files are read through the catalogue in the app data
+    folder, which is closed again before the conversion starts.
+    """
+    with ClipartCatalogue(str(getCacheDirectory(appDataDir, 'indexes') / 'cliparts.sqlite')) as catalogue:
+        return readClipArtConfigXML(ceweFolder, keyAccountFolder, clipartFiles, catalogue)
+
+
 def prepareConversion(albumname, mcfxTmpDir, appDataDir, state: ConversionState,
                       automaticWindows: bool = False) -> ConversionSetup: # noqa: C901
     """Read an album and resolve the configuration and resources it requires."""
@@ -199,8 +213,8 @@ def prepareConversion(albumname, mcfxTmpDir, appDataDir, state: ConversionState,
     passepartoutFolders = tuple(
         os.path.expandvars(folder) for folder in configuredPassepartoutFolders if folder)
 
-    imageResolution = getConfigurationInt(defaultConfigSection, 'pdfImageResolution', '150', 100)
-    backgroundResolution = getConfigurationInt(defaultConfigSection, 'pdfBackgroundResolution', '150', 100)
+    imageResolution = getConfigurationInt(defaultConfigSection, 'pdfImageResolution', '150', MINIMUM_RESOLUTION)
+    backgroundResolution = getConfigurationInt(defaultConfigSection, 'pdfBackgroundResolution', '150', MINIMUM_RESOLUTION)
 
     mustsee.info(f'Using image resolution {imageResolution}, background resolution {backgroundResolution}')
 
@@ -208,11 +222,12 @@ def prepareConversion(albumname, mcfxTmpDir, appDataDir, state: ConversionState,
     if ceweFolder and keyAccountFolder is not None:
         passepartoutFolders += CeweInfo.getCewePassepartoutFolders(ceweFolder, keyAccountFolder)
 
-    availableFonts = findAndRegisterFonts(defaultConfigSection, appDataDir, albumBaseFolder, ceweFolder, state)
+    availableFonts = findAndRegisterFonts(defaultConfigSection, appDataDir, albumBaseFolder, ceweFolder, state,
+                                          fotobook)
     # Extra clipart file mappings work independently of the CEWE installation.
     # With no CEWE root this returns an empty delivered catalogue; a later
     # clipart lookup then uses its normal "not found" warning.
-    clipartPaths = readClipArtConfigXML(ceweFolder, keyAccountFolder, clipartFiles)
+    clipartPaths = readClipartPaths(ceweFolder, keyAccountFolder, clipartFiles, appDataDir)
 
     # Use names here rather than relying on ConversionSetup's declaration
     # order.  The dataclass is intentionally grouped for readability above,
@@ -9,19 +9,39 @@ Python process.
 from dataclasses import dataclass, field
 from typing import Any
 
+from clipartCache import RasterisedClipartCache
+from imageCache import DecodedImageCache
+from passepartoutIndex import PassepartoutIndex
+from passepartoutMasks import PassepartoutMaskCache
+from pathutils import ResourceLocator
+from persistentCache import FileDigests, PersistentBlobCache
+from vectorClipart import VectorClipartForms
+
 
 @dataclass
 class ConversionState:
-    """Mutable per-conversion caches, diagnostics, and temporary files.
+    """Mutable per-conversion caches and diagnostics.
 
     Font substitutions and message counters are deliberately here rather than
     at module scope: an album's configuration and its diagnostics must not
     affect the next album when a caller invokes :func:`convertMcf` twice.
     """
 
-    temporary_files: list[str] = field(default_factory=list)
     background_not_found_paths: set[str] = field(default_factory=set)
-    passepartout_files: dict[int, str] | None = None
+    background_files: dict[str, tuple[str, tuple[int, int]]] = field(default_factory=dict)
+    background_images: dict[tuple[str, Any], Any] = field(default_factory=dict)
+    resource_locator: ResourceLocator = field(default_factory=ResourceLocator)
+    passepartout_index: PassepartoutIndex = field(default_factory=PassepartoutIndex)
     missing_font_substitutions: dict[str, str] = field(default_factory=dict)
     noted_font_substitutions: set[str] = field(default_factory=set)
+    deferred_fonts: Any | None = None
+    font_resolver: Any | None = None
     message_counters: Any | None = None
+    decoded_images: DecodedImageCache = field(default_factory=DecodedImageCache)
+    file_digests: FileDigests = field(default_factory=FileDigests)
+    prepared_images: PersistentBlobCache | None = None
+    photo_pipeline: Any | None = None
+    rasterised_cliparts: RasterisedClipartCache = field(default_factory=RasterisedClipartCache)
+    passepartout_masks: PassepartoutMaskCache = field(default_factory=PassepartoutMaskCache)
+    vector_cliparts: VectorClipartForms = field(default_factory=VectorClipartForms)
+    image_budgets: dict[Any, Any] = field(default_factory=dict)
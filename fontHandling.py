@@ -1,7 +1,8 @@
+import html
 import logging
 import os
+import re
 
-from fontTools import ttLib
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 
@@ -9,8 +10,10 @@ from ceweInfo import CeweInfo
 from configUtils import getConfigurationBool
 from conversionState import ConversionState
 from extraLoggers import mustsee, configlogger
+from fontMetadata import FontMetadataCache
 from otf import getTtfsFromOtfs
 from pathutils import localfont_dir, systemfont_dirs, findFileInDirs, findFilesInDir
+from persistentCache import getCacheDirectory
 
 
 def addAdditionalFontsFromFile(configFontFileName, ttfFiles, fontDirs):
@@ -40,7 +43,13 @@ def addAdditionalFontsFromFile(configFontFileName, ttfFiles, fontDirs):
 
 
 def findAndRegisterFonts(configSection, appDataDir, albumBaseFolder, cewe_folder,
-                         state: ConversionState): # pylint: disable=too-many-statements
+                         state: ConversionState, fotobook=None): # pylint: disable=too-many-statements
+    """Find the available font files and register them with ReportLab.
+
+    With the album's *fotobook* element, fonts the album does not refer to
+    are registered only when :func:`getAvailableFont` first asks for them.
+    Returns the available fonts as a dictionary of font name to file.
+    """
     ttfFiles = []
     fontDirs = []
     recursiveFontDirs = []
@@ -83,17 +92,30 @@ def findAndRegisterFonts(configSection, appDataDir, albumBaseFolder, cewe_folder
 
     addTtfFilesFromFontdirs(ttfFiles, fontDirs, appDataDir, recursiveFontDirs)
 
-    buildFontsToRegisterFromTtfFiles(ttfFiles, fontsToRegister, familiesToRegister)
+    # The names of unchanged font files, and whether they could be registered,
+    # are remembered from earlier conversions
+    fontMetadata = FontMetadataCache(str(getCacheDirectory(appDataDir, 'indexes') / 'fonts.sqlite'))
+    buildFontsToRegisterFromTtfFiles(ttfFiles, fontsToRegister, familiesToRegister, fontMetadata)
 
     logging.info(f"Found {len(fontsToRegister)} fonts; registering them")
+    # Registering a font parses the whole font file. When the album is known, only the families
+    # it refers to, and their substitutes, are registered now, and other fonts on first use
+    eagerFontNames = None
+    if fotobook is not None:
+        state.deferred_fonts = DeferredFontRegistry(
+            fontsToRegister, familiesToRegister, readFontFamilyDefinitions(configSection), fontMetadata)
+        eagerFontNames = state.deferred_fonts.getFaces(getAlbumFontNames(fotobook, configSection))
     # We need to loop over the keys, not the list iterator, so we can delete keys from the list in the loop
     for curFontName in list(fontsToRegister):
-        try:
-            pdfmetrics.registerFont(TTFont(curFontName, fontsToRegister[curFontName]))
-            configlogger.info(f"Registered '{curFontName}' from '{fontsToRegister[curFontName]}'")
-        except: # noqa: E722 # pylint: disable=bare-except
-            configlogger.error(f"Failed to register font '{curFontName}' (from {fontsToRegister[curFontName]})")
-            del fontsToRegister[curFontName]    # remove this item from the font list, so it won't be used later and cause problems.
+        if eagerFontNames is not None and curFontName not in eagerFontNames:
+            state.deferred_fonts.pending[curFontName] = fontsToRegister[curFontName]
+            continue
+        registerFontFace(curFontName, fontsToRegister[curFontName], fontsToRegister, fontMetadata)
+    if state.deferred_fonts is not None:
+        configlogger.info(f"Deferred registration of {len(state.deferred_fonts.pending)} fonts "
+                          "which the album does not refer to")
+    fontMetadata.save()
+    configlogger.info(fontMetadata.summaryText())
 
     # The reportlab manual says:
     #  Before using the TT Fonts in Platypus we should add a mapping from the family name to the individual font
@@ -113,24 +135,119 @@ def findAndRegisterFonts(configSection, appDataDir, albumBaseFolder, cewe_folder
     registerFontFamilies(familiesToRegister, explicitlyRegisteredFamilyNames)
 
     loadMissingFontSubstitutions(configSection, fontsToRegister, state)
+    state.font_resolver = FontResolver(fontsToRegister, state)
 
     logging.info("Ended font registration")
 
     return fontsToRegister # pass back a list of all the available fonts
 
 
-def buildFontsToRegisterFromTtfFiles(ttfFiles, fontList, fontFamilyList):
+def registerFontFace(fontName, ttfFile, fontList, fontMetadata: FontMetadataCache):
+    """Register one font with ReportLab, removing it from *fontList* if that fails."""
+    registered = False
+    if not fontMetadata.hasFailedRegistration(ttfFile):
+        try:
+            pdfmetrics.registerFont(TTFont(fontName, ttfFile))
+            registered = True
+        except: # noqa: E722 # pylint: disable=bare-except
+            fontMetadata.noteRegistrationFailure(ttfFile)
+    if registered:
+        configlogger.info(f"Registered '{fontName}' from '{ttfFile}'")
+    else:
+        configlogger.error(f"Failed to register font '{fontName}' (from {ttfFile})")
+        del fontList[fontName]    # remove this item from the font list, so it won't be used later and cause problems.
+    return registered
+
+
+# The font family names in the HTML of text areas and TextArt, e.g. font-family:'Crafty Girls';
+FONT_FAMILY_STYLE = re.compile(r"font-family:\s*([^;\"]+)")
+
+
+def getAlbumFontNames(fotobook, configSection):
+    """Return the font names which the album's texts, TextArt and page numbers, and the
+    configured index font and missing-font substitutions of those, may refer to."""
+    fontNames = set()
+    for element in fotobook.iter():
+        if element.get('fontfamily') is not None:
+            fontNames.add(element.get('fontfamily'))
+        if element.text is not None and 'font-family' in element.text:
+            for match in FONT_FAMILY_STYLE.finditer(html.unescape(element.text)):
+                fontFamily = match.group(1).strip()
+                # text areas use the whole value, TextArt its first name
+                fontNames.add(fontFamily.strip("'"))
+                fontNames.add(fontFamily.split(",")[0].replace('"', '').replace("'", '').strip())
+    substitutions = dict(DEFAULT_MISSING_FONT_SUBSTITUTIONS)
+    for originalfont, newfont in readMissingFontSubstitutions(configSection):
+        if originalfont == '' and newfont == '':
+            substitutions = {}
+        elif originalfont != '' and newfont != '':
+            substitutions[originalfont] = newfont
+    fontNames.update([substitutions[fontName] for fontName in fontNames if substitutions.get(fontName)])
+    if configSection is not None and configSection.parser.has_section('INDEX'):
+        # AlbumIndex reads its font from the INDEX section and draws with it directly,
+        # not through getAvailableFont, so it must be registered before rendering
+        fontNames.add(configSection.parser['INDEX'].get("indexFont", "Helvetica").strip())
+    return fontNames
+
+
+class DeferredFontRegistry:
+    """Fonts found for a conversion which are registered with ReportLab only on first use.
+
+    Asking for a name registers every pending face which text in that family
+    may need: the faces of the family, its bold and italic faces, and the
+    faces named as in TextArt, e.g. "Crafty Girls Bold".
+    """
+
+    def __init__(self, fontList, fontFamilies, explicitFontFamilies, fontMetadata: FontMetadataCache):
+        self.font_list = fontList
+        self.font_metadata = fontMetadata
+        self.pending = {}
+        self.registered_on_demand = 0
+        self._family_faces = {}
+        for fontName, ttfFile in fontList.items():
+            fontFamily = fontMetadata.getNames(ttfFile)[0]
+            self._family_faces.setdefault(fontFamily, set()).add(fontName)
+        for familyName, members in list(fontFamilies.items()) + list(explicitFontFamilies.items()):
+            self._family_faces.setdefault(familyName, set()).update(
+                member for member in members.values() if member is not None)
+
+    def getFaces(self, fontNames):
+        """Return the names of the faces which text in any of *fontNames* may need."""
+        faces = set()
+        for fontName in fontNames:
+            for faceName in (fontName, f"{fontName} Bold", f"{fontName} Italic", f"{fontName} Bold Italic"):
+                faces.add(faceName)
+                faces.update(self._family_faces.get(faceName, ()))
+        return faces
+
+    def register(self, fontName):
+        """Register the pending faces which text in *fontName* may need.
+
+        Returns the names of the faces which failed to register.
+        """
+        failedFaces = []
+        if not self.pending:
+            return failedFaces
+        for faceName in sorted(self.getFaces([fontName]).intersection(self.pending)):
+            if not registerFontFace(faceName, self.pending.pop(faceName), self.font_list, self.font_metadata):
+                failedFaces.append(faceName)
+            self.registered_on_demand += 1
+        return failedFaces
+
+    def summaryText(self):
+        return (f'Deferred fonts: {self.registered_on_demand} registered on first use, '
+                f'{len(self.pending)} never used')
+
+
+def buildFontsToRegisterFromTtfFiles(ttfFiles, fontList, fontFamilyList, fontMetadata: FontMetadataCache = None):
+    if fontMetadata is None:
+        fontMetadata = FontMetadataCache()
     if len(ttfFiles) > 0:
         redefinedCount = 0
         ttfFiles = list(dict.fromkeys(ttfFiles)) # remove duplicates
         for ttfFile in ttfFiles:
-            font = ttLib.TTFont(ttfFile)
-
-            # See https://learn.microsoft.com/en-us/typography/opentype/spec/name#name-ids
-            # The dp4 fontviewer shows the contents of ttf files https://us.fontviewer.de/
-            fontFamily = font['name'].getDebugName(1) # eg Arial
-            fontSubFamily = font['name'].getDebugName(2) # eg Regular, Bold, Bold Italic
-            fontFullName = font['name'].getDebugName(4) # eg usually a combo of 1 and 2
+            # family eg Arial, subfamily eg Regular, Bold, Bold Italic, full name usually a combo of the two
+            fontFamily, fontSubFamily, fontFullName = fontMetadata.getNames(ttfFile)
             if fontFamily is None:
                 configlogger.warning(f'Could not get family (name) of font: {ttfFile}')
                 continue
@@ -256,6 +373,19 @@ def getExplicitlyRegisteredFamilyNames(defaultConfigSection, fontList):
     return explicitFamilyNames
 
 
+def readFontFamilyDefinitions(configSection):
+    """Return the valid FontFamilies definitions of the configuration, as family name to
+    normal, bold, italic and boldItalic font names."""
+    definitions = {}
+    if configSection is None:
+        return definitions
+    for explicitFontFamily in configSection.get('FontFamilies', '').splitlines():
+        members = [member.strip() for member in explicitFontFamily.split(",")]
+        if len(members) == 5:
+            definitions[members[0]] = dict(zip(("normal", "bold", "italic", "boldItalic"), members[1:]))
+    return definitions
+
+
 def addTtfFilesFromFontdirs(ttfFiles, fontDirs, appDataDir, recursiveFontDirs=()):
     if len(fontDirs) > 0:
         mustsee.info(f'Scanning for ttf/otf files in {str(fontDirs)}')
@@ -276,7 +406,9 @@ def addTtfFilesFromFontdirs(ttfFiles, fontDirs, appDataDir, recursiveFontDirs=()
             #   see https://github.com/bash0/cewe2pdf/issues/133
             otfFiles = findFilesInDir(fontDir, '*.otf', walk_structure=fontDir in recursiveFontDirs)
             if len(otfFiles) > 0:
-                ttfsFromOtfs = getTtfsFromOtfs(otfFiles,appDataDir)
+                # Earlier versions kept the converted fonts in the app data folder itself
+                fontsFolder = getCacheDirectory(appDataDir, 'fonts')
+                ttfsFromOtfs = getTtfsFromOtfs(otfFiles, str(fontsFolder), earlierTtfdirPath=str(fontsFolder.parent))
                 ttfFiles.extend(sorted(ttfsFromOtfs))
 
 
@@ -327,6 +459,19 @@ DEFAULT_MISSING_FONT_SUBSTITUTIONS = {
     # Segoe UI Symbol
     }
 
+def readMissingFontSubstitutions(configSection):
+    """Yield the (original font, new font) pairs configured in missingFontSubstitutions."""
+    if configSection is None:
+        return
+    fs = configSection.get('missingFontSubstitutions', '').splitlines()  # newline separated list of fontname: fontname pairs
+    ffs = list(filter(lambda fnp: (len(fnp) != 0), fs)) # filter out empty entries
+    f2fs = tuple(map(lambda fnp: os.path.expandvars(fnp), ffs)) # expand environment vars pylint: disable=unnecessary-lambda
+    for fnp in f2fs:
+        definition = fnp.split(':')
+        if len(definition) == 2:
+            yield definition[0].strip(), definition[1].strip()
+
+
 def loadMissingFontSubstitutions(configSection, availableFonts, state: ConversionState):
     """Build this conversion's missing-font substitution table.
 
@@ -347,28 +492,19 @@ def loadMissingFontSubstitutions(configSection, availableFonts, state: Conversio
         for originalfont, replacement in DEFAULT_MISSING_FONT_SUBSTITUTIONS.items()
         if replacement in usableReplacementFonts
     }
-    if configSection is None:
-        return
     # build the known missing font substitutions table
-    fs = configSection.get('missingFontSubstitutions', '').splitlines()  # newline separated list of fontname: fontname pairs
-    ffs = list(filter(lambda fnp: (len(fnp) != 0), fs)) # filter out empty entries
-    f2fs = tuple(map(lambda fnp: os.path.expandvars(fnp), ffs)) # expand environment vars pylint: disable=unnecessary-lambda
-    for fnp in f2fs:
-        definition = fnp.split(':')
-        if len(definition) == 2:
-            originalfont = definition[0].strip()
-            newfont = definition[1].strip()
-            if originalfont == '' and newfont == '':
-                state.missing_font_substitutions = {}
-            else:
-                if originalfont != '' and newfont != '':
-                    if newfont not in usableReplacementFonts:
-                        configlogger.error(f"Font substitution with '{newfont}' ignored, that font has not been found")
-                        continue
-                    state.missing_font_substitutions[originalfont] = newfont
-                else:
-                    configlogger.error(f"Invalid font substitution '{originalfont}' : '{newfont}' ignored")
+    for originalfont, newfont in readMissingFontSubstitutions(configSection):
+        if originalfont == '' and newfont == '':
+            state.missing_font_substitutions = {}
+        else:
+            if originalfont != '' and newfont != '':
+                if newfont not in usableReplacementFonts:
+                    configlogger.error(f"Font substitution with '{newfont}' ignored, that font has not been found")
                     continue
+                state.missing_font_substitutions[originalfont] = newfont
+            else:
+                configlogger.error(f"Invalid font substitution '{originalfont}' : '{newfont}' ignored")
+                continue
 
 
 def getMissingFontSubstitute(family, state: ConversionState):
@@ -394,13 +530,101 @@ def noteFontSubstitution(family, replacement, state: ConversionState):
         logging.warning(f"Using font family = '{replacement}' (wanted {family})")
 
 
-def getAvailableFont(family, pdf, additional_fonts, state: ConversionState):
-    reportlabFonts = pdf.getAvailableFonts()
-    if family in reportlabFonts:
-        bodyfont = family
-    elif family in additional_fonts:
-        bodyfont = family
-    else:
-        bodyfont = getMissingFontSubstitute(family, state)
-        noteFontSubstitution(family, bodyfont, state)
-    return bodyfont
+def getStyledFaceName(fontName, bold, italic):
+    """Return the name of the bold and/or italic face of *fontName*, by the usual naming convention."""
+    if bold and italic:
+        return f"{fontName} Bold Italic"
+    if bold:
+        return f"{fontName} Bold"
+    if italic:
+        return f"{fontName} Italic"
+    return fontName
+
+
+class FontResolver:
+    """The fonts used for the font names in an album, resolved once per conversion.
+
+    Text areas ask for a font for their body and for every span, so the
+    same few names are resolved over and over.  Each name is resolved once,
+    against a set of the standard fonts and those in *fontList*, and the
+    result remembered.  Substitutions are still noted on every use, as
+    before, and counted for the summary.
+    """
+
+    def __init__(self, fontList, state: ConversionState):
+        self.font_list = fontList
+        self.state = state
+        self.valid_names = set(pdfmetrics.standardFonts).union(fontList)
+        self.lookups = 0
+        self.substitutions = {}
+        self._families = {}
+        self._styled_faces = {}
+
+    def _registerDeferred(self, fontName):
+        if self.state.deferred_fonts is not None:
+            self.valid_names.difference_update(self.state.deferred_fonts.register(fontName))
+
+    def getFont(self, family):
+        """Return the font to use for *family*, substituting a missing one."""
+        self.lookups += 1
+        resolved = self._families.get(family)
+        if resolved is None:
+            resolved = self._resolveFamily(family)
+            self._families[family] = resolved
+        bodyfont, substituted = resolved
+        if substituted:
+            self.substitutions[family] = self.substitutions.get(family, 0) + 1
+            noteFontSubstitution(family, bodyfont, self.state)
+        return bodyfont
+
+    def _resolveFamily(self, family):
+        self._registerDeferred(family)
+        if family in self.valid_names:
+            return family, False
+        bodyfont = getMissingFontSubstitute(family, self.state)
+        if self.state.deferred_fonts is not None:
+            self._registerDeferred(bodyfont)
+            if bodyfont not in self.valid_names:
+                bodyfont = 'Helvetica' # the substitute failed its deferred registration
+        return bodyfont, True
+
+    def getStyledFace(self, fontName, bold, italic):
+        """Return the registered bold and/or italic face of *fontName*, as TextArt names it.
+
+        An unregistered face is replaced by the substitute of *fontName*.
+        """
+        self.lookups += 1
+        key = (fontName, bold, italic)
+        resolved = self._styled_faces.get(key)
+        if resolved is None:
+            self._registerDeferred(fontName)
+            faceName = getStyledFaceName(fontName, bold, italic)
+            try:
+                pdfmetrics.getFont(faceName)
+                resolved = faceName, False
+            except KeyError:
+                resolved = getMissingFontSubstitute(fontName, self.state), True
+            self._styled_faces[key] = resolved
+        face, substituted = resolved
+        if substituted:
+            self.substitutions[key[0]] = self.substitutions.get(key[0], 0) + 1
+        return face
+
+    def summaryText(self):
+        return (f'Font resolution: {self.lookups} lookups of {len(self._families) + len(self._styled_faces)} '
+                f'names, {sum(self.substitutions.values())} substitutions for {len(self.substitutions)} fonts')
+
+
+def getFontResolver(state: ConversionState, fontList=None):
+    """Return the conversion's FontResolver, made by :func:`findAndRegisterFonts`.
+
+    A caller with its own *fontList* gets a resolver for that list.
+    """
+    if state.font_resolver is None or (fontList is not None and state.font_resolver.font_list is not fontList):
+        state.font_resolver = FontResolver({} if fontList is None else fontList, state)
+    return state.font_resolver
+
+
+def getAvailableFont(family, pdf, additional_fonts, state: ConversionState): # pylint: disable=unused-argument
+    # Only ReportLab's standard fonts are available in every pdf, see pdf.getAvailableFonts()
+    return getFontResolver(state, additional_fonts).getFont(family)
@@ -0,0 +1,95 @@
+"""Names of font files, kept between conversions.
+
+Registering the available fonts reads the family, subfamily and full name
+from every .ttf file with fontTools.  With ``loadSystemFonts`` that can be
+thousands of files in every conversion, although they rarely change.  The
+names are stored in an SQLite database in the app data folder, see
+:mod:`sqliteStore`, keyed by path and checked against the file's size and modification time, so a later
+conversion only opens the font files which changed.  Fonts which ReportLab
+failed to register are remembered too, and are not tried again until they
+change.
+"""
+
+import os
+
+from fontTools import ttLib
+
+from sqliteStore import SqliteStore
+
+
+def readFontNames(ttfFile):
+    """Return the (family, subfamily, full name) of a font file; each may be None."""
+    font = ttLib.TTFont(ttfFile, lazy=True)
+    try:
+        # See https://learn.microsoft.com/en-us/typography/opentype/spec/name#name-ids
+        # The dp4 fontviewer shows the contents of ttf files https://us.fontviewer.de/
+        names = font['name']
+        return names.getDebugName(1), names.getDebugName(2), names.getDebugName(4) # eg Arial, Bold, Arial Bold
+    finally:
+        font.close()
+
+
+class FontMetadataCache(SqliteStore):
+    """Font names and registration failures by font file.
+
+    The stored names are read when the cache is created, and changes are
+    written by :meth:`save`; the database is not kept open in between.
+    """
+
+    DESCRIPTION = 'font name cache'
+    TABLES = ('CREATE TABLE fonts (path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, '
+              'family TEXT, subfamily TEXT, full_name TEXT, registration_failed INTEGER)',)
+
+    def __init__(self, databasePath=None):
+        super().__init__(databasePath)
+        self.files_read = 0
+        self.files_reused = 0
+        self._entries = {}
+        self._changed = set()
+        if databasePath is not None:
+            self._load()
+
+    def _load(self):
+        rows = self.run(lambda connection: connection.execute('SELECT * FROM fonts').fetchall())
+        self.close()
+        for row in rows:
+            self._entries[row[0]] = list(row[1:])
+
+    def _getEntry(self, ttfFile):
+        """Return the current entry of a font file, reading its names if it changed."""
+        ttfFile = os.path.abspath(ttfFile)
+        stat = os.stat(ttfFile)
+        entry = self._entries.get(ttfFile)
+        if entry is not None and entry[:2] == [stat.st_size, stat.st_mtime_ns]:
+            self.files_reused += 1
+            return entry
+        self.files_read += 1
+        entry = [stat.st_size, stat.st_mtime_ns, *readFontNames(ttfFile), 0]
+        self._entries[ttfFile] = entry
+        self._changed.add(ttfFile)
+        return entry
+
+    def getNames(self, ttfFile):
+        """Return the (family, subfamily, full name) of a font file; each may be None."""
+        return tuple(self._getEntry(ttfFile)[2:5])
+
+    def hasFailedRegistration(self, ttfFile):
+        """Return True if registering the unchanged font file failed before."""
+        return bool(self._getEntry(ttfFile)[5])
+
+    def noteRegistrationFailure(self, ttfFile):
+        self._getEntry(ttfFile)[5] = 1
+        self._changed.add(os.path.abspath(ttfFile))
+
+    def save(self):
+        """Write the names read in this conversion to the database."""
+        if self.database_path is None or not self._changed:
+            return
+        self.run(lambda connection: connection.executemany(
+            'INSERT OR REPLACE INTO fonts VALUES (?, ?, ?, ?, ?, ?, ?)',
+            [[path] + self._entries[path] for path in self._changed]))
+        self.close()
+        self._changed.clear()
+
+    def summaryText(self):
+        return f'Font names: {self.files_read} font files read, {self.files_reused} reused'
@@ -0,0 +1,157 @@
+"""Decoded photographs shared by the image areas of one conversion.
+
+An album frequently uses one photograph on the cover, on an inside page and as
+an image background.  A single-sided conversion also processes an image area
+spanning a double page once for each half.  Decoding the same file each time
+is wasted work, so the decoded result is kept here.
+
+Photos are kept as they are stored, without applying their EXIF orientation.
+A caller crops the region it needs with :func:`imageUtils.cropOriented`, so
+only that region is transposed rather than the whole frame.
+"""
+
+from math import ceil, sqrt
+import os
+
+from PIL import Image, JpegImagePlugin
+
+from imageUtils import getExifOrientation
+from memoryCache import ByteBoundedCache
+
+DEFAULT_DECODED_IMAGE_CACHE_MB = 256
+
+# A photograph reduced while it is decoded keeps at least this multiple of
+# the final pixel size, leaving the precise resampling filter real work to do.
+# Pillow's own thumbnail() uses the same default.
+DECODE_REDUCING_GAP = 2.0
+
+JPEG_DRAFT_REDUCTIONS = (8, 4, 2, 1)
+
+
+def estimateImageBytes(image):
+    """Approximate the memory held by a decoded Pillow image."""
+    return image.width * image.height * len(image.getbands())
+
+
+def getMaxDecodeReduction(factor):
+    """Return the largest integer shrink allowed for a final *factor* <= 1."""
+    if factor <= 0:
+        return 1
+    return max(1, int(1 / (factor * DECODE_REDUCING_GAP)))
+
+
+def getPixelCeilingReduction(size, maxPixels):
+    """Return the smallest reduction which brings *size* within *maxPixels*."""
+    width, height = size
+    if maxPixels <= 0 or width * height <= maxPixels:
+        return 1
+    reduction = max(1, ceil(sqrt(width * height / maxPixels)))
+    while ceil(width / reduction) * ceil(height / reduction) > maxPixels:
+        reduction += 1
+    return reduction
+
+
+def chooseDecodeReduction(image, maxReduction, maxPixels=0):
+    """Return the decode reduction available for an opened, unloaded image.
+
+    A *maxPixels* ceiling above zero takes precedence over the resolution
+    which the caller would like to keep.
+    """
+    maxReduction = max(1, min(maxReduction, image.width, image.height))
+    minReduction = min(getPixelCeilingReduction(image.size, maxPixels), image.width, image.height)
+    if image.format in ('JPEG', 'MPO'):
+        reduction = next(reduction for reduction in JPEG_DRAFT_REDUCTIONS if reduction <= maxReduction)
+        if reduction >= minReduction:
+            return reduction
+        for reduction in reversed(JPEG_DRAFT_REDUCTIONS):
+            if reduction >= minReduction:
+                return reduction
+        return minReduction
+    return max(minReduction, maxReduction)
+
+
+def decodeReduced(image, reduction):
+    """Load an opened image, shrinking it by *reduction* as it is decoded.
+
+    Return the loaded image and its ``(x, y)`` scale, the original size
+    divided by the decoded size in each direction.  Both the scaled DCT
+    decoding and Image.reduce() round the reduced size up, so the scale of
+    a small image is less than *reduction* and may differ between axes.
+    """
+    originalSize = image.size
+    if reduction > 1 and image.format in ('JPEG', 'MPO'):
+        # draft() picks the largest DCT scale whose result is at least the
+        # requested size, so request exactly 1/reduction of each dimension.
+        drafted = image.draft(image.mode, (image.width // reduction, image.height // reduction))
+        image.load()
+        # draft() reports the box of the original covered by the decoded image.
+        draftReduction = round(originalSize[0] / drafted[1][2]) if drafted is not None else 1
+        if draftReduction < reduction:
+            # Only a pixel ceiling asks for more than libjpeg's 1/8 scale.
+            image = image.reduce(ceil(reduction / draftReduction))
+    else:
+        image.load()
+        if reduction > 1:
+            image = image.reduce(reduction)
+    return image, (originalSize[0] / image.width, originalSize[1] / image.height)
+
+
+def openImage(imagePath, maxPixels=0):
+    """Open a photo, allowing giant JPEG files when a pixel ceiling applies.
+
+    Under a ceiling a JPEG file is never decoded at full size, so it is opened
+    with the JPEG plugin directly, which skips Pillow's decompression bomb
+    check for this file only.  Other formats are opened with the check.
+    """
+    if maxPixels > 0:
+        with open(imagePath, 'rb') as imageFile:
+            isJpeg = imageFile.read(3) == b'\xff\xd8\xff'
+        if isJpeg:
+            try:
+                return JpegImagePlugin.jpeg_factory(imagePath)
+            except SyntaxError:
+                pass # Image.open reports a broken file as usual
+    return Image.open(imagePath)
+
+
+class DecodedImageCache(ByteBoundedCache):
+    """Least-recently-used cache of decoded photographs in stored orientation.
+
+    Entries are keyed by file path, modification time and decode reduction,
+    so an edited file is decoded again.  Callers receive the shared image
+    and must not modify it in place; Pillow's crop, resize
+    and convert operations all return new images.
+    """
+
+    def __init__(self, maxBytes=DEFAULT_DECODED_IMAGE_CACHE_MB * 1024 * 1024):
+        super().__init__('Decoded image', maxBytes)
+
+    def getImage(self, imagePath, maxReduction=1, maxPixels=0):
+        """Return ``(image, scale, orientation)`` for *imagePath*.
+
+        ``image`` is not yet transposed for its EXIF ``orientation``.
+
+        *maxReduction* is the largest integer factor by which the caller can
+        accept the image being shrunk while it is decoded.  JPEG and MPO files
+        use libjpeg's scaled DCT decoding, restricted to 1/2, 1/4 and 1/8;
+        other formats are decoded and then reduced by an integer box filter.
+        The returned image is smaller than the original by the ``(x, y)``
+        ``scale``, see :func:`decodeReduced`.
+
+        A *maxPixels* ceiling above zero bounds the decoded image, reducing it
+        further if necessary.  JPEG files then never exist at full size in
+        memory, so they are also exempt from Pillow's decompression bomb
+        check; other formats must still be decoded fully before reduction.
+        """
+        image = openImage(imagePath, maxPixels)
+        reduction = chooseDecodeReduction(image, maxReduction, maxPixels)
+        key = (os.path.abspath(imagePath), os.stat(imagePath).st_mtime_ns, reduction)
+        cachedEntry = self.get(key)
+        if cachedEntry is not None:
+            image.close()
+            return cachedEntry
+
+        orientation = getExifOrientation(image)
+        image, scale = decodeReduced(image, reduction)
+        self.put(key, (image, scale, orientation), estimateImageBytes(image))
+        return image, scale, orientation
@@ -1,29 +1,84 @@
-import PIL
+from PIL import Image
 
+ExifRotationTag = 274
 
-def autorot(im):
+# The transposes which turn a photo stored with each EXIF orientation upright.
+OrientationTransposes = {
+    2: (Image.Transpose.FLIP_LEFT_RIGHT,),
+    3: (Image.Transpose.ROTATE_180,),
+    4: (Image.Transpose.FLIP_TOP_BOTTOM,),
+    5: (Image.Transpose.FLIP_TOP_BOTTOM, Image.Transpose.ROTATE_90),
+    6: (Image.Transpose.ROTATE_270,),
+    7: (Image.Transpose.FLIP_LEFT_RIGHT, Image.Transpose.ROTATE_90),
+    8: (Image.Transpose.ROTATE_90,),
+}
+
+
+def getExifOrientation(im):
+    """Return the EXIF orientation (1..8) which autorot would apply to *im*."""
     # some cameras return JPEG in MPO container format. Just use the first image.
     if im.format not in ('JPEG', 'MPO'):
-        return im
-    ExifRotationTag = 274
+        return 1
     exifdict = im.getexif()
     if exifdict is not None and ExifRotationTag in list(exifdict.keys()):
-        orientation = exifdict[ExifRotationTag]
-        # The PIL.Image values must be dynamic in some way so disable pylint no-member
-        if orientation == 2:
-            im = im.transpose(PIL.Image.FLIP_LEFT_RIGHT) # pylint: disable=no-member
-        elif orientation == 3:
-            im = im.transpose(PIL.Image.ROTATE_180) # pylint: disable=no-member
-        elif orientation == 4:
-            im = im.transpose(PIL.Image.FLIP_TOP_BOTTOM) # pylint: disable=no-member
-        elif orientation == 5:
-            im = im.transpose(PIL.Image.FLIP_TOP_BOTTOM) # pylint: disable=no-member
-            im = im.transpose(PIL.Image.ROTATE_90) # pylint: disable=no-member
-        elif orientation == 6:
-            im = im.transpose(PIL.Image.ROTATE_270) # pylint: disable=no-member
-        elif orientation == 7:
-            im = im.transpose(PIL.Image.FLIP_LEFT_RIGHT) # pylint: disable=no-member
-            im = im.transpose(PIL.Image.ROTATE_90) # pylint: disable=no-member
-        elif orientation == 8:
-            im = im.transpose(PIL.Image.ROTATE_90) # pylint: disable=no-member
+        return exifdict[ExifRotationTag]
+    return 1
+
+
+def applyOrientation(im, orientation):
+    """Return *im* transposed as EXIF *orientation* requires."""
+    for transpose in OrientationTransposes.get(orientation, ()):
+        im = im.transpose(transpose)
     return im
+
+
+def autorot(im):
+    return applyOrientation(im, getExifOrientation(im))
+
+
+def getUprightSize(storedSize, orientation):
+    """Return a (width, height) of the stored photo as it is after applying *orientation*."""
+    width, height = storedSize
+    if orientation in (5, 6, 7, 8):
+        return height, width
+    return width, height
+
+
+def getStoredBox(box, storedSize, orientation):
+    """Map a crop *box* of the upright photo onto the photo as it is stored.
+
+    *storedSize* is the size of the stored, not yet transposed, image.
+    Transposes only move pixels, so cropping the stored image with the
+    returned box and then applying the orientation gives exactly the same
+    pixels as cropping the upright image with *box*.
+    """
+    transposes = OrientationTransposes.get(orientation, ())
+    sizes = [storedSize]
+    for transpose in transposes:
+        width, height = sizes[-1]
+        if transpose in (Image.Transpose.ROTATE_90, Image.Transpose.ROTATE_270):
+            sizes.append((height, width))
+        else:
+            sizes.append((width, height))
+    # Undo the transposes in reverse order, each from the size it produced.
+    left, top, right, bottom = box
+    for transpose, (width, height) in zip(reversed(transposes), reversed(sizes[:-1])):
+        if transpose == Image.Transpose.FLIP_LEFT_RIGHT:
+            left, right = width - right, width - left
+        elif transpose == Image.Transpose.FLIP_TOP_BOTTOM:
+            top, bottom = height - bottom, height - top
+        elif transpose == Image.Transpose.ROTATE_180:
+            left, top, right, bottom = width - right, height - bottom, width - left, height - top
+        elif transpose == Image.Transpose.ROTATE_90:
+            # The upright pixel (x, y) is stored at (width - 1 - y, x).
+            left, top, right, bottom = width - bottom, left, width - top, right
+        else:
+            # ROTATE_270: the upright pixel (x, y) is stored at (y, height - 1 - x).
+            left, top, right, bottom = top, height - right, bottom, height - left
+    return (left, top, right, bottom)
+
+
+def cropOriented(storedImage, box, orientation):
+    """Return the *box* crop of the upright photo, transposing only the crop."""
+    storedBox = getStoredBox(box, storedImage.size, orientation)
+    return applyOrientation(storedImage.crop(storedBox), orientation)
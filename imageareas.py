@@ -2,84 +2,134 @@
 
 import logging
 import os
-import tempfile
-from math import sqrt
+from dataclasses import dataclass
+from math import floor, sqrt
 
-import PIL
-from reportlab.lib.utils import ImageReader
+from PIL import Image
 
 from ceweInfo import AlbumInfo
-from clipArt import getClipConfig, loadClipart
+from cewePageResolver import getPageElementForPageNumber
+from clipArt import getClipConfig
 from clipartareas import insertClipartFile
 from conversionState import ConversionState
-from corners import applyCornerMask, getCornersInfo
-from imageUtils import autorot
+from corners import getCornersInfo
+from imageCache import getMaxDecodeReduction
+from pageTypes import PageProcessingType
 from passepartout import Passepartout
+from photoPreparation import PhotoPreparation, getPreparedPhoto
 from renderContext import RenderContext
 
 
-def processAreaImageTag(imageTag, area, areaHeight, areaRot, areaWidth, imageDirectory,
-                        productStyle, mcfBaseFolder, pageType, pdf, pageWidth,
-                        transx, transy, context: RenderContext, state: ConversionState,
-                        drawShadow, drawBorders):
-    """Crop, decorate and draw one CEWE image area."""
-    if imageTag.get('filename') is None:
-        return
+@dataclass(frozen=True)
+class ImageBudget:
+    """Resolution and JPEG quality chosen for one photo by a size budget."""
 
-    mcf2rl = context.mcf_to_reportlab
+    resolution: int             # DPI, an upper limit on the configured resolution.
+    jpeg_quality: int
+
+
+@dataclass(frozen=True)
+class PassepartoutLayout:
+    """The passepartout frame and the photo window inside it, if any."""
+
+    frame_clipart_file_name: str | None = None
+    mask_clipart_file_name: str | None = None
+    frame_delta_x_mcfunit: float = 0
+    frame_delta_y_mcfunit: float = 0
+    crop_width_mcfunit: float | None = None     # None means the whole area.
+    crop_height_mcfunit: float | None = None
+
+    def getCropSize(self, areaHeight, areaWidth):
+        """Return the width and height of the visible photo, in MCF units."""
+        if self.crop_width_mcfunit is None:
+            return areaWidth, areaHeight
+        return self.crop_width_mcfunit, self.crop_height_mcfunit
+
+
+def getDrawnPageElement(resolvedPage, fotobook, productStyle):
+    """Return the page element whose areas are drawn for *resolvedPage*."""
+    if (AlbumInfo.isAlbumProduct(productStyle)
+            and resolvedPage.page_type == PageProcessingType.RegularPage
+            and resolvedPage.odd_page):
+        # All elements for each page pair are defined on the even page element.
+        return getPageElementForPageNumber(fotobook, 2 * floor(resolvedPage.page_number / 2))
+    return resolvedPage.element
+
+
+def iterPageImageTags(resolvedPages, fotobook, productStyle):
+    """Yield ``(resolvedPage, page, area, imageTag)`` for the photos of each page.
+
+    Every image element is yielded in drawing order, including those of
+    areas which the renderer may later skip.
+    """
+    for resolvedPage in resolvedPages:
+        page = getDrawnPageElement(resolvedPage, fotobook, productStyle)
+        if page is None:
+            continue
+        for area in page.findall('area'):
+            for imageTag in area.findall('imagebackground') + area.findall('image'):
+                if imageTag.get('filename') is not None:
+                    yield resolvedPage, page, area, imageTag
+
+
+def getAreaSize(area):
+    """Return the width and height of an area, in MCF units."""
+    areaPos = area.find('position')
+    return (float(areaPos.get('width').replace(',', '.')),
+            float(areaPos.get('height').replace(',', '.')))
+
+
+def getImagePath(imageTag, imageDirectory, mcfBaseFolder):
+    """Return the photo file used by an image or imagebackground element."""
     imagePath = os.path.join(mcfBaseFolder, imageDirectory, imageTag.get('filename'))
     # The layout software copies the images to another collection folder.
-    imagePath = imagePath.replace('safecontainer:/', '')
-    image = PIL.Image.open(imagePath)
+    return imagePath.replace('safecontainer:/', '')
 
-    imageTransx = transx
-    if (imageTag.get('backgroundPosition') == 'RIGHT_OR_BOTTOM' and
-            AlbumInfo.isAlbumDoubleSide(productStyle)):
-        # A double-side output canvas still uses the full CEWE spread.  The
-        # background position identifies its right half.  In single-side
-        # output, pageElements has already moved that half to local page
-        # coordinates, so applying another page-width shift would draw the
-        # image completely off the PDF page.
-        imageTransx += mcf2rl * pageWidth / 2
 
+def getPassepartoutLayout(imageTag, areaHeight, areaWidth, context: RenderContext,
+                          state: ConversionState, warnIfMissing=True) -> PassepartoutLayout:
+    """Look up the passepartout decoration of an image element."""
+    passepartoutId = imageTag.get('passepartoutDesignElementId')
+    if passepartoutId is None:
+        return PassepartoutLayout()
+
+    passepartoutId = int(passepartoutId)
+    passepartoutInfo = state.passepartout_index.getInfo(passepartoutId, context.passepartout_folders)
+    if passepartoutInfo is None:
+        if warnIfMissing:
+            logging.warning(f"Could not find passepartout {passepartoutId}; rendering the unframed image.")
+        return PassepartoutLayout()
+
+    frameClipartFileName = Passepartout.getClipartFullName(passepartoutInfo)
+    maskClipartFileName = Passepartout.getMaskFullName(passepartoutInfo)
+    if warnIfMissing:
+        logging.debug(f"Using mask file: {maskClipartFileName}")
+    if passepartoutInfo.fotoarea_x is None:
+        return PassepartoutLayout(frameClipartFileName, maskClipartFileName)
+    return PassepartoutLayout(
+        frameClipartFileName, maskClipartFileName,
+        passepartoutInfo.fotoarea_x * areaWidth, passepartoutInfo.fotoarea_y * areaHeight,
+        passepartoutInfo.fotoarea_width * areaWidth, passepartoutInfo.fotoarea_height * areaHeight)
+
+
+def getPhotoPreparation(imageTag, area, areaHeight, areaWidth, imagePath, pageType,
+                        layout: PassepartoutLayout, context: RenderContext,
+                        budget: ImageBudget = None) -> PhotoPreparation:
+    """Describe the prepared pixels needed for one image element.
+
+    A *budget* lowers the resolution and JPEG quality from the configured ones.
+    """
     # The source image is first cropped in MCF coordinates, then resized for
     # the output PDF. Decorations are applied to that final crop so masks,
     # corners, shadows and borders all describe the visible image rather than
     # the original photograph.
-    image = autorot(image)
     imageLeft = float(imageTag.find('cutout').get('left').replace(',', '.'))
     imageTop = float(imageTag.find('cutout').get('top').replace(',', '.'))
     imageScale = float(imageTag.find('cutout').get('scale'))
 
-    passepartoutId = imageTag.get('passepartoutDesignElementId')
-    frameClipartFileName = None
-    maskClipartFileName = None
-    frameDeltaX_mcfunit = 0
-    frameDeltaY_mcfunit = 0
-    frameAlpha = 255
-    imageCropWidth_mcfunit = areaWidth
-    imageCropHeight_mcfunit = areaHeight
-    if passepartoutId is not None:
-        passepartoutId = int(passepartoutId)
-        if state.passepartout_files is None:
-            logging.info("Regenerating passepartout index from .XML files.")
-            state.passepartout_files = Passepartout.buildElementIdIndex(context.passepartout_folders)
-        try:
-            passepartoutXmlFileName = state.passepartout_files[passepartoutId]
-        except KeyError:
-            passepartoutXmlFileName = None
-        if passepartoutXmlFileName is None:
-            logging.warning(f"Could not find passepartout {passepartoutId}; rendering the unframed image.")
-        else:
-            passepartoutInfo = Passepartout.extractInfoFromXml(passepartoutXmlFileName, passepartoutId)
-            frameClipartFileName = Passepartout.getClipartFullName(passepartoutInfo)
-            maskClipartFileName = Passepartout.getMaskFullName(passepartoutInfo)
-            logging.debug(f"Using mask file: {maskClipartFileName}")
-            if passepartoutInfo.fotoarea_x is not None:
-                frameDeltaX_mcfunit = passepartoutInfo.fotoarea_x * areaWidth
-                frameDeltaY_mcfunit = passepartoutInfo.fotoarea_y * areaHeight
-                imageCropWidth_mcfunit = passepartoutInfo.fotoarea_width * areaWidth
-                imageCropHeight_mcfunit = passepartoutInfo.fotoarea_height * areaHeight
+    frameDeltaX_mcfunit = layout.frame_delta_x_mcfunit
+    frameDeltaY_mcfunit = layout.frame_delta_y_mcfunit
+    imageCropWidth_mcfunit, imageCropHeight_mcfunit = layout.getCropSize(areaHeight, areaWidth)
 
     # Crop co-ordinates can lie outside the image. Pillow fills that area with
     # black, which is acceptable for the exceptional passepartout case.
@@ -89,7 +139,8 @@ def processAreaImageTag(imageTag, area, areaHeight, areaRot, areaWidth, imageDir
                     imageCropWidth_mcfunit / imageScale)
     cropLower = int(0.5 - imageTop / imageScale + 0 * frameDeltaY_mcfunit / imageScale +
                     imageCropHeight_mcfunit / imageScale)
-    image = image.crop((cropLeft, cropUpper, cropRight, cropLower))
+    sourceLeft = -imageLeft / imageScale
+    sourceUpper = -imageTop / imageScale
 
     # Retain the established page-type check, including its historical string
     # comparison, so this extraction does not change rendered output.
@@ -97,27 +148,80 @@ def processAreaImageTag(imageTag, area, areaHeight, areaRot, areaWidth, imageDir
         resolution = context.background_resolution
     else:
         resolution = context.image_resolution
+    jpegQuality = context.image_quality
+    if budget is not None:
+        resolution = min(resolution, budget.resolution)
+        jpegQuality = budget.jpeg_quality
     newWidth = int(0.5 + imageCropWidth_mcfunit * resolution / 254.0)
     newHeight = int(0.5 + imageCropHeight_mcfunit * resolution / 254.0)
-    factor = sqrt(newWidth * newHeight / float(image.size[0] * image.size[1]))
-    if factor <= 0.8:
-        image = image.resize((newWidth, newHeight), context.image_resampling_filter)
-    image.load()
-
-    if maskClipartFileName is not None:
-        maskClipart = loadClipart(maskClipartFileName, context.clipart_paths)
-        image = maskClipart.applyAsAlphaMaskToFoto(image)
-
-    cornersInfo = getCornersInfo(area)
-    image = applyCornerMask(image, cornersInfo, imageCropWidth_mcfunit)
-
-    temporaryImage = tempfile.NamedTemporaryFile()
-    # The file must be closed before PIL can reopen it on Windows.
-    temporaryImage.close()
-    if image.mode in ('RGBA', 'P'):
-        image.save(temporaryImage.name, "PNG")
-    else:
-        image.save(temporaryImage.name, "JPEG", quality=context.image_quality)
+    cropPixels = float((cropRight - cropLeft) * (cropLower - cropUpper))
+    factor = sqrt(newWidth * newHeight / cropPixels)
+    outputSize = (newWidth, newHeight) if factor <= 0.8 else None
+
+    # In bounded-memory mode no prepared photo may exceed the pixel ceiling,
+    # whatever the resolution settings would otherwise ask for.
+    maxPixels = context.max_image_pixels
+    ceilingWidth, ceilingHeight = outputSize or (cropRight - cropLeft, cropLower - cropUpper)
+    if 0 < maxPixels < ceilingWidth * ceilingHeight:
+        ceilingScale = sqrt(maxPixels / (ceilingWidth * ceilingHeight))
+        outputSize = (max(1, int(ceilingWidth * ceilingScale)), max(1, int(ceilingHeight * ceilingScale)))
+        factor = sqrt(outputSize[0] * outputSize[1] / cropPixels)
+
+    # Work out the final pixel budget before decoding, so that a large camera
+    # original can be shrunk by the decoder rather than fully decoded and then
+    # discarded.
+    return PhotoPreparation(
+        image_path=imagePath,
+        crop_box=(cropLeft, cropUpper, cropRight, cropLower),
+        source_box=(sourceLeft, sourceUpper,
+                    sourceLeft + imageCropWidth_mcfunit / imageScale,
+                    sourceUpper + imageCropHeight_mcfunit / imageScale),
+        output_size=outputSize,
+        max_reduction=getMaxDecodeReduction(factor) if outputSize is not None else 1,
+        resampling_filter=context.image_resampling_filter,
+        jpeg_quality=jpegQuality,
+        mask_file_name=layout.mask_clipart_file_name,
+        clipart_paths=context.clipart_paths,
+        corners_info=getCornersInfo(area),
+        crop_width_mcfunit=imageCropWidth_mcfunit,
+        max_pixels=maxPixels)
+
+
+def processAreaImageTag(imageTag, area, areaHeight, areaRot, areaWidth, imageDirectory,
+                        productStyle, mcfBaseFolder, pageType, pdf, pageWidth,
+                        transx, transy, context: RenderContext, state: ConversionState,
+                        drawShadow, drawBorders):
+    """Crop, decorate and draw one CEWE image area."""
+    if imageTag.get('filename') is None:
+        return
+
+    mcf2rl = context.mcf_to_reportlab
+    imagePath = getImagePath(imageTag, imageDirectory, mcfBaseFolder)
+
+    imageTransx = transx
+    if (imageTag.get('backgroundPosition') == 'RIGHT_OR_BOTTOM' and
+            AlbumInfo.isAlbumDoubleSide(productStyle)):
+        # A double-side output canvas still uses the full CEWE spread.  The
+        # background position identifies its right half.  In single-side
+        # output, pageElements has already moved that half to local page
+        # coordinates, so applying another page-width shift would draw the
+        # image completely off the PDF page.
+        imageTransx += mcf2rl * pageWidth / 2
+
+    layout = getPassepartoutLayout(imageTag, areaHeight, areaWidth, context, state)
+    frameClipartFileName = layout.frame_clipart_file_name
+    frameDeltaX_mcfunit = layout.frame_delta_x_mcfunit
+    frameDeltaY_mcfunit = layout.frame_delta_y_mcfunit
+    frameAlpha = 255
+    preparation = getPhotoPreparation(imageTag, area, areaHeight, areaWidth, imagePath,
+                                      pageType, layout, context, state.image_budgets.get(imageTag))
+    imageCropWidth_mcfunit, imageCropHeight_mcfunit = layout.getCropSize(areaHeight, areaWidth)
+    cornersInfo = preparation.corners_info
+
+    image, pdfImage = getPreparedPhoto(preparation, state)
+    if image is None and area.find('decoration/shadow') is not None:
+        # The shadow of an opaque photograph depends only on its size.
+        image = Image.new('L', pdfImage.size, 255)
 
     logging.debug(f"image: {imageTag.get('filename')}")
     pdf.translate(imageTransx, transy)
@@ -133,7 +237,7 @@ def processAreaImageTag(imageTag, area, areaHeight, areaRot, areaWidth, imageDir
         drawShadow(decorationTag, areaHeight, areaWidth, pdf, context, state,
                    image, imageCropWidth_mcfunit, imageCropHeight_mcfunit)
 
-    pdf.drawImage(ImageReader(temporaryImage.name),
+    pdf.drawImage(pdfImage,
                   mcf2rl * -0.5 * imageCropWidth_mcfunit,
                   mcf2rl * -0.5 * imageCropHeight_mcfunit,
                   width=mcf2rl * imageCropWidth_mcfunit,
@@ -144,12 +248,10 @@ def processAreaImageTag(imageTag, area, areaHeight, areaRot, areaWidth, imageDir
         colorReplacements, _flipX, _flipY = getClipConfig(imageTag)
         insertClipartFile(frameClipartFileName, colorReplacements, 0, areaWidth,
                           areaHeight, frameAlpha, pdf, 0, 0, False, False,
-                          None, context)
+                          None, context, state=state)
 
     for decorationTag in area.findall('decoration'):
         drawBorders(decorationTag, areaHeight, areaWidth, pdf, context, cornersInfo)
 
     pdf.rotate(areaRot)
     pdf.translate(-imageTransx, -transy)
-
-    state.temporary_files.append(temporaryImage.name)
@@ -0,0 +1,60 @@
+"""Size-limited in-memory caches for the duration of one conversion.
+
+Decoded photos, rasterised clip art and passepartout alpha channels are all
+kept in memory while they are likely to be used again.  Each kind of cache
+differs only in its keys and values; the least-recently-used bookkeeping,
+the size limit and the statistics are shared here.
+"""
+
+from collections import OrderedDict
+
+
+class ByteBoundedCache:
+    """Least-recently-used cache whose entries together use at most *maxBytes*.
+
+    The caller states the size of each value when storing it.  A value
+    larger than the whole cache is not kept: it would evict everything else
+    and still not guarantee a later hit.
+    """
+
+    def __init__(self, description, maxBytes):
+        self.description = description
+        self.max_bytes = maxBytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        """Return the value stored for *key*, or None."""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key, value, valueBytes):
+        """Store *value* for *key*, replacing any value already stored for it."""
+        replacedEntry = self._entries.pop(key, None)
+        if replacedEntry is not None:
+            self.current_bytes -= replacedEntry[1]
+        if valueBytes > self.max_bytes:
+            return
+        self._entries[key] = (value, valueBytes)
+        self.current_bytes += valueBytes
+        while self.current_bytes > self.max_bytes:
+            _oldKey, (_oldValue, oldBytes) = self._entries.popitem(last=False)
+            self.current_bytes -= oldBytes
+            self.evictions += 1
+
+    def clear(self):
+        """Release every cached value."""
+        self._entries.clear()
+        self.current_bytes = 0
+
+    def summaryText(self):
+        return (f'{self.description} cache: {self.hits} hits, {self.misses} misses, '
+                f'{self.evictions} evictions, limit {self.max_bytes // (1024 * 1024)} MB')
@@ -3,16 +3,20 @@
 # This code is heavily based on https://github.com/awesometoolbox/otf2ttf/blob/master/src/otf2ttf/cli.py
 # and https://github.com/SwagLyrics/SwagLyrics-For-Spotify/blob/master/swaglyrics/__init__.py#L8-L32
 
+import multiprocessing
+import multiprocessing.connection
 import os
+from pathlib import Path
+import time
 
 from fontTools.pens.cu2quPen import Cu2QuPen
-from fontTools.misc.cliTools import makeOutputFileName
 from fontTools.pens.ttGlyphPen import TTGlyphPen
 from fontTools.ttLib import TTFont, newTable
 from fontTools.cu2qu import errors # noqa: errors not used here, but this ensures that pyinstaller gets it pylint: disable=unused-import
 
 from extraLoggers import configlogger
 from pathutils import appdata_dir
+from persistentCache import FileDigests
 
 # default approximation error, measured in UPEM
 MAX_ERR = 1.0
@@ -21,6 +25,10 @@ POST_FORMAT = 2.0
 # assuming the input contours' direction is correctly set (counter-clockwise),
 # we just flip it to clockwise
 REVERSE_DIRECTION = True
+# seconds allowed for converting one font; some fonts make the conversion hang
+CONVERSION_TIMEOUT = 120
+# hex digits of the otf file's content digest used in the ttf file name
+CONTENT_NAME_DIGITS = 16
 
 
 def glyphs_to_quadratic(
@@ -80,38 +88,150 @@ def otf_to_ttf(ttFont, post_format=POST_FORMAT, **kwargs):
     ttFont.sfntVersion = "\000\001\000\000"
 
 
-def getTtfsFromOtfs(otfFiles, ttfdirPath=None):
-    resultingTtfFiles = []
+def convertOtfFile(otfFile, ttfFile, failureFile):
+    """Convert one otf file, normally in a process of its own.
 
+    The ttf file is written under a temporary name and then renamed, so it
+    only exists once it is complete.  If the conversion fails, the reason
+    is written to *failureFile* instead.
+    """
+    try:
+        font = TTFont(otfFile, fontNumber=0) # options.face_index
+        otf_to_ttf(
+            font,
+            post_format=POST_FORMAT, # options.post_format
+            max_err=MAX_ERR, # options.max_error
+            reverse_direction=REVERSE_DIRECTION, # options.reverse_direction
+        )
+        temporaryFile = f"{ttfFile}.{os.getpid()}.tmp"
+        font.save(temporaryFile)
+        os.replace(temporaryFile, ttfFile)
+    except MemoryError:
+        raise # not a fault of the font; the conversion is tried again next time
+    except Exception as ex: # pylint: disable=broad-exception-caught
+        writeConversionFailure(failureFile, f"{type(ex).__name__}: {ex}")
+
+
+def writeConversionFailure(failureFile, reason):
+    try:
+        with open(failureFile, "w", encoding="utf-8") as failure:
+            failure.write(reason)
+    except OSError as ex:
+        configlogger.warning(f"Could not record the failed font conversion in {failureFile}: {ex}")
+
+
+def readConversionFailure(failureFile):
+    """Return the recorded reason why a conversion failed, or None if it did not fail."""
+    try:
+        with open(failureFile, encoding="utf-8") as failure:
+            return failure.read()
+    except OSError:
+        return None
+
+
+def convertOtfFiles(conversions, jobs=None, timeout=CONVERSION_TIMEOUT):
+    """Run the (otfFile, ttfFile, failureFile) conversions in parallel processes.
+
+    A conversion which is still running after *timeout* seconds is stopped
+    and recorded as failed.  A process which ends without a result or a
+    recorded exception, e.g. because it was killed, is not recorded, so
+    its conversion is tried again next time.  If the conversions are
+    interrupted, the running processes are stopped and nothing is recorded.
+    """
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    pending = list(conversions)
+    running = {} # process sentinel -> (process, conversion, deadline)
+    try:
+        while pending or running:
+            while pending and len(running) < jobs:
+                conversion = pending.pop(0)
+                process = multiprocessing.Process(target=convertOtfFile, args=conversion, daemon=True)
+                process.start()
+                running[process.sentinel] = (process, conversion, time.monotonic() + timeout)
+
+            nextDeadline = min(deadline for _, _, deadline in running.values())
+            finished = multiprocessing.connection.wait(list(running), max(0.0, nextDeadline - time.monotonic()))
+            now = time.monotonic()
+            for sentinel, (process, conversion, deadline) in list(running.items()):
+                if sentinel not in finished and deadline > now:
+                    continue
+                del running[sentinel]
+                otfFile, ttfFile, failureFile = conversion
+                if sentinel not in finished:
+                    process.terminate()
+                    process.join()
+                    writeConversionFailure(failureFile, f"the conversion did not finish within {timeout}s")
+                else:
+                    process.join()
+                    if not os.path.exists(ttfFile) and readConversionFailure(failureFile) is None:
+                        configlogger.warning(f"The otf->ttf conversion of {otfFile} ended with exit code "
+                                             f"{process.exitcode}; it is tried again next time")
+                process.close()
+    finally:
+        for process, _conversion, _deadline in running.values():
+            process.terminate()
+            process.join()
+            process.close()
+
+
+def removeEarlierConversion(otfFile, earlierTtfdirPath):
+    """Remove the ttf file which an earlier version of cewe2pdf converted from *otfFile*.
+
+    Earlier versions named the ttf file after the otf file alone and kept it
+    directly in the app data folder.  Whether it was converted from the
+    current version of the otf file cannot be told, so it is never used.
+    """
+    if earlierTtfdirPath is None:
+        return
+    earlierTtfFile = os.path.join(earlierTtfdirPath, f"{Path(otfFile).stem}.ttf")
+    try:
+        os.remove(earlierTtfFile)
+    except FileNotFoundError:
+        return
+    except OSError as ex:
+        configlogger.warning(f"Could not remove the earlier otf->ttf font conversion {earlierTtfFile}: {ex}")
+        return
+    configlogger.info(f"Removed the earlier otf->ttf font conversion {earlierTtfFile}")
+
+
+def getTtfsFromOtfs(otfFiles, ttfdirPath=None, jobs=None, timeout=CONVERSION_TIMEOUT, earlierTtfdirPath=None):
+    """Return the ttf files converted from the otf files, converting those not done before.
+
+    The ttf files are named by the contents of their otf file, so an updated
+    otf file is converted again.  Conversions which failed, or which took
+    longer than *timeout* seconds, are recorded in the same way and are not
+    tried again until the otf file changes.  Files converted by earlier
+    versions in *earlierTtfdirPath* are removed once a font is converted
+    again, see :func:`removeEarlierConversion`.
+    """
     if ttfdirPath is None:
         ttfdirPath = appdata_dir()
 
-    if not os.path.exists(ttfdirPath):
-        os.mkdir(ttfdirPath)
+    os.makedirs(ttfdirPath, exist_ok=True)
 
+    digests = FileDigests()
+    conversions = {}
     for otfFile in otfFiles:
-        if "LiebeGerda-BoldItalic" in otfFile:
-            configlogger.info("LiebeGerda-BoldItalic not available: the otf->ttf conversion hangs!")
-            continue # the conversion code hangs on this font!
-        ttfFile = makeOutputFileName(
-            otfFile,
-            outputDir=ttfdirPath,
-            extension=".ttf",
-            overWrite=True, # options.overwrite
-        )
+        baseName = f"{Path(otfFile).stem}-{digests.getDigest(otfFile)[:CONTENT_NAME_DIGITS]}"
+        conversions[otfFile] = (otfFile, os.path.join(ttfdirPath, f"{baseName}.ttf"),
+                                os.path.join(ttfdirPath, f"{baseName}.failed"))
+
+    newConversions = []
+    for otfFile, ttfFile, failureFile in conversions.values():
         if os.path.exists(ttfFile):
             configlogger.info(f"Accepting otf->ttf font conversion: {ttfFile}")
+        elif (reason := readConversionFailure(failureFile)) is not None:
+            configlogger.info(f"{otfFile} not available: its otf->ttf conversion failed before, {reason}")
         else:
             configlogger.warning(f"One-time font conversion otf->ttf: {ttfFile}")
-            font = TTFont(otfFile, fontNumber=0) # options.face_index
-            otf_to_ttf(
-                font,
-                post_format=POST_FORMAT, # options.post_format
-                max_err=MAX_ERR, # options.max_error
-                reverse_direction=REVERSE_DIRECTION, # options.reverse_direction
-            )
-            font.save(ttfFile)
-
-        resultingTtfFiles.append(ttfFile)
-
-    return resultingTtfFiles
+            newConversions.append((otfFile, ttfFile, failureFile))
+    if newConversions:
+        convertOtfFiles(newConversions, jobs, timeout)
+        for otfFile, ttfFile, failureFile in newConversions:
+            if os.path.exists(ttfFile):
+                removeEarlierConversion(otfFile, earlierTtfdirPath)
+            elif (reason := readConversionFailure(failureFile)) is not None:
+                configlogger.warning(f"{otfFile} not available: otf->ttf conversion failed, {reason}")
+
+    return [ttfFile for _, ttfFile, _ in conversions.values() if os.path.exists(ttfFile)]
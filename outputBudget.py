@@ -0,0 +1,295 @@
+"""Choose photo resolution and JPEG quality to fit a target PDF size.
+
+Without a budget, every photo is prepared at the configured resolution and
+quality, and finding settings which give a PDF of a required size means
+converting the album repeatedly.  With ``--target-size`` the target is shared
+out between the output pages before rendering, and each page's share between
+its photos in proportion to their size at the best settings.  For each photo
+the best step of a ladder of resolution and quality pairs whose estimated
+size fits its share, plus any share left unused by earlier photos, is chosen.
+The estimate needs only the page layout, the photos' headers and their file
+sizes: photos are neither decoded nor encoded.
+
+A profile such as ``--profile screen`` replaces the configured resolutions
+and quality; the budget then only ever lowers them.  Neither goes below
+MINIMUM_RESOLUTION, the least resolution the configuration accepts.
+"""
+
+import logging
+import os
+import re
+from dataclasses import dataclass
+
+from PIL import Image
+
+from conversionSetup import MINIMUM_RESOLUTION
+from conversionState import ConversionState
+from corners import CornersInfo
+from imageareas import (ImageBudget, getAreaSize, getDrawnPageElement, getImagePath,
+                        getPassepartoutLayout, getPhotoPreparation, iterPageImageTags)
+from pageTypes import PageProcessingType
+from pdfImages import isUnchangedJpegUsable
+from renderContext import RenderContext
+
+
+@dataclass(frozen=True)
+class OutputProfile:
+    """Resolutions and JPEG quality for one kind of delivery."""
+
+    image_resolution: int
+    background_resolution: int
+    image_quality: int
+
+
+OUTPUT_PROFILES = {
+    'screen': OutputProfile(image_resolution=120, background_resolution=100, image_quality=75),
+    'print': OutputProfile(image_resolution=300, background_resolution=150, image_quality=90),
+}
+
+# Resolutions and JPEG qualities which a budget may step down to.
+BUDGET_RESOLUTIONS = (300, 240, 200, 150, 120, MINIMUM_RESOLUTION)
+BUDGET_QUALITIES = (95, 90, 85, 75, 65, 55, 45)
+
+# Approximate JPEG size of typical photographs, in bytes per pixel, at some
+# qualities.  Other qualities are interpolated.
+JPEG_BYTES_PER_PIXEL = ((45, 0.10), (55, 0.12), (65, 0.15), (75, 0.20), (85, 0.28),
+                        (90, 0.36), (95, 0.55), (100, 1.0))
+
+# The size per pixel of typical photographs in some source formats: camera
+# JPEG files at about quality 90, and lossless PNG.  A file smaller than such
+# a photo of the same size is assumed to compress better by the same ratio,
+# within the limits given.
+TYPICAL_SOURCE_BYTES_PER_PIXEL = {'JPEG': 0.36, 'MPO': 0.36, 'PNG': 1.5}
+MIN_SOURCE_COMPLEXITY = 0.1
+MAX_SOURCE_COMPLEXITY = 2.0
+
+# Photos with masks or rounded corners are embedded losslessly with an alpha
+# channel, whatever the JPEG quality.
+TRANSPARENT_BYTES_PER_PIXEL = 2.0
+
+# Allowance per page for text, clip art and the PDF structure.
+PAGE_OVERHEAD_BYTES = 2 * 1024
+
+# Page backgrounds are embedded at Pillow's default JPEG quality.
+BACKGROUND_JPEG_QUALITY = 75
+
+_SIZE_UNITS = {'': 1024 * 1024, 'B': 1, 'K': 1024, 'KB': 1024, 'M': 1024 * 1024, 'MB': 1024 * 1024,
+               'G': 1024 * 1024 * 1024, 'GB': 1024 * 1024 * 1024}
+
+
+def parseByteSize(text):
+    """Return the bytes in a size such as ``25MB``, ``800KB`` or ``1.5G``.
+
+    A number without a unit is in megabytes.
+    """
+    match = re.fullmatch(r'\s*(\d+(?:\.\d*)?)\s*([A-Za-z]*)\s*', text)
+    if match is None or match.group(2).upper() not in _SIZE_UNITS:
+        raise ValueError(f'Invalid size: {text}')
+    return int(float(match.group(1)) * _SIZE_UNITS[match.group(2).upper()])
+
+
+def getJpegBytesPerPixel(quality):
+    """Return the estimated JPEG bytes per pixel at *quality*."""
+    lowerQuality, lowerBytes = JPEG_BYTES_PER_PIXEL[0]
+    if quality <= lowerQuality:
+        return lowerBytes
+    for upperQuality, upperBytes in JPEG_BYTES_PER_PIXEL[1:]:
+        if quality <= upperQuality:
+            fraction = (quality - lowerQuality) / (upperQuality - lowerQuality)
+            return lowerBytes + fraction * (upperBytes - lowerBytes)
+        lowerQuality, lowerBytes = upperQuality, upperBytes
+    return lowerBytes
+
+
+def getBudgetLadder(imageResolution, imageQuality):
+    """Return the ImageBudgets to try, best first.
+
+    The first step is the configured resolution and quality.  Each further
+    rank lowers the resolution or the quality by one more step, preferring
+    to keep the resolution.
+    """
+    resolutions = [imageResolution] + [resolution for resolution in BUDGET_RESOLUTIONS
+                                       if resolution < imageResolution]
+    qualities = [imageQuality] + [quality for quality in BUDGET_QUALITIES if quality < imageQuality]
+    steps = [(resolutionIndex + qualityIndex, resolutionIndex, resolution, quality)
+             for resolutionIndex, resolution in enumerate(resolutions)
+             for qualityIndex, quality in enumerate(qualities)]
+    return [ImageBudget(resolution, quality) for _rank, _resolutionIndex, resolution, quality in sorted(steps)]
+
+
+def chooseImageBudget(estimates, budgetBytes):
+    """Return the first ``(budget, estimatedBytes)`` which fits, else the last one."""
+    for budget, estimatedBytes in estimates:
+        if estimatedBytes <= budgetBytes:
+            return budget, estimatedBytes
+    return estimates[-1]
+
+
+def getSourceComplexity(imagePath, sourceComplexities):
+    """Return how much more than a typical photo a source file's content costs.
+
+    A compressed file's own size per pixel shows whether it holds fine detail
+    or large smooth areas, which compress much better.  Formats for which
+    that is not known count as typical.
+    """
+    complexity = sourceComplexities.get(imagePath)
+    if complexity is None:
+        complexity = 1.0
+        with Image.open(imagePath) as image:
+            typicalBytesPerPixel = TYPICAL_SOURCE_BYTES_PER_PIXEL.get(image.format)
+            if typicalBytesPerPixel is not None:
+                bytesPerPixel = os.path.getsize(imagePath) / (image.width * image.height)
+                complexity = max(MIN_SOURCE_COMPLEXITY,
+                                 min(MAX_SOURCE_COMPLEXITY, bytesPerPixel / typicalBytesPerPixel))
+        sourceComplexities[imagePath] = complexity
+    return complexity
+
+
+def estimatePreparedBytes(preparation, sourceComplexities):
+    """Estimate the bytes a prepared photo adds to the PDF."""
+    if preparation.mayBeUnchanged() and isUnchangedJpegUsable(preparation.image_path, preparation.crop_box):
+        return os.path.getsize(preparation.image_path)
+    if preparation.output_size is not None:
+        width, height = preparation.output_size
+    else:
+        left, top, right, bottom = preparation.crop_box
+        width, height = right - left, bottom - top
+    if preparation.mask_file_name is not None or preparation.corners_info != CornersInfo():
+        return width * height * TRANSPARENT_BYTES_PER_PIXEL
+    return (width * height * getJpegBytesPerPixel(preparation.jpeg_quality)
+            * getSourceComplexity(preparation.image_path, sourceComplexities))
+
+
+def estimateBackgroundBytes(resolvedPages, backgroundLocations, backgroundResolution, resourceLocator,
+                            sourceComplexities):
+    """Estimate the bytes of the stock backgrounds, each of which is embedded once.
+
+    A background is resampled to at most *backgroundResolution* over its
+    largest page.
+    """
+    backgroundAreas = {}
+    for resolvedPage in resolvedPages:
+        bundleSize = resolvedPage.element.find('./bundlesize')
+        areaPixels = (float(bundleSize.get('width')) * float(bundleSize.get('height'))
+                      if bundleSize is not None else 2100 * 2970) * (backgroundResolution / 254.0) ** 2
+        for backgroundTag in resolvedPage.element.findall('background'):
+            backgroundId = backgroundTag.get('designElementId')
+            if backgroundId is not None:
+                backgroundAreas[backgroundId] = max(backgroundAreas.get(backgroundId, 0), areaPixels)
+    estimatedBytes = 0
+    for backgroundId, areaPixels in backgroundAreas.items():
+        try:
+            backgroundPath = resourceLocator.findFile(
+                [backgroundId + '.bmp', backgroundId + '.webp', backgroundId + '.jpg'], backgroundLocations)
+        except ValueError:
+            continue
+        with Image.open(backgroundPath) as image:
+            pixels = min(image.width * image.height, areaPixels)
+        estimatedBytes += (pixels * getJpegBytesPerPixel(BACKGROUND_JPEG_QUALITY)
+                           * getSourceComplexity(backgroundPath, sourceComplexities))
+    return estimatedBytes
+
+
+def planImageBudgets(targetBytes, resolvedPages, fotobook, productStyle, imageDirectory,
+                     mcfBaseFolder, backgroundLocations, context: RenderContext, state: ConversionState):
+    """Return the ImageBudget of each image element for a PDF of *targetBytes*."""
+    outputPages = [resolvedPage for resolvedPage in resolvedPages
+                   if resolvedPage.page_type != PageProcessingType.FrontInsideCoverBackground]
+    if not outputPages:
+        return {}
+    sourceComplexities = {}
+    photoBytes = (targetBytes - len(outputPages) * PAGE_OVERHEAD_BYTES
+                  - estimateBackgroundBytes(resolvedPages, backgroundLocations,
+                                            context.background_resolution, state.resource_locator,
+                                            sourceComplexities))
+    if photoBytes <= 0:
+        logging.warning(f'The target size leaves no room for photos on {len(outputPages)} pages')
+        photoBytes = 0
+    pageBudgetBytes = photoBytes / len(outputPages)
+
+    # Image elements of a double page are shared by both of its output pages,
+    # and so is their budget.
+    pageImages = {}
+    pageShares = {}
+    for resolvedPage, page, area, imageTag in iterPageImageTags(resolvedPages, fotobook, productStyle):
+        if resolvedPage.page_type == PageProcessingType.FrontInsideCoverBackground:
+            continue
+        pageImages.setdefault(page, {}).setdefault(imageTag, (resolvedPage, area))
+    for resolvedPage in outputPages:
+        page = getDrawnPageElement(resolvedPage, fotobook, productStyle)
+        pageShares[page] = pageShares.get(page, 0) + 1
+
+    ladder = getBudgetLadder(context.image_resolution, context.image_quality)
+    imageBudgets = {}
+    unusedBytes = 0
+    for page, images in pageImages.items():
+        estimators = {imageTag: getImageEstimator(imageTag, resolvedPage, area, imageDirectory, mcfBaseFolder,
+                                                  context, state, sourceComplexities)
+                      for imageTag, (resolvedPage, area) in images.items()}
+        pageBudgets, unusedBytes = shareImageBudgets(
+            estimators, ladder, pageBudgetBytes * pageShares.get(page, 1) + unusedBytes)
+        imageBudgets.update(pageBudgets)
+    return imageBudgets
+
+
+def shareImageBudgets(estimators, ladder, budgetBytes):
+    """Return the ImageBudget of each image of a page, and the bytes left unused.
+
+    *estimators* maps each image to a function estimating its bytes for an
+    ImageBudget.  The page's *budgetBytes* are shared between the images in
+    proportion to their estimates at the best step; an image which needs
+    less than its share leaves the rest to later images.
+    """
+    bestBytes = {image: estimator(ladder[0]) for image, estimator in estimators.items()}
+    totalBestBytes = sum(bestBytes.values())
+    imageBudgets = {}
+    unusedBytes = 0
+    for image, estimator in estimators.items():
+        share = bestBytes[image] / totalBestBytes if totalBestBytes > 0 else 1 / len(estimators)
+        imageBytes = budgetBytes * share + unusedBytes
+        estimates = [(ladder[0], bestBytes[image])]
+        for budget in ladder[1:]:
+            if estimates[-1][1] <= imageBytes:
+                break
+            estimates.append((budget, estimator(budget)))
+        imageBudgets[image], estimatedBytes = chooseImageBudget(estimates, imageBytes)
+        unusedBytes = max(0, imageBytes - estimatedBytes)
+    return imageBudgets, unusedBytes
+
+
+def getImageEstimator(imageTag, resolvedPage, area, imageDirectory, mcfBaseFolder, context: RenderContext,
+                      state: ConversionState, sourceComplexities):
+    """Return a function estimating the bytes of an image element's photo for an ImageBudget.
+
+    An area which cannot be prepared is estimated at nothing; the renderer
+    reports the problem when it reaches the area.
+    """
+    try:
+        areaWidth, areaHeight = getAreaSize(area)
+        imagePath = getImagePath(imageTag, imageDirectory, mcfBaseFolder)
+        layout = getPassepartoutLayout(imageTag, areaHeight, areaWidth, context, state, warnIfMissing=False)
+    except Exception: # pylint: disable=broad-exception-caught
+        return lambda budget: 0
+
+    def estimateBytes(budget):
+        try:
+            preparation = getPhotoPreparation(imageTag, area, areaHeight, areaWidth, imagePath,
+                                              resolvedPage.page_type, layout, context, budget)
+            return estimatePreparedBytes(preparation, sourceComplexities)
+        except Exception: # pylint: disable=broad-exception-caught
+            return 0
+    return estimateBytes
+
+
+def reportOutputSize(outputFileName, targetBytes):
+    """Log the size of the saved PDF against its target."""
+    try:
+        outputBytes = os.path.getsize(outputFileName)
+    except OSError:
+        return
+    megabyte = 1024 * 1024
+    logging.info(f'Output file size {outputBytes / megabyte:.2f} MB, '
+                 f'target {targetBytes / megabyte:.2f} MB')
+    if outputBytes > targetBytes:
+        logging.warning(f'{outputFileName} is {outputBytes / megabyte:.2f} MB, larger than the '
+                        f'target size of {targetBytes / megabyte:.2f} MB')
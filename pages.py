@@ -57,10 +57,17 @@ def parseInputPage(fotobook, mcfBaseFolder, backgroundLocations, imageDirectory,
 def processPages(fotobook, mcfBaseFolder, imageDirectory, productStyle, pdf, pageCount,
                  pageNumbers, availableFonts, backgroundLocations,
                  state: ConversionState, context: RenderContext,
-                 pageNumberingInfo, processElements: Callable):
-    """Render the requested album pages, including covers and inside covers."""
+                 pageNumberingInfo, processElements: Callable, resolvedPages=None):
+    """Render the requested album pages, including covers and inside covers.
 
-    for resolvedPage in resolvePages(fotobook, productStyle, pageCount, pageNumbers):
+    A caller which has already resolved the pages, for example to plan their
+    photos, passes them as *resolvedPages* so that resolution problems are
+    reported only once.
+    """
+    if resolvedPages is None:
+        resolvedPages = resolvePages(fotobook, productStyle, pageCount, pageNumbers)
+
+    for resolvedPage in resolvedPages:
         try:
             _renderResolvedPage(resolvedPage, fotobook, mcfBaseFolder,
                                 backgroundLocations, imageDirectory, productStyle, pdf,
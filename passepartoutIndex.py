@@ -0,0 +1,55 @@
+"""Index of passepartout decorations by designElementId, kept between conversions.
+
+Finding a passepartout means walking every passepartout folder and parsing
+every decoration .xml file in it.  The full decorationXmlInfo of each
+passepartout is stored with the file it came from, see :mod:`xmlFileIndex`,
+so a later conversion only parses the files which changed.
+"""
+
+from dataclasses import astuple
+import time
+
+from extraLoggers import configlogger
+from passepartout import Passepartout
+from xmlFileIndex import XmlFileIndex
+
+
+class PassepartoutIndex(XmlFileIndex):
+    """Passepartout descriptions by designElementId for a list of folders."""
+
+    DATABASE_FORMAT = 2
+    DESCRIPTION = 'passepartout index'
+
+    def __init__(self, databasePath=None):
+        super().__init__(databasePath)
+        self._indexes = {}
+
+    def getInfo(self, designElementId, directoryList):
+        """Return the decorationXmlInfo of a passepartout, or None if it is not found."""
+        if isinstance(directoryList, str):
+            directoryList = (directoryList,)
+        directoryList = tuple(directoryList or ())
+        index = self._indexes.get(directoryList)
+        if index is None:
+            startTime = time.perf_counter()
+            index = self.run(lambda connection: self._buildIndex(connection, directoryList))
+            configlogger.info(f'Passepartout index: {len(index)} passepartouts, {self.summaryText()}, '
+                              f'{time.perf_counter() - startTime:.3f}s')
+            self._indexes[directoryList] = index
+        return index.get(designElementId)
+
+    def _buildIndex(self, connection, directoryList):
+        # As before, a designElementId found in several files refers to the
+        # last one, in the order of the folders and of the sorted directory
+        # listings.
+        index = {}
+        for directory in directoryList:
+            for xmlFile in self.walk(connection, directory):
+                for record in self.getRecords(connection, xmlFile):
+                    xmlInfo = Passepartout.decorationXmlInfo(*record)
+                    index[xmlInfo.designElementId] = xmlInfo
+        return index
+
+    def parseFile(self, xmlFile):
+        return [astuple(xmlInfo) for xmlInfo in Passepartout.extractAllInfosFromXml(xmlFile)
+                if xmlInfo.designElementType == 'passepartout']
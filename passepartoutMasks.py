@@ -0,0 +1,65 @@
+"""Alpha channels of passepartout masks shared by the framed photos of a conversion.
+
+A framed photo is given transparency by rasterising its passepartout's mask
+SVG at the photo's pixel size.  An album usually uses one frame style for
+many photos of the same size, so the finished L-mode alpha channel is kept
+here and the mask is only rasterised once per size.  An optional persistent
+tier keeps the channels for later conversions.
+"""
+
+from io import BytesIO
+import os
+
+from PIL import Image
+
+from memoryCache import ByteBoundedCache
+from persistentCache import FileDigests, PersistentBlobCache
+
+# The memory for one conversion's masks; the persistent tier is sized by
+# passepartoutMaskCacheMB, see persistentCache.DEFAULT_PASSEPARTOUT_MASK_CACHE_MB.
+DEFAULT_ALPHA_CHANNEL_CACHE_MB = 64
+
+
+class PassepartoutMaskCache(ByteBoundedCache):
+    """Least-recently-used cache of passepartout alpha channels.
+
+    Entries are keyed by mask file, its modification time, and pixel size.
+    Callers receive the shared channel and must not modify it in place;
+    ``Image.putalpha`` only reads it.
+    """
+
+    def __init__(self, maxBytes=DEFAULT_ALPHA_CHANNEL_CACHE_MB * 1024 * 1024,
+                 persistentCache: PersistentBlobCache = None):
+        super().__init__('Passepartout mask', maxBytes)
+        self.persistent_cache = persistentCache
+        self._file_digests = FileDigests()
+
+    def getAlphaChannel(self, maskPath, size, rasterise):
+        """Return the L-mode alpha channel of a mask file at *size*.
+
+        *rasterise* is called without arguments to produce the channel when
+        it is not cached.
+        """
+        maskPath = os.path.abspath(maskPath)
+        size = tuple(size)
+        key = (maskPath, os.stat(maskPath).st_mtime_ns, size)
+        alphaChannel = self.get(key)
+        if alphaChannel is not None:
+            return alphaChannel
+
+        persistentKey = None
+        if self.persistent_cache is not None:
+            persistentKey = PersistentBlobCache.makeKey(
+                'passepartoutMask', self._file_digests.getDigest(maskPath), size)
+            pngData = self.persistent_cache.get(persistentKey)
+            if pngData is not None:
+                alphaChannel = Image.open(BytesIO(pngData))
+                alphaChannel.load()
+        if alphaChannel is None:
+            alphaChannel = rasterise()
+            if persistentKey is not None:
+                pngBuffer = BytesIO()
+                alphaChannel.save(pngBuffer, 'PNG')
+                self.persistent_cache.put(persistentKey, pngBuffer.getvalue())
+        self.put(key, alphaChannel, alphaChannel.width * alphaChannel.height)
+        return alphaChannel
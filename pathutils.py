@@ -16,8 +16,14 @@ def appdata_dir():
         macOS:    ~/Library/Application Support/cewe2pdf
         Unix:     ~/.local/share/cewe2pdf   # or in $XDG_DATA_HOME, if defined
         Win 10:   C:\Users\<username>\AppData\Local\cewe2pdf
+    The CEWE2PDF_APPDATA environment variable, if defined, replaces all of these;
+    the regression tests use it to keep their caches out of the user's folder.
     :return: full path to the user-specific data dir
     """
+    overridePath = getenv("CEWE2PDF_APPDATA")
+    if overridePath:
+        return Path(overridePath).expanduser()
+
     # get os specific path
     if sys.platform.startswith("win"):
         os_path = getenv("LOCALAPPDATA")
@@ -110,6 +116,71 @@ def findFileInDirs(filenames, paths):
     raise ValueError(complaint)
 
 
+class ResourceLocator:
+    """Find files by name in ordered lists of directories, as findFileInDirs does.
+
+    Each directory is listed once, when it is first searched, instead of
+    probing it with a file system call for every candidate name.  This
+    matters when the CEWE resources are on a network share.  Names are
+    matched without regard to case, as Windows does, but a name of exactly
+    the right case in a directory is preferred.  The directory listings are
+    not refreshed, so one locator should only serve one conversion.
+    """
+
+    def __init__(self):
+        self.lookups = 0
+        self.misses = {}
+        self._directories = {}
+
+    def _getDirectoryIndex(self, directory):
+        directory = os.fspath(directory)
+        index = self._directories.get(directory)
+        if index is None:
+            try:
+                names = os.listdir(directory)
+            except OSError:
+                names = []
+            foldedNames = {}
+            for name in names:
+                foldedNames.setdefault(name.casefold(), name)
+            index = (set(names), foldedNames)
+            self._directories[directory] = index
+        return index
+
+    def findFile(self, filenames, paths):
+        """Return the first of *filenames* found in *paths*, else raise ValueError.
+
+        Every directory is searched for one name before the next name is
+        tried.
+        """
+        if not isinstance(filenames, list):
+            filenames = [filenames]
+        self.lookups += 1
+        for filename in filenames:
+            for p in paths:
+                if os.path.dirname(filename):
+                    # Only plain names are indexed.
+                    testPath = os.path.join(p, filename)
+                    if os.path.exists(testPath):
+                        return testPath
+                    continue
+                names, foldedNames = self._getDirectoryIndex(p)
+                if filename in names:
+                    return os.path.join(p, filename)
+                foundName = foldedNames.get(filename.casefold())
+                if foundName is not None:
+                    return os.path.join(p, foundName)
+
+        self.misses[tuple(filenames)] = tuple(os.fspath(p) for p in paths)
+        complaint = f"Could not find {filenames} in {', '.join(os.fspath(p) for p in paths)} paths"
+        logging.debug(complaint)
+        raise ValueError(complaint)
+
+    def summaryText(self):
+        return (f'Resource locator: {len(self._directories)} directories listed, '
+                f'{self.lookups} lookups, {len(self.misses)} names not found')
+
+
 def findFileByExtInDirs(filebase, extList, paths):
     for p in paths:
         for ext in extList:
@@ -0,0 +1,203 @@
+"""Hand prepared images to ReportLab without temporary files.
+
+ReportLab copies an image's stream into the PDF document when it is first
+drawn, so the buffers created here are released as soon as the drawing
+function which asked for them returns.  An image which is kept to be drawn
+again, such as a page background, is released with
+:meth:`ContentAddressedImage.release` after it is first drawn, and keeps only
+its name.
+
+Every image is identified by a digest of its prepared content.  ReportLab
+names an image source which is not an ``ImageReader`` from its ``str()`` and
+checks for an existing XObject of that name before it loads anything, so a
+repeated background, clip art or photo crop is embedded once and each further
+placement only adds a reference to it.  Neither the encoding nor ReportLab's
+own decode of the pixels is repeated for those placements.
+"""
+
+from abc import ABC, abstractmethod
+import hashlib
+from io import BytesIO
+
+from PIL import Image
+from reportlab.lib.utils import ImageReader
+
+from imageUtils import getExifOrientation
+
+
+class ContentAddressedImage(ABC):
+    """An image source for ``Canvas.drawImage`` named by its content digest.
+
+    The ReportLab ``ImageReader`` which supplies the image data is only
+    created if the canvas has not already embedded the same content.
+    """
+
+    def __init__(self, digest):
+        self._digest = digest
+        self._reader = None
+        self._released = False
+
+    def __str__(self):
+        return f'{type(self).__name__}_{self._digest}'
+
+    @abstractmethod
+    def _createReader(self):
+        """Return the ImageReader which supplies the image data."""
+
+    def release(self):
+        """Release the image data once a canvas has embedded the image.
+
+        That canvas draws further placements from the name alone, so the
+        image can still be drawn on it, but on no other canvas.
+        """
+        self._reader = None
+        self._released = True
+
+    def __getattr__(self, name):
+        # Only called for attributes which are not defined here, that is for
+        # the ImageReader interface used by ReportLab's PDFImageXObject.
+        if name.startswith('__'):
+            raise AttributeError(name)
+        if self._released:
+            raise ValueError(f'The data of {self} was released after it was embedded')
+        if self._reader is None:
+            self._reader = self._createReader()
+        return getattr(self._reader, name)
+
+
+class EncodedJpeg(ContentAddressedImage):
+    """JPEG data, embedded in the PDF without being decoded."""
+
+    def __init__(self, jpegBytes, size):
+        super().__init__(hashlib.sha1(jpegBytes).hexdigest())
+        self.jpeg_bytes = jpegBytes
+        self.size = size
+
+    def jpeg_fh(self):
+        # ReportLab embeds the stream of a source with a JPEG file handle
+        # directly as DCT data.
+        return BytesIO(self.jpeg_bytes)
+
+    def _createReader(self):
+        # Only needed for the rest of the ImageReader interface, e.g. getSize().
+        return ImageReader(BytesIO(self.jpeg_bytes))
+
+    def release(self):
+        super().release()
+        self.jpeg_bytes = None
+
+
+class PreparedImage(ContentAddressedImage):
+    """A Pillow image, encoded for the PDF only when it is first embedded.
+
+    Images with transparency are given to ReportLab as pixels, which it
+    compresses losslessly together with their soft mask.  Other images are
+    JPEG-encoded in memory, at Pillow's default quality if *jpegQuality* is
+    None, and ReportLab embeds those bytes as a DCT stream.
+    """
+
+    def __init__(self, image, jpegQuality=None):
+        digest = hashlib.sha1(f'{image.mode} {image.size} {jpegQuality} '.encode())
+        digest.update(image.tobytes())
+        if image.mode == 'P':
+            digest.update(bytes(image.getpalette() or []))
+            digest.update(str(image.info.get('transparency')).encode())
+        super().__init__(digest.hexdigest())
+        self._image = image
+        self._jpeg_quality = jpegQuality
+
+    def _createReader(self):
+        if self._image.mode in ('RGBA', 'P'):
+            return ImageReader(self._image)
+        jpegBuffer = BytesIO()
+        if self._jpeg_quality is None:
+            self._image.save(jpegBuffer, "JPEG")
+        else:
+            self._image.save(jpegBuffer, "JPEG", quality=self._jpeg_quality)
+        jpegBuffer.seek(0)
+        return ImageReader(jpegBuffer)
+
+    def release(self):
+        super().release()
+        self._image = None
+
+
+class EncodedImage(ContentAddressedImage):
+    """Encoded image file data, such as a rasterised clip art PNG."""
+
+    def __init__(self, encodedBytes):
+        super().__init__(hashlib.sha1(encodedBytes).hexdigest())
+        self._encoded_bytes = encodedBytes
+
+    def _createReader(self):
+        return ImageReader(BytesIO(self._encoded_bytes))
+
+    def release(self):
+        super().release()
+        self._encoded_bytes = None
+
+
+def encodePreparedImage(image, jpegQuality):
+    """Return the file data PreparedImage would embed for *image*.
+
+    Transparent images are saved losslessly as PNG.
+    """
+    encodedBuffer = BytesIO()
+    if image.mode in ('RGBA', 'P'):
+        image.save(encodedBuffer, "PNG")
+    else:
+        image.save(encodedBuffer, "JPEG", quality=jpegQuality)
+    return encodedBuffer.getvalue()
+
+
+def getPdfImageFromEncoded(encodedBytes, image=None):
+    """Return ``(image, pdfImage)`` for data from :func:`encodePreparedImage`.
+
+    JPEG data is embedded as it is, and *image* is then only the decoded
+    image if the caller supplied it.  PNG data is decoded unless *image* is
+    given, because ReportLab needs the pixels of a transparent image.
+    """
+    if encodedBytes.startswith(b'\xff\xd8'):
+        if image is None:
+            with Image.open(BytesIO(encodedBytes)) as jpegImage:
+                size = jpegImage.size
+        else:
+            size = image.size
+        return image, EncodedJpeg(encodedBytes, size)
+    if image is None:
+        image = Image.open(BytesIO(encodedBytes))
+        image.load()
+    return image, PreparedImage(image)
+
+
+def isUnchangedJpegUsable(imagePath, cropBox):
+    """Return True if *cropBox* shows the whole of an upright JPEG file.
+
+    Only the file's header is read.  The file must be decoded instead when
+    it is not a plain RGB or greyscale JPEG, it needs EXIF rotation, or only
+    part of it is shown.  The caller is responsible for excluding resizes
+    and masks.
+    """
+    with Image.open(imagePath) as image:
+        return (image.format == 'JPEG' and image.mode in ('RGB', 'L')
+                and getExifOrientation(image) == 1 and cropBox == (0, 0, image.width, image.height))
+
+
+def getUnchangedJpeg(imagePath, cropBox):
+    """Return an EncodedJpeg if :func:`isUnchangedJpegUsable`, else None."""
+    if not isUnchangedJpegUsable(imagePath, cropBox):
+        return None
+    return readPlainJpeg(imagePath)
+
+
+def readPlainJpeg(imagePath):
+    """Return the file as an EncodedJpeg if it is an RGB or greyscale JPEG, else None.
+
+    EXIF orientation is not considered: the PDF shows the pixels as stored.
+    """
+    with Image.open(imagePath) as image:
+        if image.format != 'JPEG' or image.mode not in ('RGB', 'L'):
+            return None
+        size = image.size
+    with open(imagePath, 'rb') as jpegFile:
+        return EncodedJpeg(jpegFile.read(), size)
@@ -0,0 +1,172 @@
+"""Size-limited caches which persist between conversions in the app data folder.
+
+An album is usually converted many times while its owner makes small edits,
+and most of its prepared images are then the same as last time.  Entries are
+content addressed: the caller makes a key from everything which affects the
+result, including digests of the source files, so a changed input simply
+misses the cache and an unused entry is eventually evicted.
+"""
+
+import hashlib
+import logging
+import os
+import tempfile
+from pathlib import Path
+
+from pathutils import appdata_dir
+
+# Change this when the meaning of a cached entry changes, for example when
+# the image preparation code produces different pixels from the same input.
+PERSISTENT_CACHE_FORMAT = 1
+
+# The persistent caches are off unless a size is configured: they read every
+# source file to make its digest, and use disk space in the app data folder.
+DEFAULT_PREPARED_IMAGE_CACHE_MB = 0
+DEFAULT_CLIPART_CACHE_MB = 0
+DEFAULT_PASSEPARTOUT_MASK_CACHE_MB = 0
+
+
+def getCacheDirectory(appDataDir, name):
+    """Return the folder for one named cache below the app data directory."""
+    if appDataDir is None:
+        appDataDir = appdata_dir()
+    return Path(appDataDir) / name
+
+
+class FileDigests:
+    """Content digests of source files, computed once per file version.
+
+    A file's digest is reused while its size and modification time are
+    unchanged, so a photograph placed several times is only read once.
+    """
+
+    def __init__(self):
+        self._digests = {}
+
+    def getDigest(self, fileName):
+        stat = os.stat(fileName)
+        key = (os.path.abspath(fileName), stat.st_size, stat.st_mtime_ns)
+        digest = self._digests.get(key)
+        if digest is None:
+            sha = hashlib.sha256()
+            with open(fileName, 'rb') as sourceFile:
+                for block in iter(lambda: sourceFile.read(1024 * 1024), b''):
+                    sha.update(block)
+            digest = sha.hexdigest()
+            self._digests[key] = digest
+        return digest
+
+
+class PersistentBlobCache:
+    """A directory of cached byte strings with least-recently-used eviction.
+
+    Each entry is one file named by a digest of its key.  Reading an entry
+    updates its modification time, which is therefore the time it was last
+    used.  Writes go to a temporary file and are then renamed, so a parallel
+    conversion never sees a partly written entry.  Failures to read or write
+    the cache are logged and otherwise ignored.
+    """
+
+    def __init__(self, directory, maxBytes):
+        self.directory = Path(directory)
+        self.max_bytes = maxBytes
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self._current_bytes = None
+
+    @staticmethod
+    def makeKey(*parts):
+        """Return a cache key for the given values, which must have stable reprs."""
+        return repr((PERSISTENT_CACHE_FORMAT,) + parts)
+
+    def _entryPath(self, key):
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return self.directory / digest[:2] / digest
+
+    def get(self, key):
+        """Return the bytes stored for *key*, or None."""
+        entryPath = self._entryPath(key)
+        try:
+            data = entryPath.read_bytes()
+            os.utime(entryPath)
+        except OSError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return data
+
+    def contains(self, key):
+        """Return True if an entry for *key* exists, without counting a hit."""
+        return self._entryPath(key).is_file()
+
+    def put(self, key, data):
+        """Store *data* for *key*, evicting old entries beyond the size limit."""
+        if len(data) > self.max_bytes:
+            return
+        entryPath = self._entryPath(key)
+        try:
+            entryPath.parent.mkdir(parents=True, exist_ok=True)
+            if self._current_bytes is None:
+                self._current_bytes = sum(size for _path, size, _used in self._listEntries())
+            fileHandle, temporaryName = tempfile.mkstemp(dir=entryPath.parent, suffix='.tmp')
+            try:
+                with os.fdopen(fileHandle, 'wb') as temporaryFile:
+                    temporaryFile.write(data)
+                os.replace(temporaryName, entryPath)
+            except OSError:
+                os.remove(temporaryName)
+                raise
+        except OSError as error:
+            logging.warning(f'Could not write to the cache in {self.directory}: {error}')
+            return
+        self.writes += 1
+        self._current_bytes += len(data)
+        if self._current_bytes > self.max_bytes:
+            self._evict()
+
+    def _listEntries(self):
+        # Another process sharing the folder may remove an entry, or a whole
+        # subfolder, while it is being listed; such an entry is skipped.
+        entries = []
+        try:
+            subdirectories = [entry.path for entry in os.scandir(self.directory) if entry.is_dir()]
+        except OSError:
+            return entries
+        for subdirectory in subdirectories:
+            try:
+                with os.scandir(subdirectory) as subdirectoryEntries:
+                    for entry in subdirectoryEntries:
+                        if entry.name.endswith('.tmp'):
+                            continue
+                        try:
+                            if entry.is_file():
+                                stat = entry.stat()
+                                entries.append((entry.path, stat.st_size, stat.st_mtime_ns))
+                        except OSError:
+                            continue
+            except OSError:
+                continue
+        return entries
+
+    def _evict(self):
+        # Other processes may share the folder, so recount it before deciding
+        # how much to remove.  Keep evicting to 90% of the limit, so that the
+        # folder is not rescanned after every following write.
+        entries = sorted(self._listEntries(), key=lambda entry: entry[2])
+        self._current_bytes = sum(size for _path, size, _used in entries)
+        for path, size, _used in entries:
+            if self._current_bytes <= 0.9 * self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self._current_bytes -= size
+            self.evictions += 1
+
+    def summaryText(self, description):
+        return (f'{description} cache in {self.directory}: {self.hits} hits, {self.misses} misses, '
+                f'{self.writes} writes, {self.evictions} evictions, '
+                f'limit {self.max_bytes // (1024 * 1024)} MB')
@@ -0,0 +1,146 @@
+"""Pixel preparation of one photo, independent of the PDF canvas.
+
+:mod:`imageareas` reads an image area's geometry from the MCF and describes
+the required pixels in a :class:`PhotoPreparation`.  Preparing those pixels
+(decode, EXIF rotation, crop, resize, passepartout mask and corners) needs
+nothing else, so it can be done by a worker process of :mod:`assetPipeline`
+while the canvas is busy with an earlier page, or taken from the persistent
+cache of an earlier conversion.
+"""
+
+import logging
+from dataclasses import dataclass
+from typing import Any
+
+import PIL
+
+from clipArt import findClipartFile, loadClipartFile
+from clpFile import ClpFile
+from conversionState import ConversionState
+from corners import CornersInfo, applyCornerMask
+from imageCache import DecodedImageCache
+from imageUtils import cropOriented, getUprightSize
+from passepartoutMasks import PassepartoutMaskCache
+from pdfImages import PreparedImage, encodePreparedImage, getPdfImageFromEncoded, getUnchangedJpeg
+
+
+@dataclass(frozen=True)
+class PhotoPreparation:
+    """Everything which determines the prepared pixels of one image area."""
+
+    image_path: str
+    crop_box: tuple[int, int, int, int]                 # Crop of the full-resolution, rotated photo.
+    source_box: tuple[float, float, float, float]       # Unrounded left, top, right and bottom of that crop.
+    output_size: tuple[int, int] | None                 # Resized width and height, or None to keep the crop.
+    max_reduction: int                                  # Largest shrink allowed while decoding.
+    resampling_filter: Any
+    jpeg_quality: int
+    mask_file_name: str | None                          # Passepartout mask clip art.
+    clipart_paths: tuple[str, ...]                      # Used to locate the mask.
+    corners_info: CornersInfo
+    crop_width_mcfunit: float                           # Scales the corner radii.
+    max_pixels: int = 0                                 # Bounded-memory ceiling, 0 for none.
+
+    def mayBeUnchanged(self):
+        """Return True if the photo might be usable exactly as it is on disk."""
+        return (self.output_size is None and self.mask_file_name is None
+                and self.corners_info == CornersInfo())
+
+    def getCacheKey(self, cache, state: ConversionState):
+        """Return this preparation's key in a PersistentBlobCache."""
+        return cache.makeKey(
+            'photo', PIL.__version__, state.file_digests.getDigest(self.image_path),
+            self.crop_box, self.source_box, self.output_size, self.max_reduction,
+            str(self.resampling_filter), self.jpeg_quality, self.mask_file_name,
+            self.corners_info, self.crop_width_mcfunit, self.max_pixels)
+
+
+def preparePhoto(preparation: PhotoPreparation, decodedImages: DecodedImageCache = None,
+                 passepartoutMasks: PassepartoutMaskCache = None):
+    """Return the cropped, resized and masked Pillow image for *preparation*."""
+    if decodedImages is None:
+        decodedImages = DecodedImageCache(0)
+    if passepartoutMasks is None:
+        passepartoutMasks = PassepartoutMaskCache(0)
+    image, scale, orientation = decodedImages.getImage(
+        preparation.image_path, preparation.max_reduction, preparation.max_pixels)
+    if scale != (1, 1):
+        # The crop box is in the upright photo, the scale in the stored one.
+        scaleX, scaleY = getUprightSize(scale, orientation)
+        sourceLeft, sourceUpper, sourceRight, sourceLower = preparation.source_box
+        cropBox = (int(0.5 + sourceLeft / scaleX), int(0.5 + sourceUpper / scaleY),
+                   int(0.5 + sourceRight / scaleX), int(0.5 + sourceLower / scaleY))
+    else:
+        cropBox = preparation.crop_box
+    # Crop the stored photo before transposing, so that only the pixels
+    # which are shown are rotated.
+    image = cropOriented(image, cropBox, orientation)
+    if preparation.output_size is not None:
+        croppedImage = image
+        image = croppedImage.resize(preparation.output_size, preparation.resampling_filter)
+        # Release each intermediate as soon as it is replaced, so that at most
+        # two copies of a large photo exist at once.
+        croppedImage.close()
+    image.load()
+
+    if preparation.mask_file_name is not None:
+        maskPath = findClipartFile(preparation.mask_file_name, preparation.clipart_paths)
+        if maskPath is None:
+            logging.warning(f"Could not find the passepartout mask {preparation.mask_file_name}; "
+                            f"rendering {preparation.image_path} unmasked.")
+        else:
+            maskSize = image.size
+            alphaChannel = passepartoutMasks.getAlphaChannel(
+                maskPath, maskSize, lambda: loadClipartFile(maskPath).rasterAlphaChannel(*maskSize))
+            unmaskedImage = image
+            image = ClpFile("").applyAsAlphaMaskToFoto(unmaskedImage, alphaChannel)
+            if image is not unmaskedImage:
+                unmaskedImage.close()
+
+    return applyCornerMask(image, preparation.corners_info, preparation.crop_width_mcfunit)
+
+
+def preparePhotoData(preparation: PhotoPreparation, passepartoutMasks: PassepartoutMaskCache = None):
+    """Return the encoded PDF image data for *preparation*.
+
+    This is the work done by an asset pipeline worker process.
+    """
+    return encodePreparedImage(preparePhoto(preparation, passepartoutMasks=passepartoutMasks),
+                               preparation.jpeg_quality)
+
+
+def getPreparedPhoto(preparation: PhotoPreparation, state: ConversionState):
+    """Return ``(image, pdfImage)`` for one image area.
+
+    ``image`` is None when the photo is embedded from JPEG data without
+    being decoded; such a photo is opaque.
+    """
+    if preparation.mayBeUnchanged():
+        # A JPEG shown whole and upright, at no more than its own resolution,
+        # is embedded exactly as it is on disk.  That avoids decoding it and
+        # the quality loss of encoding it again.
+        unchangedJpeg = getUnchangedJpeg(preparation.image_path, preparation.crop_box)
+        if unchangedJpeg is not None:
+            return None, unchangedJpeg
+
+    # The result of an earlier conversion may be in the persistent cache.
+    cacheKey = None
+    if state.prepared_images is not None:
+        cacheKey = preparation.getCacheKey(state.prepared_images, state)
+        encodedBytes = state.prepared_images.get(cacheKey)
+        if encodedBytes is not None:
+            return getPdfImageFromEncoded(encodedBytes)
+
+    image = None
+    encodedBytes = None
+    if state.photo_pipeline is not None:
+        encodedBytes = state.photo_pipeline.getPreparedPhotoData(preparation)
+    if encodedBytes is None:
+        image = preparePhoto(preparation, state.decoded_images, state.passepartout_masks)
+        if cacheKey is None:
+            return image, PreparedImage(image, preparation.jpeg_quality)
+        encodedBytes = encodePreparedImage(image, preparation.jpeg_quality)
+
+    if cacheKey is not None:
+        state.prepared_images.put(cacheKey, encodedBytes)
+    return getPdfImageFromEncoded(encodedBytes, image)
@@ -23,3 +23,5 @@ class RenderContext:
     clipart_paths: tuple[str, ...]
     passepartout_folders: tuple[str, ...] = ()
     line_scales: Any = None
+    max_image_pixels: int = 0                   # Bounded-memory pixel ceiling, 0 for none.
+    vector_cliparts: bool = False               # Embed clip art as vector graphics where possible.
@@ -1,17 +1,16 @@
 """Shadow geometry and alpha-silhouette rendering helpers."""
 
-import tempfile
 import logging
 from math import floor
 
 import numpy as np
 from PIL import Image, ImageFilter
 import reportlab.lib.colors
-from reportlab.lib.utils import ImageReader
 from reportlab.platypus import Table
 
 from configUtils import getConfigurationBool
 from conversionState import ConversionState
+from pdfImages import PreparedImage
 from renderContext import RenderContext
 
 def findShadowBottomLeft(frameBottomLeft, angle, distance, swidth):
@@ -38,13 +37,8 @@ def intensityToGrey(value):
 def drawBlurredImageShadow(pdf, im, imgCropWidth_mcfunit,
                            imgCropHeight_mcfunit, shadowDistance_mcfunit,
                            shadowAngle, intensity, shadowBlur_mcfunit,
-                           shadowWidth_mcfunit, mcf2rl, temporary_files):
-    """
-    Draw a blurred, transparent shadow using the image's existing alpha mask.
-
-    ``temporary_files`` belongs to the caller's PDF-generation lifecycle. The
-    generated PNG is therefore retained until the PDF has been completed.
-    """
+                           shadowWidth_mcfunit, mcf2rl):
+    """Draw a blurred, transparent shadow using the image's existing alpha mask."""
     if im.mode != 'RGBA':
         im = im.convert('RGBA')
 
@@ -73,6 +67,7 @@ def drawBlurredImageShadow(pdf, im, imgCropWidth_mcfunit,
         'L', (im.width + 2 * padding_px, im.height + 2 * padding_px), 0
     )
     shadowAlpha.paste(alpha, (padding_px, padding_px))
+    alpha.close()
 
     if spreadRadius_px > 0:
         shadowAlpha = shadowAlpha.filter(
@@ -90,12 +85,9 @@ def drawBlurredImageShadow(pdf, im, imgCropWidth_mcfunit,
     )
     shadowImage = Image.new('RGBA', shadowAlpha.size, (0, 0, 0, 0))
     shadowImage.putalpha(shadowAlpha)
-
-    # ReportLab handles the PNG alpha channel when mask='auto' is used below.
-    shadowFile = tempfile.NamedTemporaryFile() # pylint:disable=consider-using-with
-    shadowFile.close()
-    shadowImage.save(shadowFile.name, 'PNG')
-    temporary_files.append(shadowFile.name)
+    # The padded canvas can be much larger than the photo; do not keep a
+    # second copy of it alive while ReportLab encodes the shadow.
+    shadowAlpha.close()
 
     # CEWE stores the direction in the same convention used by the older
     # vector shadow code: the angle identifies where the shadow is cast, not
@@ -108,8 +100,10 @@ def drawBlurredImageShadow(pdf, im, imgCropWidth_mcfunit,
     shadowOffsetY_mcfunit = -shadowDistanceScale * shadowDistance_mcfunit * np.sin(angleRadians)
     padding_mcfunit = padding_px / pixelsPerMcfunit
 
+    # ReportLab takes the pixels in memory and handles the alpha channel when
+    # mask='auto' is used below. Equal shadows share one embedded image.
     pdf.drawImage(
-        ImageReader(shadowFile.name),
+        PreparedImage(shadowImage),
         mcf2rl * (-0.5 * imgCropWidth_mcfunit - padding_mcfunit
                   + shadowOffsetX_mcfunit),
         mcf2rl * (-0.5 * imgCropHeight_mcfunit - padding_mcfunit
@@ -121,7 +115,7 @@ def drawBlurredImageShadow(pdf, im, imgCropWidth_mcfunit,
 
 
 def processDecorationShadow(decoration, areaHeight, areaWidth, pdf,
-                            context: RenderContext, state: ConversionState, im=None,
+                            context: RenderContext, state: ConversionState, im=None, # pylint: disable=unused-argument
                             imgCropWidth_mcfunit=None,
                             imgCropHeight_mcfunit=None):
     """Draw an enabled CEWE shadow decoration for an already-positioned area."""
@@ -173,8 +167,7 @@ def processDecorationShadow(decoration, areaHeight, areaWidth, pdf,
             drawBlurredImageShadow(
                 pdf, im, imgCropWidth_mcfunit, imgCropHeight_mcfunit,
                 shadowDistance_mcfunit, shadowAngle, intensity,
-                shadowBlur_mcfunit, shadowWidth_mcfunit, mcf2rl,
-                state.temporary_files
+                shadowBlur_mcfunit, shadowWidth_mcfunit, mcf2rl
             )
         else:
             shadowBottomLeftX, shadowBottomLeftY = findShadowBottomLeft(
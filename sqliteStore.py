@@ -0,0 +1,82 @@
+"""SQLite databases in the app data folder which can always be rebuilt.
+
+Indexes of the CEWE XML files and the font name cache store what was read
+from other files, so losing them costs only the time to read those files
+again.  A database written with another format is therefore emptied and
+recreated rather than migrated, and a database which cannot be used at all
+is replaced by one in memory for the rest of the conversion.
+"""
+
+import logging
+import os
+import sqlite3
+
+
+class SqliteStore:
+    """One SQLite database with a format version, kept open until :meth:`close`.
+
+    A subclass gives the CREATE TABLE statements of its format in *TABLES*
+    and changes *DATABASE_FORMAT* when they, or the meaning of what is
+    stored, change.  The format is kept in the database's ``user_version``.
+    Without a database file the store is only kept in memory.
+    """
+
+    DATABASE_FORMAT = 1
+    DESCRIPTION = 'database'
+    TABLES = ()
+
+    def __init__(self, databasePath=None):
+        self.database_path = databasePath
+        self._connection = None
+
+    def run(self, operation):
+        """Return ``operation(connection)``, run as one database transaction.
+
+        If the database file cannot be used, the failure is logged and the
+        operation is run again in memory.
+        """
+        try:
+            connection = self._connect()
+            with connection:
+                return operation(connection)
+        except sqlite3.Error as error:
+            logging.warning(f'Could not use the {self.DESCRIPTION} {self.database_path}: {error}')
+            self.close()
+            self.database_path = None
+            connection = self._connect()
+            with connection:
+                return operation(connection)
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exceptionType, exceptionValue, traceback):
+        self.close()
+
+    def _connect(self):
+        if self._connection is not None:
+            return self._connection
+        if self.database_path is None:
+            connection = sqlite3.connect(':memory:')
+        else:
+            os.makedirs(os.path.dirname(self.database_path), exist_ok=True)
+            connection = sqlite3.connect(self.database_path, timeout=30)
+        try:
+            if connection.execute('PRAGMA user_version').fetchone()[0] != self.DATABASE_FORMAT:
+                with connection:
+                    tables = connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'").fetchall()
+                    for (table,) in tables:
+                        connection.execute(f'DROP TABLE "{table}"')
+                    for createTable in self.TABLES:
+                        connection.execute(createTable)
+                    connection.execute(f'PRAGMA user_version = {self.DATABASE_FORMAT}')
+        except sqlite3.Error:
+            connection.close()
+            raise
+        self._connection = connection
+        return connection
@@ -15,10 +15,18 @@ class ShowDiffsStyle(Enum):
     DiffImage = 3
 
 class ComparePDF:
-    def __init__(self, pdf_paths, showdiffs):
+    TOLERANCE_WINDOW = 9
+
+    def __init__(self, pdf_paths, showdiffs, tolerance=0.0):
+        # tolerance is the largest difference of the channel values (0-255) which still counts
+        # as equal, averaged over every square of TOLERANCE_WINDOW x TOLERANCE_WINDOW pixels
+        # (about 1.5 mm at the 150 dpi used here). Resampling a photo differently, e.g. after
+        # decoding it at a reduced size, changes single pixels by up to about 30 but averages
+        # out within a square, while a missing corner, clip art or small photo does not.
         self.pdf_paths = pdf_paths
         self.pdf_documents = [pymupdf.open(path) for path in pdf_paths]
         self.showdiffs = showdiffs
+        self.tolerance = tolerance
         self.logger = logging.getLogger('cewe2pdf.test')
 
     def __del__(self):
@@ -85,8 +93,20 @@ class ComparePDF:
         cv2.destroyAllWindows()
 
 
+    def _within_tolerance(self, image1, image2) -> bool:
+        if np.array_equal(image1, image2):
+            return True
+        if image1.shape != image2.shape:
+            return False
+        if self.tolerance <= 0:
+            return False
+        pixelDifference = cv2.absdiff(image1, image2).max(axis=2).astype(np.float32)
+        windowDifference = cv2.blur(pixelDifference, (self.TOLERANCE_WINDOW, self.TOLERANCE_WINDOW))
+        return float(windowDifference.max()) <= self.tolerance
+
+
     def _compare_images(self, images, page_num) -> bool:
-        equal = all(np.array_equal(images[0], img) for img in images)
+        equal = all(self._within_tolerance(images[0], img) for img in images)
         if equal:
             self.logger.info(f"All images on Page {page_num} are equal")
         else:
@@ -104,7 +124,8 @@ class ComparePDF:
                         totalPixels = differentPixelMask.size
                         differentPercent = 100 * differentPixels / totalPixels
                         self.logger.warning(
-                            f"Page {page_num} image in {self.pdf_paths[i]} differs ({differentPixels:,} px, {differentPercent:.4f}%) from image {self.pdf_paths[j]}")
+                            f"Page {page_num} image in {self.pdf_paths[i]} differs ({differentPixels:,} px, {differentPercent:.4f}%, "
+                            f"mean difference {np.mean(diffArray):.3f}) from image {self.pdf_paths[j]}")
                     # Optionally show each page for debugging purposes, style determined by a command line option
                     if self.showdiffs == ShowDiffsStyle.SideBySide:
                         # The following lines display the two images side by side
@@ -123,6 +144,9 @@ def main():
     parser.add_argument('--pdf', action='append', required=True, help='Path to the PDF file')
     parser.add_argument('--showdiffs', choices=['nothing', 'diffimage', 'sidebyside'], action='store', required=False,
                         help='Show different pages in windows as they are found, eiher diffimage or sidebyside')
+    parser.add_argument('--tolerance', type=float, default=0.0, required=False,
+                        help='Largest difference of the channel values, averaged over every 9 x 9 pixel square, '
+                             'which still counts as equal')
     args = parser.parse_args()
     if not args.showdiffs:
         showdiffs = ShowDiffsStyle.Nothing
@@ -134,7 +158,7 @@ def main():
         else:
             showdiffs = ShowDiffsStyle.Nothing
 
-    compare = ComparePDF(args.pdf,showdiffs)
+    compare = ComparePDF(args.pdf,showdiffs,args.tolerance)
     result = compare.compare()
     return result
 
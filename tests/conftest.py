@@ -0,0 +1,12 @@
+"""Settings shared by the regression tests run with pytest."""
+
+import pytest
+
+
+@pytest.fixture(autouse=True, scope='session')
+def temporaryAppData(tmp_path_factory):
+    """Keep the persistent caches, indexes and converted fonts of the tested
+    conversions out of the user's app data folder."""
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setenv('CEWE2PDF_APPDATA', str(tmp_path_factory.mktemp('appdata')))
+        yield
@@ -0,0 +1,89 @@
+"""Tests for photo preparation in asset pipeline worker processes."""
+
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from PIL import Image
+
+# Bootstrap the project root so this test can also run directly.
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from assetPipeline import AssetPipeline, _initialiseWorker # pylint: disable=protected-access
+from conversionState import ConversionState
+from corners import CornersInfo
+from photoPreparation import PhotoPreparation, preparePhotoData
+
+
+def makePreparation(imagePath, width):
+    # A resize forces real preparation work rather than JPEG passthrough.
+    return PhotoPreparation(
+        image_path=imagePath, crop_box=(0, 0, 64, 48), source_box=(0.0, 0.0, 64.0, 48.0),
+        output_size=(width, width * 3 // 4), max_reduction=1,
+        resampling_filter=Image.Resampling.LANCZOS, jpeg_quality=86,
+        mask_file_name=None, clipart_paths=(), corners_info=CornersInfo(),
+        crop_width_mcfunit=100.0)
+
+
+def makePipeline(preparations):
+    executor = ProcessPoolExecutor(max_workers=2, initializer=_initialiseWorker, initargs=(30,))
+    return AssetPipeline(executor, preparations, 4, ConversionState())
+
+
+def test_workerResultsMatchInlinePreparation():
+    """Photos prepared by worker processes are identical to inline ones."""
+    with TemporaryDirectory() as temporaryDirectory:
+        photo = os.path.join(temporaryDirectory, 'photo.jpg')
+        Image.radial_gradient('L').convert('RGB').resize((64, 48)).save(photo, 'JPEG')
+        preparations = [makePreparation(photo, width) for width in (16, 24, 32, 40, 48, 56)]
+        pipeline = makePipeline(preparations)
+        try:
+            for preparation in preparations:
+                assert pipeline.getPreparedPhotoData(preparation) == preparePhotoData(preparation)
+        finally:
+            pipeline.shutdown()
+        assert (pipeline.prepared, pipeline.unplanned) == (6, 0)
+
+
+def test_skippedAndUnplannedPreparations():
+    """Planned photos which are not drawn are dropped; unplanned ones are not prepared."""
+    with TemporaryDirectory() as temporaryDirectory:
+        photo = os.path.join(temporaryDirectory, 'photo.png')
+        Image.new('RGB', (64, 48), (10, 120, 200)).save(photo, 'PNG')
+        preparations = [makePreparation(photo, width) for width in (16, 24, 32)]
+        pipeline = makePipeline(preparations)
+        try:
+            # The first planned photo is skipped, as for a hidden area.
+            assert pipeline.getPreparedPhotoData(preparations[1]) == preparePhotoData(preparations[1])
+            assert pipeline.getPreparedPhotoData(preparations[0]) is None
+            assert pipeline.getPreparedPhotoData(makePreparation(photo, 8)) is None
+            assert pipeline.getPreparedPhotoData(preparations[2]) == preparePhotoData(preparations[2])
+        finally:
+            pipeline.shutdown()
+        assert (pipeline.prepared, pipeline.unplanned) == (2, 2)
+
+
+def test_windowFollowsTheRendererPastSkippedPreparations():
+    """Skipping at least a window of planned photos does not leave the window behind."""
+    with TemporaryDirectory() as temporaryDirectory:
+        photo = os.path.join(temporaryDirectory, 'photo.png')
+        Image.new('RGB', (64, 48), (10, 120, 200)).save(photo, 'PNG')
+        preparations = [makePreparation(photo, width) for width in range(8, 56, 4)]
+        pipeline = makePipeline(preparations)
+        try:
+            # A page with the first six planned photos fails, which is more than the window of 4.
+            assert pipeline.getPreparedPhotoData(preparations[6]) is None
+            for preparation in preparations[7:]:
+                assert pipeline.getPreparedPhotoData(preparation) == preparePhotoData(preparation)
+        finally:
+            pipeline.shutdown()
+        assert (pipeline.prepared, pipeline.unplanned) == (len(preparations) - 7, 1)
+
+
+if __name__ == '__main__':
+    test_workerResultsMatchInlinePreparation()
+    test_skippedAndUnplannedPreparations()
+    test_windowFollowsTheRendererPastSkippedPreparations()
@@ -0,0 +1,129 @@
+"""Tests that stock backgrounds are loaded once, resampled to the background
+resolution, and that JPEG files which need no resampling are not re-encoded."""
+
+import os
+import sys
+from io import BytesIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from PIL import Image
+from reportlab.lib.rl_accel import asciiBase85Encode
+from reportlab.pdfgen import canvas
+
+# Bootstrap the project root so this test can also run directly.
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from backgrounds import getBackgroundImage, getBackgroundOutputSize
+from conversionState import ConversionState
+from pdfImages import EncodedJpeg, PreparedImage
+from renderContext import RenderContext
+
+# A 254 x 254 MCF unit (one inch square) area needs 150 x 150 pixels at 150 DPI.
+context = RenderContext(72 / 254.0, 300, 86, 150, Image.Resampling.LANCZOS, None, {}, ())
+
+
+def drawBackgroundPages(designElementIds, state, backgroundLocations, areaWidth=254, areaHeight=254):
+    pdfBuffer = BytesIO()
+    pdf = canvas.Canvas(pdfBuffer, pageCompression=0)
+    for designElementId in designElementIds:
+        backgroundImage = getBackgroundImage(designElementId, state, backgroundLocations,
+                                             areaWidth, areaHeight, context)
+        pdf.drawImage(backgroundImage, 0, 0, width=100, height=50)
+        # As processBackground does once the background is embedded.
+        backgroundImage.release()
+        pdf.showPage()
+    pdf.save()
+    return pdfBuffer.getvalue()
+
+
+def test_backgroundIsLoadedOnceAndEmbeddedOnce():
+    with TemporaryDirectory() as temporaryDirectory:
+        Image.new('RGB', (60, 40), (200, 180, 20)).save(os.path.join(temporaryDirectory, '1001.bmp'))
+        Image.new('RGB', (60, 40), (20, 180, 200)).save(os.path.join(temporaryDirectory, '1002.webp'))
+        state = ConversionState()
+
+        pdfData = drawBackgroundPages(['1001', '1002', '1001', '1001', '1002'], state,
+                                      [temporaryDirectory])
+
+        assert set(state.background_images) == {('1001', None), ('1002', None)}
+        assert isinstance(state.background_images[('1001', None)], PreparedImage)
+        assert pdfData.count(b'/Subtype /Image') == 2
+
+
+def test_jpegBackgroundIsEmbeddedByteForByte():
+    with TemporaryDirectory() as temporaryDirectory:
+        jpegPath = os.path.join(temporaryDirectory, '1003.jpg')
+        Image.new('RGB', (60, 40), (90, 20, 160)).save(jpegPath, 'JPEG', quality=70)
+        with open(jpegPath, 'rb') as jpegFile:
+            jpegBytes = jpegFile.read()
+        state = ConversionState()
+
+        pdfData = drawBackgroundPages(['1003', '1003'], state, [temporaryDirectory])
+
+        assert isinstance(state.background_images[('1003', None)], EncodedJpeg)
+        assert pdfData.count(b'/Subtype /Image') == 1
+        assert asciiBase85Encode(jpegBytes).encode('latin-1') in pdfData
+
+
+def test_drawnBackgroundKeepsOnlyItsName():
+    with TemporaryDirectory() as temporaryDirectory:
+        Image.new('RGB', (60, 40), (200, 180, 20)).save(os.path.join(temporaryDirectory, '1006.bmp'))
+        Image.new('RGB', (60, 40), (90, 20, 160)).save(os.path.join(temporaryDirectory, '1007.jpg'),
+                                                       'JPEG', quality=70)
+        state = ConversionState()
+
+        pdfData = drawBackgroundPages(['1006', '1007', '1006', '1007'], state, [temporaryDirectory])
+
+        preparedBackground = state.background_images[('1006', None)]
+        jpegBackground = state.background_images[('1007', None)]
+        assert preparedBackground._image is None and preparedBackground._reader is None
+        assert jpegBackground.jpeg_bytes is None and jpegBackground._reader is None
+        assert pdfData.count(b'/Subtype /Image') == 2
+        try:
+            preparedBackground.getSize()
+        except ValueError:
+            return
+        raise AssertionError('A released background still supplied image data')
+
+
+def test_backgroundIsResampledToBackgroundResolution():
+    with TemporaryDirectory() as temporaryDirectory:
+        Image.new('RGB', (1200, 800), (40, 120, 60)).save(os.path.join(temporaryDirectory, '1005.jpg'))
+        state = ConversionState()
+
+        pdfData = drawBackgroundPages(['1005', '1005'], state, [temporaryDirectory], 508, 254)
+        pdfData += drawBackgroundPages(['1005'], state, [temporaryDirectory], 254, 254)
+
+        assert set(state.background_images) == {('1005', (300, 150)), ('1005', (150, 150))}
+        assert isinstance(state.background_images[('1005', (300, 150))], PreparedImage)
+        assert b'/Width 300' in pdfData and b'/Height 150' in pdfData
+        assert b'/Width 1200' not in pdfData
+
+
+def test_backgroundOutputSizeThreshold():
+    assert getBackgroundOutputSize((1000, 1000), 254, 254, 150) == (150, 150)
+    # A reduction to more than 80% of the size is not worth a resample.
+    assert getBackgroundOutputSize((180, 180), 254, 254, 150) is None
+    assert getBackgroundOutputSize((100, 100), 254, 254, 150) is None
+
+
+def test_missingBackgroundRaises():
+    with TemporaryDirectory() as temporaryDirectory:
+        state = ConversionState()
+        try:
+            getBackgroundImage('1004', state, [temporaryDirectory], 254, 254, context)
+        except ValueError:
+            assert not state.background_images
+            return
+        raise AssertionError('A missing background was not reported')
+
+
+if __name__ == '__main__':
+    test_backgroundIsLoadedOnceAndEmbeddedOnce()
+    test_jpegBackgroundIsEmbeddedByteForByte()
+    test_drawnBackgroundKeepsOnlyItsName()
+    test_backgroundIsResampledToBackgroundResolution()
+    test_backgroundOutputSizeThreshold()
+    test_missingBackgroundRaises()
@@ -0,0 +1,94 @@
+"""Render a synthetic giant photo in bounded-memory mode under a memory budget.
+
+The photo is prepared and given a blurred shadow in a child process, whose
+peak resident memory is compared before and after.  Run this file directly
+to print the peak with and without the pixel ceiling.
+"""
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from PIL import Image
+
+# Bootstrap the project root so this test can also run directly.
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+GIANT_SIZE = (10000, 8000)
+MAX_IMAGE_PIXELS = 2 * 1000 * 1000
+MEMORY_BUDGET_BYTES = 48 * 1024 * 1024
+
+CHILD_SCRIPT = """
+import resource
+import sys
+from io import BytesIO
+import xml.etree.ElementTree as ET
+
+from PIL import Image
+from reportlab.pdfgen import canvas
+
+from imageareas import PassepartoutLayout, getPhotoPreparation
+from photoPreparation import preparePhoto
+from renderContext import RenderContext
+from shadows import drawBlurredImageShadow
+
+def getPeakBytes():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+photoPath, maxPixels = sys.argv[1], int(sys.argv[2])
+mcf2rl = 72 / 254
+area = ET.fromstring(
+    '<area><position width="2000" height="1600"/>'
+    '<image filename="giant.jpg"><cutout left="0" top="0" scale="0.2"/></image></area>')
+context = RenderContext(mcf2rl, 600, 86, 150, Image.Resampling.LANCZOS, None, {}, (),
+                        max_image_pixels=maxPixels)
+preparation = getPhotoPreparation(area.find('image'), area, 1600, 2000, photoPath, 'normal',
+                                  PassepartoutLayout(), context)
+pdf = canvas.Canvas(BytesIO())
+startPeak = getPeakBytes()
+image = preparePhoto(preparation)
+drawBlurredImageShadow(pdf, image, 2000, 1600, 20, 135, 128, 30, 20, mcf2rl)
+pdf.showPage()
+print(image.width * image.height, getPeakBytes() - startPeak)
+"""
+
+
+def renderGiantPhoto(photoPath, maxPixels):
+    """Return the prepared pixel count and the peak memory growth of one render."""
+    completed = subprocess.run(
+        [sys.executable, '-c', CHILD_SCRIPT, str(photoPath), str(maxPixels)],
+        cwd=PROJECT_ROOT, capture_output=True, text=True, check=True)
+    pixels, peakGrowth = completed.stdout.split()
+    return int(pixels), int(peakGrowth)
+
+
+def writeGiantPhoto(photoPath):
+    # Greyscale keeps the test's own memory use down; its decoded size is
+    # still 80 MB, well beyond the budget.
+    Image.linear_gradient('L').resize(GIANT_SIZE).save(photoPath, 'JPEG')
+
+
+def test_giantPhotoStaysWithinMemoryBudget():
+    if os.name == 'nt':
+        # The child process measures its peak with the POSIX resource module.
+        return
+    with TemporaryDirectory() as temporaryDirectory:
+        photoPath = Path(temporaryDirectory) / 'giant.jpg'
+        writeGiantPhoto(photoPath)
+        pixels, peakGrowth = renderGiantPhoto(photoPath, MAX_IMAGE_PIXELS)
+    assert pixels <= MAX_IMAGE_PIXELS
+    assert peakGrowth < MEMORY_BUDGET_BYTES
+
+
+if __name__ == '__main__':
+    with TemporaryDirectory() as mainDirectory:
+        mainPhotoPath = Path(mainDirectory) / 'giant.jpg'
+        writeGiantPhoto(mainPhotoPath)
+        for ceiling in (0, MAX_IMAGE_PIXELS):
+            mainPixels, mainPeakGrowth = renderGiantPhoto(mainPhotoPath, ceiling)
+            print(f'pixel ceiling {ceiling}: {mainPixels} pixels prepared, '
+                  f'peak memory grew by {mainPeakGrowth / (1024 * 1024):.1f} MB')
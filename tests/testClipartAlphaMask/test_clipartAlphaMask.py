@@ -0,0 +1,104 @@
+"""Tests that the clip art alpha mask matches the former per-pixel loop.
+
+Run this file directly for a microbenchmark of the mask generation.
+"""
+
+import random
+import sys
+import time
+from pathlib import Path
+
+from PIL import Image
+
+# Bootstrap the project root so this test can also run directly.
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from clpFile import ClpFile
+
+
+def makeLoopAlphaMask(rgbImage, alpha):
+    """The former mask generation in ClpFile.convertToPngInBuffer."""
+    alphamask = rgbImage.copy().convert('L').resize(rgbImage.size)
+    pixels = alphamask.load()
+    for i in range(alphamask.size[0]):
+        for j in range(alphamask.size[1]):
+            if pixels[i, j] != 0:
+                pixels[i, j] = alpha
+    return alphamask
+
+
+def makeTestImage(size, seed=1):
+    """An RGB image with black, nearly black, and coloured pixels."""
+    randomValues = random.Random(seed)
+    values = [(0, 0, 0), (1, 0, 0), (0, 1, 0), (0, 0, 4), (0, 0, 5), (255, 255, 255), (12, 200, 90)]
+    image = Image.new('RGB', size)
+    image.putdata([randomValues.choice(values) for _ in range(size[0] * size[1])])
+    return image
+
+
+def test_alphaMaskMatchesPixelLoop():
+    image = makeTestImage((61, 47))
+    for alpha in (0, 1, 128, 254, 255):
+        mask = ClpFile.makeAlphaMask(image, alpha)
+        assert mask.mode == 'L' and mask.size == image.size
+        assert mask.tobytes() == makeLoopAlphaMask(image, alpha).tobytes()
+
+
+def test_rgbRasterGetsAlphaMask():
+    clipart = ClpFile()
+    image = makeTestImage((20, 10))
+    clipart.rasterSvgData = lambda width, height: image.copy()
+    clipart.convertToPngInBuffer(20, 10, 100)
+    with Image.open(clipart.pngMemFile) as pngImage:
+        assert pngImage.mode == 'RGBA'
+        assert pngImage.getchannel('A').tobytes() == makeLoopAlphaMask(image, 100).tobytes()
+
+
+def test_everyRasterModeGetsAlphaChannel():
+    rgbImage = makeTestImage((20, 10))
+    clipart = ClpFile()
+    clipart.rasterSvgData = lambda width, height: rgbImage.copy()
+    rgbAlphaChannel = clipart.rasterAlphaChannel(20, 10)
+    for mode in ('L', 'P', 'CMYK'):
+        clipart.rasterSvgData = lambda width, height, mode=mode: rgbImage.convert(mode)
+        alphaChannel = clipart.rasterAlphaChannel(20, 10)
+        assert alphaChannel.mode == 'L' and alphaChannel.size == (20, 10)
+        if mode == 'L':
+            assert alphaChannel.tobytes() == rgbAlphaChannel.tobytes()
+    # A transparent part counts as white, so it is masked out like white.
+    clipart.rasterSvgData = lambda width, height: Image.new('LA', (20, 10), (0, 0))
+    assert set(clipart.rasterAlphaChannel(20, 10).getdata()) == {0}
+
+
+def timeAlphaMask(makeMask, image, repeats):
+    """Return the shortest of *repeats* times to make the mask of *image*."""
+    elapsed = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        makeMask(image, 128)
+        elapsed.append(time.perf_counter() - start)
+    return min(elapsed)
+
+
+def test_alphaMaskIsMuchFasterThanPixelLoop():
+    # The lookup table is about a hundred times faster; a generous margin
+    # keeps the test reliable on a busy machine.
+    image = makeTestImage((400, 300))
+    assert 10 * timeAlphaMask(ClpFile.makeAlphaMask, image, 5) < timeAlphaMask(makeLoopAlphaMask, image, 1)
+
+
+def benchmarkAlphaMask(size=(1240, 1754), repeats=3):
+    """Print the time to make the mask of an A4 page at 150 dpi both ways."""
+    image = makeTestImage(size)
+    for name, makeMask in (('pixel loop', makeLoopAlphaMask), ('lookup table', ClpFile.makeAlphaMask)):
+        elapsed = timeAlphaMask(makeMask, image, repeats)
+        print(f'{name}: {elapsed * 1000:.1f} ms for {size[0]} x {size[1]} pixels')
+
+
+if __name__ == '__main__':
+    test_alphaMaskMatchesPixelLoop()
+    test_rgbRasterGetsAlphaMask()
+    test_everyRasterModeGetsAlphaChannel()
+    test_alphaMaskIsMuchFasterThanPixelLoop()
+    benchmarkAlphaMask()
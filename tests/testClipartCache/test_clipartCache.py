@@ -0,0 +1,119 @@
+"""Tests that each clip art placement is rasterised only once per distinct rendering."""
+
+import os
+import sys
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import pytest
+
+# Bootstrap the project root so this test can also run directly.
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+import clipartCache
+from clipartCache import RasterisedClipartCache
+from persistentCache import FileDigests, PersistentBlobCache
+
+
+class CountingRasteriser:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return f'png {self.calls}'.encode()
+
+
+def test_placementsAreRasterisedOncePerRendering():
+    with TemporaryDirectory() as temporaryDirectory:
+        clipartPath = os.path.join(temporaryDirectory, 'corner.clp')
+        Path(clipartPath).write_text('a00')
+        cache = RasterisedClipartCache()
+        rasterise = CountingRasteriser()
+        fileDigests = FileDigests()
+        replacements = [('#000000', '#FF0000')]
+
+        first = cache.getPngData(clipartPath, replacements, (100, 80), 255, False, False, rasterise, fileDigests)
+        for _ in range(5):
+            assert cache.getPngData(clipartPath, list(replacements), (100, 80), 255, False, False,
+                                    rasterise, fileDigests) == first
+        assert rasterise.calls == 1
+
+        for variant in ([], (100, 80), 255, False, False), (replacements, (100, 81), 255, False, False), \
+                (replacements, (100, 80), 128, False, False), (replacements, (100, 80), 255, True, False), \
+                (replacements, (100, 80), 255, False, True):
+            cache.getPngData(clipartPath, *variant, rasterise, fileDigests)
+        assert rasterise.calls == 6
+        assert (cache.hits, cache.misses) == (5, 6)
+
+
+def test_changedFileIsRasterisedAgain():
+    with TemporaryDirectory() as temporaryDirectory:
+        clipartPath = os.path.join(temporaryDirectory, 'corner.svg')
+        Path(clipartPath).write_text('<svg/>')
+        cache = RasterisedClipartCache()
+        rasterise = CountingRasteriser()
+        cache.getPngData(clipartPath, [], (10, 10), 255, False, False, rasterise, FileDigests())
+        os.utime(clipartPath, ns=(1, 1))
+        cache.getPngData(clipartPath, [], (10, 10), 255, False, False, rasterise, FileDigests())
+        assert rasterise.calls == 2
+
+
+def test_failedRasterisationIsNotCached():
+    with TemporaryDirectory() as temporaryDirectory:
+        clipartPath = os.path.join(temporaryDirectory, 'empty.clp')
+        Path(clipartPath).write_text('a')
+        cache = RasterisedClipartCache()
+        assert cache.getPngData(clipartPath, [], (10, 10), 255, False, False, lambda: None, FileDigests()) is None
+        assert cache.current_bytes == 0
+
+
+def test_persistentTierServesALaterConversion():
+    with TemporaryDirectory() as temporaryDirectory:
+        clipartPath = os.path.join(temporaryDirectory, 'frame.clp')
+        Path(clipartPath).write_text('a00')
+        cacheDirectory = os.path.join(temporaryDirectory, 'cache')
+        rasterise = CountingRasteriser()
+        for _ in range(2):
+            cache = RasterisedClipartCache(persistentCache=PersistentBlobCache(cacheDirectory, 1024 * 1024))
+            assert cache.getPngData(clipartPath, [], (10, 10), 255, False, False,
+                                    rasterise, FileDigests()) == b'png 1'
+        assert rasterise.calls == 1
+        assert cache.persistent_cache.hits == 1
+
+
+def test_persistentEntriesOfAnEarlierRasteriserAreNotUsed(monkeypatch):
+    with TemporaryDirectory() as temporaryDirectory:
+        clipartPath = os.path.join(temporaryDirectory, 'frame.clp')
+        Path(clipartPath).write_text('a00')
+        cacheDirectory = os.path.join(temporaryDirectory, 'cache')
+        rasterise = CountingRasteriser()
+        cache = RasterisedClipartCache(persistentCache=PersistentBlobCache(cacheDirectory, 1024 * 1024))
+        cache.getPngData(clipartPath, [], (10, 10), 255, False, False, rasterise, FileDigests())
+
+        monkeypatch.setattr(clipartCache, 'CLIPART_RASTERISER_VERSION', clipartCache.CLIPART_RASTERISER_VERSION + 1)
+        cache = RasterisedClipartCache(persistentCache=PersistentBlobCache(cacheDirectory, 1024 * 1024))
+        assert cache.getPngData(clipartPath, [], (10, 10), 255, False, False,
+                                rasterise, FileDigests()) == b'png 2'
+        assert cache.persistent_cache.hits == 0
+
+
+def test_leastRecentlyUsedEntriesAreEvicted():
+    with TemporaryDirectory() as temporaryDirectory:
+        clipartPath = os.path.join(temporaryDirectory, 'corner.clp')
+        Path(clipartPath).write_text('a00')
+        cache = RasterisedClipartCache(maxBytes=10)
+        for width in (1, 2, 3):
+            cache.getPngData(clipartPath, [], (width, 1), 255, False, False, lambda: b'12345', FileDigests())
+        assert cache.evictions == 1 and cache.current_bytes == 10
+
+
+if __name__ == '__main__':
+    test_placementsAreRasterisedOncePerRendering()
+    test_changedFileIsRasterisedAgain()
+    test_failedRasterisationIsNotCached()
+    test_persistentTierServesALaterConversion()
+    with pytest.MonkeyPatch.context() as monkeypatchContext:
+        test_persistentEntriesOfAnEarlierRasteriserAreNotUsed(monkeypatchContext)
+    test_leastRecentlyUsedEntriesAreEvicted()
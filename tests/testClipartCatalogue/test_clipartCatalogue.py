@@ -0,0 +1,66 @@
+"""Tests for the clipart catalogue kept in the app data folder between conversions."""
+
+import glob
+import os
+import shutil
+import sys
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+# Bootstrap the project root so this test can also run directly.
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from clipArt import ClipartCatalogue, readClipArtConfigXML, readClipartConfigEntries
+
+
+def readEveryXmlFile(baseFolder, keyaccountFolder):
+    """The clipart dictionary as built by walking and parsing every file."""
+    clipartDict = {}
+    xmlFiles = []
+    for root, dirs, files in os.walk(os.path.join(baseFolder, 'Resources', 'photofun', 'decorations')):
+        dirs.sort()
+        xmlFiles.extend(os.path.join(root, name) for name in sorted(files) if name.endswith('.xml'))
+    xmlFiles += sorted(glob.glob(os.path.join(keyaccountFolder, 'addons', '*', 'cliparts', 'v1', 'decorations', '*.xml')))
+    xmlFiles += sorted(glob.glob(os.path.join(keyaccountFolder, 'photofun', 'decorations', '*', '*', '*.xml')))
+    for xmlFile in xmlFiles:
+        for designElementId, fileName in readClipartConfigEntries(xmlFile) or ():
+            clipartDict[designElementId] = os.path.abspath(fileName)
+    return clipartDict
+
+
+def test_laterConversionReusesTheCatalogue():
+    with TemporaryDirectory() as temporaryDirectory:
+        baseFolder = os.path.join(temporaryDirectory, 'cewe')
+        keyaccountFolder = os.path.join(temporaryDirectory, 'hps', '5026')
+        shutil.copytree(PROJECT_ROOT / 'tests' / 'Resources', os.path.join(baseFolder, 'Resources'))
+        shutil.copytree(PROJECT_ROOT / 'tests' / 'hps' / '5026', keyaccountFolder)
+        databasePath = os.path.join(temporaryDirectory, 'indexes', 'cliparts.sqlite')
+
+        firstCatalogue = ClipartCatalogue(databasePath)
+        firstCliparts = {}
+        readClipArtConfigXML(baseFolder, keyaccountFolder, firstCliparts, firstCatalogue)
+        firstCatalogue.close()
+        assert firstCliparts == readEveryXmlFile(baseFolder, keyaccountFolder)
+        assert 121285 in firstCliparts
+
+        laterCatalogue = ClipartCatalogue(databasePath)
+        laterCliparts = {}
+        readClipArtConfigXML(baseFolder, keyaccountFolder, laterCliparts, laterCatalogue)
+        laterCatalogue.close()
+        assert laterCliparts == firstCliparts
+        assert (laterCatalogue.directories_listed, laterCatalogue.files_parsed) == (0, 0)
+
+        addedXml = os.path.join(baseFolder, 'Resources', 'photofun', 'decorations', '46537', 'Kreis', 'added.xml')
+        Path(addedXml).write_text('<decorations><decoration><clipart designElementId="999999" file="added.svg"/>'
+                                  '</decoration></decorations>', encoding='utf-8')
+        changedCatalogue = ClipartCatalogue(databasePath)
+        changedCliparts = {}
+        readClipArtConfigXML(baseFolder, keyaccountFolder, changedCliparts, changedCatalogue)
+        changedCatalogue.close()
+        assert changedCliparts[999999] == os.path.join(os.path.dirname(addedXml), 'added.svg')
+        assert (changedCatalogue.directories_listed, changedCatalogue.files_parsed) == (1, 1)
+
+
+if __name__ == '__main__':
+    test_laterConversionReusesTheCatalogue()
@@ -0,0 +1,93 @@
+"""Tests that clip art is rasterised in one cairosvg pass with unchanged pixels.
+
+Run this file directly for a benchmark over the test clip art.
+"""
+
+import sys
+import time
+from io import BytesIO
+from pathlib import Path
+
+import cairosvg
+from PIL import Image, ImageChops
+
+# Bootstrap the project root so this test can also run directly.
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from clpFile import ClpFile
+
+DECORATIONS = PROJECT_ROOT / 'tests' / 'Resources' / 'photofun' / 'decorations'
+TARGET_SIZES = ((150, 150), (600, 250), (37, 410))
+
+
+def loadDecorations():
+    cliparts = []
+    for clipartPath in sorted(DECORATIONS.rglob('*')):
+        if clipartPath.suffix == '.clp':
+            cliparts.append((clipartPath, ClpFile(str(clipartPath))))
+        elif clipartPath.suffix == '.svg':
+            cliparts.append((clipartPath, ClpFile().loadFromSVG(clipartPath)))
+    return cliparts
+
+
+def rasterTwoPasses(clipart, width, height):
+    """The former ClpFile.rasterSvgData, which rendered once only to learn the size."""
+    tmpMemFile = BytesIO()
+    cairosvg.svg2png(bytestring=clipart.svgData, write_to=tmpMemFile, unsafe=True)
+    tmpMemFile.seek(0)
+    tempImage = Image.open(tmpMemFile)
+    scaleMax = max(width / tempImage.width, height / tempImage.height)
+    tmpMemFile = BytesIO()
+    cairosvg.svg2png(bytestring=clipart.svgData, write_to=tmpMemFile, scale=scaleMax, unsafe=True)
+    tmpMemFile.seek(0)
+    return Image.open(tmpMemFile).resize((width, height))
+
+
+def test_svgSizeIsReadFromItsAttributes():
+    assert ClpFile._svgLength('7.5pt') == 10.0 # pylint: disable=protected-access
+    assert ClpFile._svgLength('3em') is None # pylint: disable=protected-access
+    clipart = ClpFile()
+    clipart.svgData = b'<svg xmlns="http://www.w3.org/2000/svg" width="1in" height="50.9px"/>'
+    assert clipart.getSvgSize() == (96, 50)
+    clipart.svgData = b'<svg xmlns="http://www.w3.org/2000/svg" width="100%" viewBox="0,0 40.5 30"/>'
+    assert clipart.getSvgSize() == (40, 30)
+    clipart.svgData = b'<svg xmlns="http://www.w3.org/2000/svg" width="10em" height="10em"/>'
+    assert clipart.getSvgSize() is None
+
+
+def test_svgSizeMatchesTheUnscaledRendering():
+    for clipartPath, clipart in loadDecorations():
+        pngData = cairosvg.svg2png(bytestring=clipart.svgData, unsafe=True)
+        with Image.open(BytesIO(pngData)) as renderedImage:
+            assert clipart.getSvgSize() == renderedImage.size, clipartPath
+
+
+def test_singlePassIsPixelIdentical():
+    for clipartPath, clipart in loadDecorations():
+        for width, height in TARGET_SIZES:
+            expected = rasterTwoPasses(clipart, width, height)
+            actual = clipart.rasterSvgData(width, height)
+            assert actual.mode == expected.mode, clipartPath
+            assert ImageChops.difference(actual, expected).getbbox() is None, clipartPath
+
+
+def benchmarkRasterisation(repeats=3):
+    """Print the time to rasterise all the test clip art both ways."""
+    cliparts = loadDecorations()
+    for name, raster in (('two passes', lambda clipart, size: rasterTwoPasses(clipart, *size)),
+                         ('one pass', lambda clipart, size: clipart.rasterSvgData(*size))):
+        start = time.perf_counter()
+        for _ in range(repeats):
+            for _clipartPath, clipart in cliparts:
+                for size in TARGET_SIZES:
+                    raster(clipart, size)
+        elapsed = time.perf_counter() - start
+        print(f'{name}: {elapsed:.2f} s for {repeats * len(cliparts) * len(TARGET_SIZES)} rasterisations')
+
+
+if __name__ == '__main__':
+    test_svgSizeIsReadFromItsAttributes()
+    test_svgSizeMatchesTheUnscaledRendering()
+    test_singlePassIsPixelIdentical()
+    benchmarkRasterisation()
@@ -0,0 +1,56 @@
+"""Tests for the single-pass clip art colour replacement."""
+
+import logging
+import sys
+from pathlib import Path
+
+# Bootstrap the project root so this test can also run directly.
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from clpFile import ClpFile, getColorReplacer
+
+SVG = ('<svg xmlns="http://www.w3.org/2000/svg">'
+       '<g style="opacity:0.4;fill:#5e0b23;stroke:#FFFFFF"><path d="M0,0"/></g>'
+       '<stop style="stop-color:#5E0B23"/>'
+       '<path fill="#FFFFFF" d="M1,1"/><path fill="#ffffff" d="M2,2"/></svg>')
+
+
+def replaceColors(svgText, colorReplacements):
+    clipart = ClpFile()
+    clipart.svgData = svgText.encode()
+    return clipart.replaceColors(colorReplacements).svgData.decode()
+
+
+def test_styleAndFillAttributesAreReplaced():
+    result = replaceColors(SVG, [('#5E0B23', '#00FF00'), ('#FFFFFF', '#0000FF')])
+    assert 'style="opacity:0.4;fill:#00FF00;stroke:#0000FF"' in result
+    assert 'style="stop-color:#00FF00"' in result
+    assert '<path fill="#0000FF" d="M1,1"/>' in result
+    # Fill attributes, unlike style properties, are matched with their case.
+    assert '<path fill="#ffffff" d="M2,2"/>' in result
+
+
+def test_colorsAreSwappedInOnePass():
+    result = replaceColors(SVG, [('#5E0B23', '#FFFFFF'), ('#FFFFFF', '#5E0B23')])
+    assert 'style="opacity:0.4;fill:#FFFFFF;stroke:#5E0B23"' in result
+    assert '<path fill="#5E0B23" d="M1,1"/>' in result
+
+
+def test_unusedReplacementIsWarnedAbout(caplog):
+    with caplog.at_level(logging.WARNING):
+        replaceColors(SVG, [('#5E0B23', '#00FF00'), ('#123456', '#654321'), ('#FFFFFF', '#FFFFFF')])
+    assert [record.getMessage() for record in caplog.records] == [
+        'Clipart color substitution defined but not made from #123456 to #654321']
+
+
+def test_compiledReplacerIsCachedPerReplacementSet():
+    replacements = (('#5E0B23', '#00FF00'), ('#FFFFFF', '#0000FF'))
+    assert getColorReplacer(replacements) is getColorReplacer(tuple(replacements))
+    assert getColorReplacer(replacements) is not getColorReplacer(replacements[:1])
+
+
+if __name__ == '__main__':
+    test_styleAndFillAttributesAreReplaced()
+    test_colorsAreSwappedInOnePass()
+    test_compiledReplacerIsCachedPerReplacementSet()
@@ -0,0 +1,81 @@
+"""Tests for the font names kept in the app data folder between conversions."""
+
+import os
+import shutil
+import sys
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+# Bootstrap the project root so this test can also run directly.
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from fontMetadata import FontMetadataCache, readFontNames
+
+FONTS_FOLDER = PROJECT_ROOT / 'tests' / 'Resources' / 'photofun' / 'fonts'
+
+
+def copyFonts(folder, *names):
+    fontFiles = []
+    for name in names:
+        shutil.copy(FONTS_FOLDER / name, folder)
+        fontFiles.append(os.path.join(folder, name))
+    return fontFiles
+
+
+def test_unchangedFontsAreNotOpenedAgain():
+    with TemporaryDirectory() as temporaryDirectory:
+        fontFiles = copyFonts(temporaryDirectory, 'Poppins-Light.ttf', 'EBGaramond-BoldItalic.ttf')
+        databasePath = os.path.join(temporaryDirectory, 'indexes', 'fonts.sqlite')
+
+        firstCache = FontMetadataCache(databasePath)
+        names = [firstCache.getNames(fontFile) for fontFile in fontFiles]
+        assert names == [readFontNames(fontFile) for fontFile in fontFiles]
+        assert names[0][0] == 'Poppins Light'
+        firstCache.save()
+
+        laterCache = FontMetadataCache(databasePath)
+        with patch('fontMetadata.readFontNames', side_effect=AssertionError('font file opened')):
+            assert [laterCache.getNames(fontFile) for fontFile in fontFiles] == names
+        assert (laterCache.files_read, laterCache.files_reused) == (0, 2)
+
+        stat = os.stat(fontFiles[0])
+        os.utime(fontFiles[0], ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        changedCache = FontMetadataCache(databasePath)
+        assert changedCache.getNames(fontFiles[0]) == names[0]
+        assert changedCache.files_read == 1
+
+
+def test_registrationFailureIsRememberedUntilTheFontChanges():
+    with TemporaryDirectory() as temporaryDirectory:
+        fontFile, = copyFonts(temporaryDirectory, 'CraftyGirls-Regular.ttf')
+        databasePath = os.path.join(temporaryDirectory, 'indexes', 'fonts.sqlite')
+
+        cache = FontMetadataCache(databasePath)
+        assert not cache.hasFailedRegistration(fontFile)
+        cache.noteRegistrationFailure(fontFile)
+        cache.save()
+
+        assert FontMetadataCache(databasePath).hasFailedRegistration(fontFile)
+        stat = os.stat(fontFile)
+        os.utime(fontFile, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        assert not FontMetadataCache(databasePath).hasFailedRegistration(fontFile)
+
+
+def test_unusableDatabaseIsIgnored():
+    with TemporaryDirectory() as temporaryDirectory:
+        fontFile, = copyFonts(temporaryDirectory, 'CraftyGirls-Regular.ttf')
+        databasePath = os.path.join(temporaryDirectory, 'fonts.sqlite')
+        Path(databasePath).write_bytes(b'not a database' * 100)
+
+        cache = FontMetadataCache(databasePath)
+        assert cache.getNames(fontFile) == readFontNames(fontFile)
+        cache.save()
+        assert cache.database_path is None
+
+
+if __name__ == '__main__':
+    test_unchangedFontsAreNotOpenedAgain()
+    test_registrationFailureIsRememberedUntilTheFontChanges()
+    test_unusableDatabaseIsIgnored()
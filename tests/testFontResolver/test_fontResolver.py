@@ -0,0 +1,65 @@
+"""Tests that the font names of an album are resolved once per conversion."""
+
+import logging
+import sys
+from pathlib import Path
+
+import pytest
+from reportlab.pdfbase import pdfmetrics
+
+# Bootstrap the project root so this test can also run directly.
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from conversionState import ConversionState
+from fontHandling import FontResolver, getAvailableFont, getFontResolver
+
+
+class CountingFontList(dict):
+    """A font list which counts how often it is searched."""
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.searches = 0
+
+    def __contains__(self, fontName):
+        self.searches += 1
+        return super().__contains__(fontName)
+
+
+def test_familiesAreResolvedOnce(caplog):
+    state = ConversionState()
+    state.missing_font_substitutions['CEWE Head'] = 'Courier'
+    fontList = CountingFontList({'Crafty Girls': 'CraftyGirls.ttf'})
+    with caplog.at_level(logging.WARNING):
+        for _ in range(3):
+            assert getAvailableFont('Crafty Girls', None, fontList, state) == 'Crafty Girls'
+            assert getAvailableFont('Helvetica', None, fontList, state) == 'Helvetica'
+            assert getAvailableFont('CEWE Head', None, fontList, state) == 'Courier'
+            assert getAvailableFont('Bodoni', None, fontList, state) == 'Helvetica'
+    assert fontList.searches == 0 # the resolver's set of names is searched instead
+    resolver = getFontResolver(state)
+    assert resolver.lookups == 12
+    assert resolver.substitutions == {'CEWE Head': 3, 'Bodoni': 3}
+    # As before, each substitution is reported once
+    assert [record.getMessage() for record in caplog.records] == [
+        "Using font family = 'Courier' (wanted CEWE Head)", "Using font family = 'Helvetica' (wanted Bodoni)"]
+    assert resolver.summaryText() == 'Font resolution: 12 lookups of 4 names, 6 substitutions for 2 fonts'
+
+
+def test_styledFacesAreResolvedOnce(monkeypatch):
+    state = ConversionState()
+    state.missing_font_substitutions['Crafty Girls'] = 'Courier'
+    resolver = FontResolver({}, state)
+    fontsLookedUp = []
+    getFont = pdfmetrics.getFont
+    monkeypatch.setattr(pdfmetrics, 'getFont', lambda fontName: fontsLookedUp.append(fontName) or getFont(fontName))
+    for _ in range(5):
+        assert resolver.getStyledFace('Courier', False, False) == 'Courier'
+        assert resolver.getStyledFace('Crafty Girls', True, True) == 'Courier'
+    assert fontsLookedUp == ['Courier', 'Crafty Girls Bold Italic']
+    assert resolver.substitutions == {'Crafty Girls': 5}
+
+
+if __name__ == '__main__':
+    raise SystemExit(pytest.main([__file__, '-s']))
@@ -0,0 +1,182 @@
+"""Tests for the per-conversion cache of decoded photographs."""
+
+import os
+import sys
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import pytest
+from PIL import Image
+
+# Bootstrap the project root so this test can also run directly.
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from imageCache import (DecodedImageCache, estimateImageBytes, getMaxDecodeReduction, getPixelCeilingReduction,
+                        openImage)
+
+
+def writeJpeg(path, size, orientation=None):
+    image = Image.new('RGB', size, (200, 20, 20))
+    if orientation is None:
+        image.save(path, 'JPEG')
+    else:
+        exif = Image.Exif()
+        exif[274] = orientation
+        image.save(path, 'JPEG', exif=exif)
+
+
+def test_repeatedPhotographIsDecodedOnce():
+    """A second request for an unchanged file is served from the cache."""
+    with TemporaryDirectory() as temporaryDirectory:
+        photo = os.path.join(temporaryDirectory, 'photo.jpg')
+        writeJpeg(photo, (40, 20), orientation=6)
+        cache = DecodedImageCache()
+
+        first, _reduction, orientation = cache.getImage(photo)
+        second, _reduction, _orientation = cache.getImage(photo)
+
+        assert first is second
+        # The image is cached as it is stored; the caller applies orientation 6.
+        assert first.size == (40, 20)
+        assert orientation == 6
+        assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_modifiedPhotographIsDecodedAgain():
+    """The modification time is part of the key, so edits are not hidden."""
+    with TemporaryDirectory() as temporaryDirectory:
+        photo = os.path.join(temporaryDirectory, 'photo.jpg')
+        writeJpeg(photo, (40, 20))
+        cache = DecodedImageCache()
+        cache.getImage(photo)
+
+        writeJpeg(photo, (30, 30))
+        stat = os.stat(photo)
+        os.utime(photo, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+        assert cache.getImage(photo)[0].size == (30, 30)
+        assert (cache.hits, cache.misses) == (0, 2)
+
+
+def test_leastRecentlyUsedPhotographIsEvicted():
+    """The memory limit evicts the photograph which was used longest ago."""
+    with TemporaryDirectory() as temporaryDirectory:
+        photos = [os.path.join(temporaryDirectory, f'photo{index}.jpg') for index in range(3)]
+        for photo in photos:
+            writeJpeg(photo, (10, 10))
+        cache = DecodedImageCache(maxBytes=2 * estimateImageBytes(Image.new('RGB', (10, 10))))
+
+        cache.getImage(photos[0])
+        cache.getImage(photos[1])
+        cache.getImage(photos[0])
+        cache.getImage(photos[2])
+
+        assert cache.evictions == 1
+        cache.getImage(photos[0])
+        assert cache.hits == 2
+        cache.getImage(photos[1])
+        assert cache.misses == 4
+
+
+def test_disabledCacheStillReturnsImages():
+    """A zero limit disables caching without changing the decoded result."""
+    with TemporaryDirectory() as temporaryDirectory:
+        photo = os.path.join(temporaryDirectory, 'photo.jpg')
+        writeJpeg(photo, (12, 8))
+        cache = DecodedImageCache(maxBytes=0)
+
+        assert cache.getImage(photo)[0].size == (12, 8)
+        assert cache.getImage(photo)[0].size == (12, 8)
+        assert (cache.hits, cache.misses, cache.current_bytes) == (0, 2, 0)
+
+
+def test_maxDecodeReductionKeepsTwiceTheFinalSize():
+    assert getMaxDecodeReduction(1.0) == 1
+    assert getMaxDecodeReduction(0.3) == 1
+    assert getMaxDecodeReduction(0.2) == 2
+    assert getMaxDecodeReduction(0.05) == 10
+    assert getMaxDecodeReduction(0) == 1
+
+
+def test_jpegIsReducedWhileDecoding():
+    """JPEG reductions are restricted to the scales libjpeg decodes directly."""
+    with TemporaryDirectory() as temporaryDirectory:
+        photo = os.path.join(temporaryDirectory, 'photo.jpg')
+        writeJpeg(photo, (800, 400), orientation=6)
+        cache = DecodedImageCache()
+
+        image, scale, _orientation = cache.getImage(photo, maxReduction=5)
+
+        assert scale == (4, 4)
+        assert image.size == (200, 100)
+        # A different reduction is a different cache entry.
+        assert cache.getImage(photo)[0].size == (800, 400)
+        assert cache.misses == 2
+
+
+def test_otherFormatsAreReducedAfterDecoding():
+    with TemporaryDirectory() as temporaryDirectory:
+        photo = os.path.join(temporaryDirectory, 'photo.png')
+        Image.new('RGB', (90, 60), (20, 200, 20)).save(photo)
+        cache = DecodedImageCache()
+
+        image, scale, _orientation = cache.getImage(photo, maxReduction=3)
+
+        assert scale == (3, 3)
+        assert image.size == (30, 20)
+        assert image.getpixel((5, 5)) == (20, 200, 20)
+
+
+def test_pixelCeilingBoundsTheDecodedImage():
+    """A pixel ceiling reduces further than the requested resolution needs."""
+    assert getPixelCeilingReduction((100, 100), 0) == 1
+    assert getPixelCeilingReduction((100, 100), 10000) == 1
+    assert getPixelCeilingReduction((100, 100), 2500) == 2
+    assert getPixelCeilingReduction((101, 100), 2500) == 3
+    with TemporaryDirectory() as temporaryDirectory:
+        jpegPhoto = os.path.join(temporaryDirectory, 'photo.jpg')
+        writeJpeg(jpegPhoto, (1600, 800))
+        pngPhoto = os.path.join(temporaryDirectory, 'photo.png')
+        Image.new('RGB', (90, 60), (20, 200, 20)).save(pngPhoto)
+        cache = DecodedImageCache()
+
+        # libjpeg decodes at most 1/8 scale; the rest is a box reduction.
+        image, scale, _orientation = cache.getImage(jpegPhoto, maxPixels=5000)
+        assert image.width * image.height <= 5000
+        assert scale == (16, 16)
+        image, scale, _orientation = cache.getImage(pngPhoto, maxReduction=2, maxPixels=600)
+        assert image.size == (30, 20)
+        assert scale == (3, 3)
+
+
+def test_smallPhotoReportsItsRealScale():
+    """Reduced sizes are rounded up, so a small photo is shrunk by less than asked."""
+    with TemporaryDirectory() as temporaryDirectory:
+        pngPhoto = os.path.join(temporaryDirectory, 'photo.png')
+        Image.new('RGB', (10, 6), (20, 200, 20)).save(pngPhoto)
+        jpegPhoto = os.path.join(temporaryDirectory, 'photo.jpg')
+        writeJpeg(jpegPhoto, (10, 6))
+        cache = DecodedImageCache()
+
+        for photo in (pngPhoto, jpegPhoto):
+            image, scale, _orientation = cache.getImage(photo, maxReduction=4)
+            assert image.size == (3, 2)
+            assert scale == (10 / 3, 3)
+
+
+def test_pixelCeilingExemptsOnlyJpegFromTheBombCheck(monkeypatch):
+    """Pillow's limit is left alone, for any other code running at the same time."""
+    monkeypatch.setattr(Image, 'MAX_IMAGE_PIXELS', 100)
+    with TemporaryDirectory() as temporaryDirectory:
+        jpegPhoto = os.path.join(temporaryDirectory, 'photo.jpg')
+        writeJpeg(jpegPhoto, (30, 20))
+        pngPhoto = os.path.join(temporaryDirectory, 'photo.png')
+        Image.new('RGB', (30, 20)).save(pngPhoto)
+
+        with openImage(jpegPhoto, maxPixels=50) as image:
+            assert image.format == 'JPEG' and image.size == (30, 20)
+        assert Image.MAX_IMAGE_PIXELS == 100
+        for photo, maxPixels in ((jpegPhoto, 0), (pngPhoto, 50)):
+            with pytest.raises(Image.DecompressionBombError):
+                openImage(photo, maxPixels)
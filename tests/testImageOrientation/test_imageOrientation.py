@@ -0,0 +1,96 @@
+"""Tests that cropping before the EXIF transpose gives identical pixels.
+
+Run this file directly to compare the time and pixel memory of cropping a
+large portrait photo after and before its orientation is applied.
+"""
+
+import random
+import sys
+import time
+from pathlib import Path
+
+from PIL import Image, ImageChops
+
+# Bootstrap the project root so this test can also run directly.
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from imageCache import estimateImageBytes
+from imageUtils import OrientationTransposes, applyOrientation, cropOriented, getUprightSize
+
+
+def makeStoredImage(size):
+    # Every pixel differs from its neighbours, so any misplaced pixel shows.
+    storedImage = Image.effect_noise(size, 64).convert('RGB')
+    return Image.merge('RGB', (storedImage.getchannel(0),
+                               Image.linear_gradient('L').resize(size),
+                               Image.radial_gradient('L').resize(size)))
+
+
+def assertSameImage(expected, actual):
+    assert expected.size == actual.size
+    assert ImageChops.difference(expected, actual).getbbox() is None
+
+
+def test_cropBeforeTransposeIsIdentical():
+    """Every orientation gives the same crop as transposing the whole image."""
+    storedImage = makeStoredImage((37, 23))
+    randomBoxes = random.Random(1)
+    for orientation in range(1, 9):
+        uprightImage = applyOrientation(storedImage, orientation)
+        width, height = uprightImage.size
+        boxes = [(0, 0, width, height), (3, 5, 4, 6)]
+        for _index in range(50):
+            left, right = sorted(randomBoxes.sample(range(width + 1), 2))
+            top, bottom = sorted(randomBoxes.sample(range(height + 1), 2))
+            boxes.append((left, top, right, bottom))
+        for box in boxes:
+            assertSameImage(uprightImage.crop(box), cropOriented(storedImage, box, orientation))
+
+
+def test_cropBeyondTheImageIsIdentical():
+    """Crop boxes which extend past the photo are padded in the same way."""
+    storedImage = makeStoredImage((20, 12))
+    for orientation in range(1, 9):
+        uprightImage = applyOrientation(storedImage, orientation)
+        box = (-3, -2, uprightImage.width + 4, uprightImage.height + 1)
+        assertSameImage(uprightImage.crop(box), cropOriented(storedImage, box, orientation))
+
+
+def test_unknownOrientationIsIgnored():
+    storedImage = makeStoredImage((10, 6))
+    assert 0 not in OrientationTransposes
+    assertSameImage(storedImage.crop((1, 1, 5, 4)), cropOriented(storedImage, (1, 1, 5, 4), 0))
+
+
+def test_uprightSizeMatchesTheTransposedImage():
+    storedImage = makeStoredImage((10, 6))
+    for orientation in range(1, 9):
+        assert getUprightSize(storedImage.size, orientation) == applyOrientation(storedImage, orientation).size
+
+
+def benchmarkCropBeforeTranspose(repeats=10):
+    """Print time and transposed pixel bytes of both approaches."""
+    # A 24 megapixel phone photo stored landscape, shown upright as a portrait
+    # with a 20% crop placed on the page.
+    storedImage = makeStoredImage((6000, 4000))
+    orientation = 6
+    box = (1200, 2500, 2400, 3700)
+    for description, crop in (
+            ('transpose, then crop', lambda: applyOrientation(storedImage, orientation).crop(box)),
+            ('crop, then transpose', lambda: cropOriented(storedImage, box, orientation))):
+        started = time.perf_counter()
+        for _index in range(repeats):
+            result = crop()
+        elapsed = (time.perf_counter() - started) / repeats
+        transposedBytes = estimateImageBytes(storedImage if description.startswith('transpose') else result)
+        print(f'{description}: {1000 * elapsed:.1f} ms, '
+              f'{transposedBytes / (1024 * 1024):.1f} MB of pixels transposed')
+
+
+if __name__ == '__main__':
+    test_cropBeforeTransposeIsIdentical()
+    test_cropBeyondTheImageIsIdentical()
+    test_unknownOrientationIsIgnored()
+    test_uprightSizeMatchesTheTransposedImage()
+    benchmarkCropBeforeTranspose()
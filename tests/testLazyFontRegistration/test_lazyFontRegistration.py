@@ -0,0 +1,99 @@
+"""Tests that only the fonts an album refers to are registered before rendering."""
+
+import configparser
+import os
+import sys
+from io import BytesIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+from lxml import etree
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfgen import canvas
+
+# Bootstrap the project root so this test can also run directly.
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from albumIndex import AlbumIndex
+from conversionState import ConversionState
+from fontHandling import findAndRegisterFonts, getAlbumFontNames, getAvailableFont
+
+ALBUM_XML = b'''<fotobook>
+  <pagenumbering fontfamily="Stafford" fontsize="12"/>
+  <page><area><text>&lt;html&gt;&lt;body style=" font-family:'Crafty Girls'; font-size:12pt;"&gt;
+    &lt;span style=" font-family:'Bodoni';"&gt;text&lt;/span&gt;&lt;/body&gt;&lt;/html&gt;</text></area></page>
+</fotobook>'''
+
+
+def makeConfiguration(indexSettings=None, **settings):
+    configuration = configparser.ConfigParser()
+    configuration['DEFAULT'] = settings
+    if indexSettings is not None:
+        configuration['INDEX'] = indexSettings
+    return configuration['DEFAULT']
+
+
+def test_albumFontNamesIncludeSubstitutes():
+    configSection = makeConfiguration({'indexFont': 'Courier'},
+                                      missingFontSubstitutions='\nCrafty Girls: Poppins')
+    fontNames = getAlbumFontNames(etree.fromstring(ALBUM_XML), configSection)
+    assert {'Stafford', 'Crafty Girls', 'Bodoni', 'Poppins', 'EB Garamond', 'Courier'} <= fontNames
+    assert 'Dancing Script' not in fontNames
+
+
+def findFonts(temporaryDirectory, fotobook, state, configSection=None):
+    if configSection is None:
+        configSection = makeConfiguration()
+    with patch.dict(os.environ, {'IGNORELOCALFONTS': '1'}), \
+            patch('fontHandling.findFileInDirs', side_effect=ValueError):
+        return findAndRegisterFonts(configSection, temporaryDirectory, temporaryDirectory,
+                                    str(PROJECT_ROOT / 'tests'), state, fotobook)
+
+
+def test_otherFontsAreRegisteredOnFirstUse():
+    with TemporaryDirectory() as temporaryDirectory, \
+            patch('fontHandling.pdfmetrics.registerFont') as registerFont, \
+            patch('fontHandling.pdfmetrics.registerFontFamily'):
+        allFonts = findFonts(temporaryDirectory, None, ConversionState())
+        assert registerFont.call_count == len(allFonts)
+        registerFont.reset_mock()
+
+        state = ConversionState()
+        availableFonts = findFonts(temporaryDirectory, etree.fromstring(ALBUM_XML), state)
+        assert availableFonts == allFonts
+        registered = {call.args[0].fontName for call in registerFont.call_args_list}
+        assert {'Stafford', 'Stafford Bold Italic', 'Crafty Girls', 'EB Garamond Bold'} <= registered
+        assert not any(fontName.startswith('Poppins') for fontName in registered)
+        assert len(registered) + len(state.deferred_fonts.pending) == len(allFonts)
+
+        pdf = canvas.Canvas(BytesIO())
+        assert getAvailableFont('Poppins', pdf, availableFonts, state) == 'Poppins'
+        registered = {call.args[0].fontName for call in registerFont.call_args_list}
+        assert {'Poppins', 'Poppins Bold', 'Poppins Italic', 'Poppins Bold Italic'} <= registered
+        # The lighter and heavier weights are families of their own
+        assert 'Poppins Light' in state.deferred_fonts.pending
+        assert getAvailableFont('Pecita', pdf, availableFonts, state) == 'Dancing Script'
+        assert 'Dancing Script' in {call.args[0].fontName for call in registerFont.call_args_list}
+
+
+def test_indexFontIsRegisteredBeforeTheIndexIsDrawn():
+    configSection = makeConfiguration({'indexing': 'True', 'indexFont': 'Poppins'})
+    with TemporaryDirectory() as temporaryDirectory, \
+            patch('fontHandling.pdfmetrics.registerFont', wraps=pdfmetrics.registerFont) as registerFont:
+        state = ConversionState()
+        findFonts(temporaryDirectory, etree.fromstring(ALBUM_XML), state, configSection)
+        assert 'Poppins' in {call.args[0].fontName for call in registerFont.call_args_list}
+        assert 'Poppins' not in state.deferred_fonts.pending
+
+    # The index page is drawn in the font itself, without asking for it first
+    albumIndex = AlbumIndex(configSection.parser['INDEX'])
+    albumIndex.AddIndexEntry(3, 'Holiday')
+    albumIndex.GenerateIndexPage(canvas.Canvas(BytesIO()))
+
+
+if __name__ == '__main__':
+    test_albumFontNamesIncludeSubstitutes()
+    test_otherFontsAreRegisteredOnFirstUse()
+    test_indexFontIsRegisteredBeforeTheIndexIsDrawn()
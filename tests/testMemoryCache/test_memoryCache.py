@@ -0,0 +1,55 @@
+"""Tests for the least-recently-used bookkeeping shared by the in-memory caches."""
+
+import sys
+from pathlib import Path
+
+# Bootstrap the project root so this test can also run directly.
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from memoryCache import ByteBoundedCache
+
+
+def test_leastRecentlyUsedEntryIsEvictedFirst():
+    cache = ByteBoundedCache('Test', 10)
+    cache.put('a', 'first', 4)
+    cache.put('b', 'second', 4)
+    assert cache.get('a') == 'first'
+    cache.put('c', 'third', 4)
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == ('first', 'third')
+    assert (cache.hits, cache.misses, cache.evictions, cache.current_bytes) == (3, 1, 1, 8)
+
+
+def test_valueLargerThanTheCacheIsNotKept():
+    cache = ByteBoundedCache('Test', 10)
+    cache.put('a', 'kept', 4)
+    cache.put('b', 'huge', 11)
+    assert cache.get('b') is None and cache.get('a') == 'kept'
+    assert cache.evictions == 0
+
+
+def test_storingAKeyAgainReplacesItsSize():
+    cache = ByteBoundedCache('Test', 10)
+    cache.put('a', 'first', 4)
+    cache.put('b', 'second', 4)
+    cache.put('a', 'again', 5)
+    assert cache.current_bytes == 9 and cache.evictions == 0
+    assert (cache.get('a'), cache.get('b')) == ('again', 'second')
+    cache.put('a', 'huge', 11)
+    assert cache.get('a') is None and cache.current_bytes == 4
+
+
+def test_clearReleasesEverything():
+    cache = ByteBoundedCache('Test', 10 * 1024 * 1024)
+    cache.put('a', 'value', 4)
+    cache.clear()
+    assert cache.get('a') is None and cache.current_bytes == 0
+    assert cache.summaryText() == 'Test cache: 0 hits, 1 misses, 0 evictions, limit 10 MB'
+
+
+if __name__ == '__main__':
+    test_leastRecentlyUsedEntryIsEvictedFirst()
+    test_valueLargerThanTheCacheIsNotKept()
+    test_storingAKeyAgainReplacesItsSize()
+    test_clearReleasesEverything()
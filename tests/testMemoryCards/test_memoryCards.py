@@ -55,7 +55,9 @@ def tryToBuildBook(inFile, outFile, latestResultFile, keepDoublePages):
         # compare our result with the latest one
         print(f"Compare {outFile} with {latestResultFile}")
         files = [outFile, latestResultFile]
-        compare = ComparePDF(files, ShowDiffsStyle.Nothing)
+        # JPEG photos are now decoded by libjpeg at a reduced DCT scale, which moves single
+        # pixels by up to about 30 from the previous result; compare averages over small squares
+        compare = ComparePDF(files, ShowDiffsStyle.Nothing, tolerance=16)
         result = compare.compare()
         assert result, "Pixel comparison failed"
     else:
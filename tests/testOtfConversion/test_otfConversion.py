@@ -0,0 +1,148 @@
+"""Tests the otf->ttf conversion of fonts, its content naming and its failure records."""
+
+import os
+import sys
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+import pytest
+
+from fontTools.fontBuilder import FontBuilder
+from fontTools.pens.t2CharStringPen import T2CharStringPen
+from fontTools.ttLib import TTFont
+
+# Bootstrap the project root so this test can also run directly.
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from otf import getTtfsFromOtfs
+
+
+def writeOtfFont(otfFile, familyName):
+    pen = T2CharStringPen(500, None)
+    pen.moveTo((50, 0))
+    pen.curveTo((50, 400), (450, 400), (450, 0))
+    pen.closePath()
+    builder = FontBuilder(1000, isTTF=False)
+    builder.setupGlyphOrder(['.notdef', 'A'])
+    builder.setupCharacterMap({ord('A'): 'A'})
+    builder.setupCFF(familyName, {'FullName': familyName}, {'.notdef': T2CharStringPen(500, None).getCharString(),
+                                                           'A': pen.getCharString()}, {})
+    builder.setupHorizontalMetrics({'.notdef': (500, 0), 'A': (500, 50)})
+    builder.setupHorizontalHeader(ascent=800, descent=-200)
+    builder.setupNameTable({'familyName': familyName, 'styleName': 'Regular'})
+    builder.setupOS2()
+    builder.setupPost()
+    builder.save(otfFile)
+
+
+def test_convertedFontsAreNamedByContent():
+    with TemporaryDirectory() as temporaryDirectory:
+        otfFiles = [os.path.join(temporaryDirectory, f'{name}.otf') for name in ('Curly', 'Loopy')]
+        for otfFile in otfFiles:
+            writeOtfFont(otfFile, Path(otfFile).stem)
+        ttfDir = os.path.join(temporaryDirectory, 'fonts')
+
+        ttfFiles = getTtfsFromOtfs(otfFiles, ttfDir, jobs=2)
+        assert [Path(ttfFile).name.split('-')[0] for ttfFile in ttfFiles] == ['Curly', 'Loopy']
+        for ttfFile in ttfFiles:
+            font = TTFont(ttfFile)
+            assert 'glyf' in font and 'CFF ' not in font
+        assert sorted(os.listdir(ttfDir)) == sorted(Path(ttfFile).name for ttfFile in ttfFiles)
+
+        conversionTimes = [os.stat(ttfFile).st_mtime_ns for ttfFile in ttfFiles]
+        assert getTtfsFromOtfs(otfFiles, ttfDir) == ttfFiles
+        assert [os.stat(ttfFile).st_mtime_ns for ttfFile in ttfFiles] == conversionTimes
+
+        # An updated otf file is converted again, under a new name
+        writeOtfFont(otfFiles[0], 'Curlier')
+        updatedTtfFiles = getTtfsFromOtfs(otfFiles, ttfDir)
+        assert updatedTtfFiles[0] != ttfFiles[0] and updatedTtfFiles[1] == ttfFiles[1]
+        assert TTFont(updatedTtfFiles[0])['name'].getDebugName(1) == 'Curlier'
+
+
+def test_failedConversionsAreNotRetried():
+    with TemporaryDirectory() as temporaryDirectory:
+        brokenOtf = os.path.join(temporaryDirectory, 'Broken.otf')
+        Path(brokenOtf).write_bytes(b'not a font')
+        slowOtf = os.path.join(temporaryDirectory, 'Slow.otf')
+        writeOtfFont(slowOtf, 'Slow')
+        ttfDir = os.path.join(temporaryDirectory, 'fonts')
+
+        # No time at all for the conversions stands in for a font which hangs
+        assert not getTtfsFromOtfs([brokenOtf, slowOtf], ttfDir, timeout=0)
+        failures = sorted(Path(ttfDir).glob('*.failed'))
+        assert [failure.name.split('-')[0] for failure in failures] == ['Broken', 'Slow']
+        assert 'did not finish' in failures[1].read_text(encoding='utf-8')
+
+        # The recorded failures stand, even with plenty of time
+        assert not getTtfsFromOtfs([brokenOtf, slowOtf], ttfDir)
+        assert sorted(Path(ttfDir).iterdir()) == failures
+
+        # Until the otf file changes
+        writeOtfFont(slowOtf, 'Slower')
+        assert len(getTtfsFromOtfs([brokenOtf, slowOtf], ttfDir)) == 1
+
+
+def test_brokenFontRecordsItsReason():
+    with TemporaryDirectory() as temporaryDirectory:
+        brokenOtf = os.path.join(temporaryDirectory, 'Broken.otf')
+        Path(brokenOtf).write_bytes(b'not a font')
+        ttfDir = os.path.join(temporaryDirectory, 'fonts')
+        assert not getTtfsFromOtfs([brokenOtf], ttfDir)
+        failure, = Path(ttfDir).glob('Broken-*.failed')
+        assert failure.read_text(encoding='utf-8').startswith('TTLibError')
+
+
+def test_earlierConversionsAreReplaced():
+    with TemporaryDirectory() as temporaryDirectory:
+        otfFile = os.path.join(temporaryDirectory, 'Curly.otf')
+        writeOtfFont(otfFile, 'Curly')
+        appDataDir = os.path.join(temporaryDirectory, 'appdata')
+        os.makedirs(appDataDir)
+        # Earlier versions kept Curly.ttf in the app data folder itself, perhaps
+        # converted from an earlier version of the font
+        earlierTtfFile = os.path.join(appDataDir, 'Curly.ttf')
+        Path(earlierTtfFile).write_bytes(b'earlier conversion')
+        os.utime(earlierTtfFile, ns=(os.stat(otfFile).st_atime_ns, os.stat(otfFile).st_mtime_ns + 10**9))
+
+        ttfFile, = getTtfsFromOtfs([otfFile], os.path.join(appDataDir, 'fonts'), earlierTtfdirPath=appDataDir)
+        assert 'glyf' in TTFont(ttfFile)
+        assert not os.path.exists(earlierTtfFile)
+
+
+def exitWithoutConverting(_otfFile, _ttfFile, _failureFile):
+    os._exit(9) # pylint: disable=protected-access
+
+
+def test_killedConversionIsTriedAgain():
+    with TemporaryDirectory() as temporaryDirectory:
+        otfFile = os.path.join(temporaryDirectory, 'Curly.otf')
+        writeOtfFont(otfFile, 'Curly')
+        ttfDir = os.path.join(temporaryDirectory, 'fonts')
+        with patch('otf.convertOtfFile', exitWithoutConverting):
+            assert not getTtfsFromOtfs([otfFile], ttfDir)
+        assert not list(Path(ttfDir).glob('*.failed'))
+        assert len(getTtfsFromOtfs([otfFile], ttfDir)) == 1
+
+
+def test_interruptedConversionIsTriedAgain():
+    with TemporaryDirectory() as temporaryDirectory:
+        otfFile = os.path.join(temporaryDirectory, 'Curly.otf')
+        writeOtfFont(otfFile, 'Curly')
+        ttfDir = os.path.join(temporaryDirectory, 'fonts')
+        with patch('otf.multiprocessing.connection.wait', side_effect=KeyboardInterrupt), \
+                pytest.raises(KeyboardInterrupt):
+            getTtfsFromOtfs([otfFile], ttfDir)
+        assert not list(Path(ttfDir).glob('*.failed'))
+        assert len(getTtfsFromOtfs([otfFile], ttfDir)) == 1
+
+
+if __name__ == '__main__':
+    test_convertedFontsAreNamedByContent()
+    test_failedConversionsAreNotRetried()
+    test_brokenFontRecordsItsReason()
+    test_earlierConversionsAreReplaced()
+    test_killedConversionIsTriedAgain()
+    test_interruptedConversionIsTriedAgain()
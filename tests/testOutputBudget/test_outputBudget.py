@@ -0,0 +1,116 @@
+"""Tests for choosing photo resolution and quality from a target PDF size."""
+
+import os
+import sys
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from PIL import Image
+
+# Bootstrap the project root so this test can also run directly.
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from corners import CornersInfo
+from imageareas import ImageBudget
+from outputBudget import (BUDGET_RESOLUTIONS, MINIMUM_RESOLUTION, OUTPUT_PROFILES, TRANSPARENT_BYTES_PER_PIXEL,
+                          chooseImageBudget, estimatePreparedBytes, getBudgetLadder, getJpegBytesPerPixel,
+                          parseByteSize, shareImageBudgets)
+from photoPreparation import PhotoPreparation
+
+
+def test_parseByteSize():
+    assert parseByteSize('25MB') == 25 * 1024 * 1024
+    assert parseByteSize('800 kb') == 800 * 1024
+    assert parseByteSize('1.5G') == 1536 * 1024 * 1024
+    assert parseByteSize('12') == 12 * 1024 * 1024
+    for invalid in ('', 'MB', '12 parsecs', '-3MB'):
+        try:
+            parseByteSize(invalid)
+        except ValueError:
+            continue
+        raise AssertionError(f'{invalid!r} was accepted')
+
+
+def test_jpegEstimateGrowsWithQuality():
+    estimates = [getJpegBytesPerPixel(quality) for quality in range(1, 101)]
+    assert estimates == sorted(estimates)
+    assert getJpegBytesPerPixel(80) > getJpegBytesPerPixel(75)
+
+
+def test_ladderStartsFromTheConfiguredSettings():
+    ladder = getBudgetLadder(150, 86)
+    assert ladder[0] == ImageBudget(150, 86)
+    # One step down lowers the quality before the resolution.
+    assert ladder[1:3] == [ImageBudget(150, 85), ImageBudget(120, 86)]
+    assert ladder[-1] == ImageBudget(MINIMUM_RESOLUTION, 45)
+    assert all(budget.resolution <= 150 and budget.jpeg_quality <= 86 for budget in ladder)
+
+
+def test_firstFittingBudgetIsChosen():
+    estimates = [(ImageBudget(150, 86), 900), (ImageBudget(150, 85), 700), (ImageBudget(120, 86), 500)]
+    assert chooseImageBudget(estimates, 800) == (ImageBudget(150, 85), 700)
+    # Nothing fits: use the smallest step tried.
+    assert chooseImageBudget(estimates, 100) == (ImageBudget(120, 86), 500)
+
+
+def test_resolutionsStayAboveTheConfigurationMinimum():
+    assert min(BUDGET_RESOLUTIONS) >= MINIMUM_RESOLUTION
+    for profile in OUTPUT_PROFILES.values():
+        assert profile.image_resolution >= MINIMUM_RESOLUTION
+        assert profile.background_resolution >= MINIMUM_RESOLUTION
+
+
+def test_eachImageGetsItsOwnBudget():
+    ladder = getBudgetLadder(150, 86)
+
+    def estimator(bestBytes):
+        # Each step down the ladder halves the size.
+        return lambda budget: bestBytes / 2 ** ladder.index(budget)
+
+    # The page cannot have both photos at their best, but only the large one steps down.
+    budgets, unusedBytes = shareImageBudgets({'large': estimator(1000), 'small': estimator(100)}, ladder, 1050)
+    assert budgets == {'large': ladder[1], 'small': ladder[0]}
+    assert abs(unusedBytes - (1050 - 500 - 100)) < 1e-9
+
+    # Bytes the first photo leaves unused are offered to the next one.
+    budgets, unusedBytes = shareImageBudgets({'first': estimator(100), 'second': estimator(160)}, ladder, 220)
+    assert budgets == {'first': ladder[1], 'second': ladder[0]}
+    assert abs(unusedBytes - (220 - 50 - 160)) < 1e-9
+
+
+def makePreparation(imagePath, outputSize, cropBox=(0, 0, 400, 300), cornersInfo=CornersInfo()):
+    return PhotoPreparation(
+        image_path=imagePath, crop_box=cropBox, source_box=tuple(float(value) for value in cropBox),
+        output_size=outputSize, max_reduction=1, resampling_filter=Image.Resampling.LANCZOS,
+        jpeg_quality=75, mask_file_name=None, clipart_paths=(), corners_info=cornersInfo,
+        crop_width_mcfunit=100.0)
+
+
+def test_estimateUsesTheSourceFile():
+    with TemporaryDirectory() as temporaryDirectory:
+        smoothPhoto = os.path.join(temporaryDirectory, 'smooth.jpg')
+        Image.new('RGB', (400, 300), (120, 140, 160)).save(smoothPhoto, 'JPEG', quality=90)
+        noisyPhoto = os.path.join(temporaryDirectory, 'noisy.jpg')
+        Image.effect_noise((400, 300), 80).convert('RGB').save(noisyPhoto, 'JPEG', quality=90)
+
+        # A photo shown whole at its own resolution is embedded unchanged.
+        assert estimatePreparedBytes(makePreparation(noisyPhoto, None), {}) == os.path.getsize(noisyPhoto)
+
+        smoothBytes = estimatePreparedBytes(makePreparation(smoothPhoto, (200, 150)), {})
+        noisyBytes = estimatePreparedBytes(makePreparation(noisyPhoto, (200, 150)), {})
+        assert smoothBytes < noisyBytes
+
+        cornersInfo = CornersInfo()._replace(topLeft=CornersInfo().topLeft._replace(length_mcf=10))
+        roundedBytes = estimatePreparedBytes(makePreparation(noisyPhoto, (200, 150), cornersInfo=cornersInfo), {})
+        assert roundedBytes == 200 * 150 * TRANSPARENT_BYTES_PER_PIXEL
+
+
+if __name__ == '__main__':
+    test_parseByteSize()
+    test_jpegEstimateGrowsWithQuality()
+    test_ladderStartsFromTheConfiguredSettings()
+    test_firstFittingBudgetIsChosen()
+    test_resolutionsStayAboveTheConfigurationMinimum()
+    test_eachImageGetsItsOwnBudget()
+    test_estimateUsesTheSourceFile()
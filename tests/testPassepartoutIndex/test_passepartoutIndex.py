@@ -0,0 +1,82 @@
+"""Tests for the passepartout index kept in the app data folder between conversions."""
+
+import os
+import sys
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+# Bootstrap the project root so this test can also run directly.
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from passepartout import Passepartout
+from passepartoutIndex import PassepartoutIndex
+
+
+def writeDecoration(fileName, designElementId, designElementType='passepartout', maskFile='mask.svg'):
+    Path(fileName).parent.mkdir(parents=True, exist_ok=True)
+    Path(fileName).write_text(
+        '<?xml version="1.0" encoding="UTF-8"?><decorations><decoration type="fading">'
+        f'<fading file="{maskFile}" designElementId="{designElementId}" designElementType="{designElementType}">'
+        '<fotoarea x="0.1" y="0.2" width="0.8" height="0.6"/></fading></decoration></decorations>',
+        encoding='utf-8')
+
+
+def test_indexMatchesParsingEveryFile():
+    folders = [str(PROJECT_ROOT / 'tests' / 'Resources' / 'photofun' / 'decorations'),
+               str(PROJECT_ROOT / 'tests' / 'hps')]
+    xmlFiles = Passepartout.buildElementIdIndex(folders)
+    index = PassepartoutIndex()
+    for designElementId, xmlFile in xmlFiles.items():
+        xmlInfo = index.getInfo(designElementId, folders)
+        assert xmlInfo == Passepartout.extractInfoFromXml(xmlInfo.srcXmlFile, designElementId)
+        assert os.path.samefile(xmlInfo.srcXmlFile, xmlFile)
+    assert index.getInfo(-1, folders) is None
+
+
+def test_laterConversionOnlyRevisitsChangedFiles():
+    with TemporaryDirectory() as temporaryDirectory:
+        folder = os.path.join(temporaryDirectory, 'decorations')
+        databasePath = os.path.join(temporaryDirectory, 'indexes', 'passepartouts.sqlite')
+        writeDecoration(os.path.join(folder, 'a', 'a.xml'), 1)
+        writeDecoration(os.path.join(folder, 'b', 'b.xml'), 2)
+        writeDecoration(os.path.join(folder, 'b', 'corner.xml'), 3, designElementType='corner')
+
+        firstIndex = PassepartoutIndex(databasePath)
+        assert firstIndex.getInfo(1, [folder]).fotoarea_width == 0.8
+        assert firstIndex.getInfo(3, [folder]) is None
+        assert firstIndex.files_parsed == 3
+        firstIndex.close()
+
+        unchangedIndex = PassepartoutIndex(databasePath)
+        assert unchangedIndex.getInfo(2, [folder]) == firstIndex.getInfo(2, [folder])
+        assert (unchangedIndex.directories_listed, unchangedIndex.files_parsed) == (0, 0)
+        unchangedIndex.close()
+
+        writeDecoration(os.path.join(folder, 'a', 'a.xml'), 1, maskFile='changed.svg')
+        stat = os.stat(os.path.join(folder, 'a', 'a.xml'))
+        os.utime(os.path.join(folder, 'a', 'a.xml'), ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        os.remove(os.path.join(folder, 'b', 'b.xml'))
+        changedIndex = PassepartoutIndex(databasePath)
+        assert changedIndex.getInfo(1, [folder]).maskFile == 'changed.svg'
+        assert changedIndex.getInfo(2, [folder]) is None
+        assert changedIndex.files_parsed == 1
+        changedIndex.close()
+
+
+def test_unusableDatabaseFallsBackToMemory():
+    with TemporaryDirectory() as temporaryDirectory:
+        folder = os.path.join(temporaryDirectory, 'decorations')
+        writeDecoration(os.path.join(folder, 'a.xml'), 1)
+        databasePath = os.path.join(temporaryDirectory, 'passepartouts.sqlite')
+        Path(databasePath).write_bytes(b'not a database' * 100)
+
+        index = PassepartoutIndex(databasePath)
+        assert index.getInfo(1, [folder]).designElementId == 1
+        assert index.database_path is None
+
+
+if __name__ == '__main__':
+    test_indexMatchesParsingEveryFile()
+    test_laterConversionOnlyRevisitsChangedFiles()
+    test_unusableDatabaseFallsBackToMemory()
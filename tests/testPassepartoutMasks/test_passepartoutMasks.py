@@ -0,0 +1,108 @@
+"""Tests that passepartout masks are rasterised once per mask file and size."""
+
+import os
+import sys
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from PIL import Image
+
+# Bootstrap the project root so this test can also run directly.
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from corners import CornersInfo
+from passepartoutMasks import PassepartoutMaskCache
+from persistentCache import PersistentBlobCache
+from photoPreparation import PhotoPreparation, preparePhoto
+
+MASK_SVG = (b'<svg xmlns="http://www.w3.org/2000/svg" width="40" height="30">'
+            b'<ellipse cx="20" cy="15" rx="18" ry="13" fill="#000000"/></svg>')
+
+
+class CountingRasteriser:
+    def __init__(self, size):
+        self.size = size
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return Image.linear_gradient('L').resize(self.size)
+
+
+def test_maskIsRasterisedOncePerSize():
+    with TemporaryDirectory() as temporaryDirectory:
+        maskPath = os.path.join(temporaryDirectory, 'mask.svg')
+        Path(maskPath).write_bytes(MASK_SVG)
+        cache = PassepartoutMaskCache()
+        rasterisers = {size: CountingRasteriser(size) for size in ((40, 30), (80, 60))}
+        for _ in range(4):
+            for size, rasterise in rasterisers.items():
+                assert cache.getAlphaChannel(maskPath, size, rasterise).size == size
+        assert [rasterise.calls for rasterise in rasterisers.values()] == [1, 1]
+        assert (cache.hits, cache.misses) == (6, 2)
+
+        os.utime(maskPath, ns=(1, 1))
+        cache.getAlphaChannel(maskPath, (40, 30), rasterisers[(40, 30)])
+        assert rasterisers[(40, 30)].calls == 2
+
+
+def test_persistentTierServesALaterConversion():
+    with TemporaryDirectory() as temporaryDirectory:
+        maskPath = os.path.join(temporaryDirectory, 'mask.svg')
+        Path(maskPath).write_bytes(MASK_SVG)
+        rasterise = CountingRasteriser((40, 30))
+        channels = []
+        for _ in range(2):
+            cache = PassepartoutMaskCache(persistentCache=PersistentBlobCache(
+                os.path.join(temporaryDirectory, 'cache'), 1024 * 1024))
+            channels.append(cache.getAlphaChannel(maskPath, (40, 30), rasterise))
+        assert rasterise.calls == 1
+        assert channels[1].mode == 'L' and channels[1].tobytes() == channels[0].tobytes()
+
+
+def test_framedPhotosShareTheirMask():
+    with TemporaryDirectory() as temporaryDirectory:
+        Path(temporaryDirectory, 'frame-mask.svg').write_bytes(MASK_SVG)
+        photo = os.path.join(temporaryDirectory, 'photo.png')
+        Image.new('RGB', (80, 60), (200, 30, 60)).save(photo, 'PNG')
+        preparation = PhotoPreparation(
+            image_path=photo, crop_box=(0, 0, 80, 60), source_box=(0.0, 0.0, 80.0, 60.0),
+            output_size=(40, 30), max_reduction=1, resampling_filter=Image.Resampling.LANCZOS,
+            jpeg_quality=86, mask_file_name=os.path.join(temporaryDirectory, 'frame-mask.svg'),
+            clipart_paths=(), corners_info=CornersInfo(), crop_width_mcfunit=100.0)
+        cache = PassepartoutMaskCache()
+
+        uncachedImage = preparePhoto(preparation)
+        images = [preparePhoto(preparation, passepartoutMasks=cache) for _ in range(3)]
+
+        assert (cache.hits, cache.misses) == (2, 1)
+        for image in images:
+            assert image.mode == 'RGBA'
+            assert image.tobytes() == uncachedImage.tobytes()
+        # The black ellipse of the mask is opaque and its surroundings transparent.
+        assert images[0].getpixel((0, 0))[3] == 0 and images[0].getpixel((20, 15))[3] == 255
+
+
+def test_missingMaskLeavesThePhotoUnmasked():
+    with TemporaryDirectory() as temporaryDirectory:
+        photo = os.path.join(temporaryDirectory, 'photo.png')
+        Image.new('RGB', (80, 60), (200, 30, 60)).save(photo, 'PNG')
+        preparation = PhotoPreparation(
+            image_path=photo, crop_box=(0, 0, 80, 60), source_box=(0.0, 0.0, 80.0, 60.0),
+            output_size=(40, 30), max_reduction=1, resampling_filter=Image.Resampling.LANCZOS,
+            jpeg_quality=86, mask_file_name=os.path.join(temporaryDirectory, 'missing-mask.svg'),
+            clipart_paths=(), corners_info=CornersInfo(), crop_width_mcfunit=100.0)
+        cache = PassepartoutMaskCache()
+
+        image = preparePhoto(preparation, passepartoutMasks=cache)
+
+        assert image.mode == 'RGB' and image.size == (40, 30)
+        assert (cache.hits, cache.misses) == (0, 0)
+
+
+if __name__ == '__main__':
+    test_maskIsRasterisedOncePerSize()
+    test_persistentTierServesALaterConversion()
+    test_framedPhotosShareTheirMask()
+    test_missingMaskLeavesThePhotoUnmasked()
@@ -0,0 +1,113 @@
+"""Tests for handing prepared images to ReportLab in memory."""
+
+import os
+import sys
+from io import BytesIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from PIL import Image
+from reportlab.lib.rl_accel import asciiBase85Encode
+from reportlab.pdfgen import canvas
+
+# Bootstrap the project root so this test can also run directly.
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from pdfImages import (EncodedImage, EncodedJpeg, PreparedImage, encodePreparedImage,
+                       getPdfImageFromEncoded, getUnchangedJpeg)
+
+
+def drawToPdf(*pdfImages):
+    pdfBuffer = BytesIO()
+    pdf = canvas.Canvas(pdfBuffer, pageCompression=0)
+    for pdfImage in pdfImages:
+        pdf.drawImage(pdfImage, 0, 0, width=100, height=50, mask='auto')
+    pdf.showPage()
+    pdf.save()
+    return pdfBuffer.getvalue()
+
+
+def test_opaqueImageIsEmbeddedAsJpeg():
+    pdfData = drawToPdf(PreparedImage(Image.new('RGB', (40, 20), (10, 120, 200)), 86))
+    assert b'/DCTDecode' in pdfData
+    assert b'/SMask' not in pdfData
+
+
+def test_transparentImageKeepsItsSoftMask():
+    image = Image.new('RGBA', (40, 20), (10, 120, 200, 255))
+    image.putpixel((0, 0), (0, 0, 0, 0))
+    pdfData = drawToPdf(PreparedImage(image, 86))
+    assert b'/DCTDecode' not in pdfData
+    assert b'/SMask' in pdfData
+
+
+def test_wholeUprightJpegIsEmbeddedUnchanged():
+    with TemporaryDirectory() as temporaryDirectory:
+        photo = os.path.join(temporaryDirectory, 'photo.jpg')
+        Image.new('RGB', (40, 20), (10, 120, 200)).save(photo, 'JPEG', quality=70)
+        with open(photo, 'rb') as photoFile:
+            jpegBytes = photoFile.read()
+
+        unchangedJpeg = getUnchangedJpeg(photo, (0, 0, 40, 20))
+        pdfData = drawToPdf(unchangedJpeg, getUnchangedJpeg(photo, (0, 0, 40, 20)))
+
+        assert unchangedJpeg.size == (40, 20)
+        # The file is embedded once, byte for byte, in ReportLab's default
+        # ASCII85 encoding.
+        assert pdfData.count(asciiBase85Encode(jpegBytes).encode('latin-1')) == 1
+        # The rest of the ImageReader interface is available too
+        assert unchangedJpeg.getSize() == (40, 20)
+
+
+def test_jpegNeedingPixelChangesIsNotPassedThrough():
+    with TemporaryDirectory() as temporaryDirectory:
+        photo = os.path.join(temporaryDirectory, 'photo.jpg')
+        Image.new('RGB', (40, 20)).save(photo, 'JPEG')
+        rotatedPhoto = os.path.join(temporaryDirectory, 'rotated.jpg')
+        exif = Image.Exif()
+        exif[274] = 6
+        Image.new('RGB', (40, 20)).save(rotatedPhoto, 'JPEG', exif=exif)
+        pngPhoto = os.path.join(temporaryDirectory, 'photo.png')
+        Image.new('RGB', (40, 20)).save(pngPhoto)
+
+        assert getUnchangedJpeg(photo, (0, 0, 40, 19)) is None
+        assert getUnchangedJpeg(rotatedPhoto, (0, 0, 40, 20)) is None
+        assert getUnchangedJpeg(pngPhoto, (0, 0, 40, 20)) is None
+
+
+def test_identicalContentIsEmbeddedOnce():
+    """Placements of equal content share one image XObject."""
+    pngBuffer = BytesIO()
+    Image.new('RGBA', (8, 8), (1, 2, 3, 128)).save(pngBuffer, 'PNG')
+    pdfData = drawToPdf(
+        PreparedImage(Image.new('RGB', (40, 20), (10, 120, 200)), 86),
+        PreparedImage(Image.new('RGB', (40, 20), (10, 120, 200)), 86),
+        PreparedImage(Image.new('RGB', (40, 20), (10, 120, 201)), 86),
+        EncodedImage(pngBuffer.getvalue()),
+        EncodedImage(pngBuffer.getvalue()))
+    # Two distinct photos, one clip art and the clip art's soft mask.
+    assert pdfData.count(b'/Subtype /Image') == 4
+
+
+def test_encodedPreparedImagesRoundTrip():
+    """Cached JPEG data is embedded as it is; cached PNG data is decoded."""
+    opaque = Image.new('RGB', (40, 20), (10, 120, 200))
+    image, pdfImage = getPdfImageFromEncoded(encodePreparedImage(opaque, 86))
+    assert image is None
+    assert isinstance(pdfImage, EncodedJpeg)
+    assert pdfImage.size == (40, 20)
+
+    transparent = Image.new('RGBA', (40, 20), (10, 120, 200, 100))
+    image, pdfImage = getPdfImageFromEncoded(encodePreparedImage(transparent, 86))
+    assert image.tobytes() == transparent.tobytes()
+    assert str(pdfImage) == str(PreparedImage(transparent))
+
+
+if __name__ == '__main__':
+    test_opaqueImageIsEmbeddedAsJpeg()
+    test_transparentImageKeepsItsSoftMask()
+    test_wholeUprightJpegIsEmbeddedUnchanged()
+    test_jpegNeedingPixelChangesIsNotPassedThrough()
+    test_identicalContentIsEmbeddedOnce()
+    test_encodedPreparedImagesRoundTrip()
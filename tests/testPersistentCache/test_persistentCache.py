@@ -0,0 +1,87 @@
+"""Tests for the caches kept in the app data folder between conversions."""
+
+import os
+import sys
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+# Bootstrap the project root so this test can also run directly.
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from persistentCache import FileDigests, PersistentBlobCache
+
+
+def test_storedBytesAreFoundByALaterCache():
+    """A new cache object, as in a later conversion, reads earlier entries."""
+    with TemporaryDirectory() as temporaryDirectory:
+        key = PersistentBlobCache.makeKey('photo', 'digest', (0, 0, 10, 10))
+        PersistentBlobCache(temporaryDirectory, 1024).put(key, b'prepared')
+
+        cache = PersistentBlobCache(temporaryDirectory, 1024)
+        assert cache.get(key) == b'prepared'
+        assert cache.get(PersistentBlobCache.makeKey('photo', 'digest', (0, 0, 10, 11))) is None
+        assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_leastRecentlyUsedEntriesAreEvicted():
+    with TemporaryDirectory() as temporaryDirectory:
+        cache = PersistentBlobCache(temporaryDirectory, 250)
+        cache.put('first', b'1' * 100)
+        cache.put('second', b'2' * 100)
+        # Make 'first' the most recently used entry.
+        os.utime(cache._entryPath('second'), ns=(1, 1)) # pylint: disable=protected-access
+        assert cache.get('first') is not None
+
+        cache.put('third', b'3' * 100)
+
+        assert cache.evictions == 1
+        assert cache.get('second') is None
+        assert cache.get('first') is not None
+        assert cache.get('third') is not None
+
+
+class ListedEntries(list):
+    """A list of directory entries which can stand in for os.scandir()'s iterator."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_exception):
+        return False
+
+
+def test_entriesRemovedByAnotherProcessAreSkipped(monkeypatch):
+    """Another conversion sharing the folder may evict entries while they are listed."""
+    with TemporaryDirectory() as temporaryDirectory:
+        cache = PersistentBlobCache(temporaryDirectory, 250)
+        cache.put('first', b'1' * 100)
+        cache.put('second', b'2' * 100)
+
+        scandir = os.scandir
+        def scandirWhileEvicting(path):
+            if not isinstance(path, str) or Path(path).parent != Path(temporaryDirectory):
+                return scandir(path)
+            # The entries of a cache subfolder vanish after they are listed
+            with scandir(path) as entries:
+                entries = ListedEntries(entries)
+            for entry in entries:
+                os.remove(entry.path)
+            return entries
+        monkeypatch.setattr(os, 'scandir', scandirWhileEvicting)
+
+        cache.put('third', b'3' * 100)
+        monkeypatch.undo()
+        assert cache.writes == 3 and cache.evictions == 0
+
+
+def test_fileDigestFollowsContent():
+    with TemporaryDirectory() as temporaryDirectory:
+        fileName = os.path.join(temporaryDirectory, 'photo.jpg')
+        Path(fileName).write_bytes(b'one')
+        digests = FileDigests()
+        firstDigest = digests.getDigest(fileName)
+        assert digests.getDigest(fileName) == firstDigest
+
+        Path(fileName).write_bytes(b'two!')
+        assert digests.getDigest(fileName) != firstDigest
@@ -0,0 +1,66 @@
+"""Tests for the indexed resource lookup which replaces per-name file probing."""
+
+import os
+import sys
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+# Bootstrap the project root so this test can also run directly.
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from pathutils import ResourceLocator, findFileInDirs
+
+
+def createFiles(directory, names):
+    for name in names:
+        Path(directory, name).write_bytes(b'')
+
+
+def test_precedenceMatchesFindFileInDirs():
+    with TemporaryDirectory() as first, TemporaryDirectory() as second:
+        createFiles(first, ['1001.jpg'])
+        createFiles(second, ['1001.bmp', '1001.jpg', '1002.webp'])
+        locator = ResourceLocator()
+        for names in (['1001.bmp', '1001.webp', '1001.jpg'], ['1001.jpg', '1001.bmp'], '1002.webp'):
+            assert locator.findFile(names, [first, second]) == findFileInDirs(names, [first, second])
+
+
+def test_namesAreMatchedWithoutCase():
+    with TemporaryDirectory() as directory:
+        createFiles(directory, ['Frame.CLP'])
+        locator = ResourceLocator()
+        assert locator.findFile(['frame.clp'], (Path(directory),)) == os.path.join(directory, 'Frame.CLP')
+
+
+def test_eachDirectoryIsListedOnce():
+    with TemporaryDirectory() as first, TemporaryDirectory() as second:
+        createFiles(second, ['a.svg', 'b.svg'])
+        locator = ResourceLocator()
+        with patch('pathutils.os.listdir', wraps=os.listdir) as listdir, \
+                patch('pathutils.os.path.exists', wraps=os.path.exists) as exists:
+            for _ in range(3):
+                locator.findFile(['a.clp', 'a.svg'], [first, second])
+                locator.findFile(['b.clp', 'b.svg'], [first, second])
+        assert listdir.call_count == 2
+        assert exists.call_count == 0
+
+
+def test_missesAreRecorded():
+    with TemporaryDirectory() as directory:
+        locator = ResourceLocator()
+        try:
+            locator.findFile(['1003.bmp', '1003.jpg'], [directory, os.path.join(directory, 'absent')])
+        except ValueError:
+            assert list(locator.misses) == [('1003.bmp', '1003.jpg')]
+            assert '1 names not found' in locator.summaryText()
+            return
+        raise AssertionError('A missing resource was found')
+
+
+if __name__ == '__main__':
+    test_precedenceMatchesFindFileInDirs()
+    test_namesAreMatchedWithoutCase()
+    test_eachDirectoryIsListedOnce()
+    test_missesAreRecorded()
@@ -0,0 +1,53 @@
+"""Tests for the SQLite databases which are rebuilt rather than migrated."""
+
+import os
+import sys
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+# Bootstrap the project root so this test can also run directly.
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from sqliteStore import SqliteStore
+
+
+class NameStore(SqliteStore):
+    DESCRIPTION = 'name store'
+    TABLES = ('CREATE TABLE names (name TEXT PRIMARY KEY)',)
+
+    def add(self, name):
+        self.run(lambda connection: connection.execute('INSERT INTO names VALUES (?)', (name,)))
+
+    def names(self):
+        return [name for (name,) in self.run(lambda connection: connection.execute('SELECT name FROM names'))]
+
+
+class NewerNameStore(NameStore):
+    DATABASE_FORMAT = 2
+
+
+def test_storedDataIsKeptUntilTheFormatChanges():
+    with TemporaryDirectory() as temporaryDirectory:
+        databasePath = os.path.join(temporaryDirectory, 'indexes', 'names.sqlite')
+        with NameStore(databasePath) as store:
+            store.add('kept')
+        with NameStore(databasePath) as store:
+            assert store.names() == ['kept']
+        with NewerNameStore(databasePath) as store:
+            assert store.names() == []
+
+
+def test_unusableDatabaseFallsBackToMemory():
+    with TemporaryDirectory() as temporaryDirectory:
+        databasePath = os.path.join(temporaryDirectory, 'names.sqlite')
+        Path(databasePath).write_bytes(b'not a database' * 100)
+        with NameStore(databasePath) as store:
+            store.add('remembered')
+            assert store.names() == ['remembered']
+            assert store.database_path is None
+
+
+if __name__ == '__main__':
+    test_storedDataIsKeptUntilTheFormatChanges()
+    test_unusableDatabaseFallsBackToMemory()
@@ -0,0 +1,130 @@
+"""Tests for embedding clip art once as a vector form and placing it by reference."""
+
+import importlib.util
+import os
+import sys
+from io import BytesIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import pytest
+from reportlab.graphics.shapes import Drawing, Rect
+from reportlab.pdfgen import canvas
+
+# Bootstrap the project root so this test can also run directly.
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+import vectorClipart
+from vectorClipart import VectorClipartForms, convertSvgToDrawing, isSvgVectorSupported, isVectorClipartAvailable
+
+SIMPLE_SVG = (b'<svg xmlns="http://www.w3.org/2000/svg" width="40" height="20" viewBox="0 0 40 20">'
+              b'<rect x="0" y="0" width="40" height="20" fill="#FF0000"/></svg>')
+FILTERED_SVG = (b'<svg xmlns="http://www.w3.org/2000/svg" width="40" height="20">'
+                b'<defs><filter id="blur"><feGaussianBlur stdDeviation="2"/></filter></defs>'
+                b'<rect width="40" height="20" filter="url(#blur)"/></svg>')
+
+
+def fakeConvert(svgData):
+    if not isSvgVectorSupported(svgData):
+        return None
+    drawing = Drawing(40, 20)
+    drawing.add(Rect(0, 0, 40, 20))
+    return drawing
+
+
+def test_unsupportedFeaturesAreRasterised():
+    assert isSvgVectorSupported(SIMPLE_SVG)
+    assert not isSvgVectorSupported(FILTERED_SVG)
+    assert not isSvgVectorSupported(SIMPLE_SVG.replace(b'<rect ', b'<rect style="mask: url(#m)" '))
+    assert not isSvgVectorSupported(b'not svg')
+
+
+def test_clipartIsEmbeddedOnceAndPlacedByReference():
+    with TemporaryDirectory() as temporaryDirectory:
+        clipartPath = os.path.join(temporaryDirectory, 'corner.svg')
+        Path(clipartPath).write_bytes(SIMPLE_SVG)
+        loads = []
+
+        def loadSvgData():
+            loads.append(clipartPath)
+            return SIMPLE_SVG
+
+        forms = VectorClipartForms()
+        pdfBuffer = BytesIO()
+        pdf = canvas.Canvas(pdfBuffer, pageCompression=0)
+        for page in range(3):
+            for flipX in (False, True):
+                form = forms.getForm(pdf, clipartPath, [], loadSvgData, fakeConvert)
+                forms.drawForm(pdf, form, 400, 100, flipX, False)
+            pdf.showPage()
+        pdf.save()
+        pdfData = pdfBuffer.getvalue()
+
+        assert len(loads) == 1
+        assert (forms.forms_created, forms.placements) == (1, 6)
+        assert pdfData.count(b'/Subtype /Form') == 1
+        assert pdfData.count(b' Do') == 6
+        # Mirrored, and scaled from 40 x 20 to 400 x 100 points about the origin.
+        assert b'-10 0 0 5 200 -50 cm' in pdfData
+
+
+def test_unconvertibleClipartIsRememberedAsRaster():
+    with TemporaryDirectory() as temporaryDirectory:
+        clipartPath = os.path.join(temporaryDirectory, 'blurred.svg')
+        Path(clipartPath).write_bytes(FILTERED_SVG)
+        loads = []
+        forms = VectorClipartForms()
+        pdf = canvas.Canvas(BytesIO())
+        for _ in range(2):
+            assert forms.getForm(pdf, clipartPath, [], lambda: loads.append(1) or FILTERED_SVG, fakeConvert) is None
+        assert len(loads) == 1
+
+
+def test_svglibConversion():
+    pytest.importorskip('svglib')
+    assert isVectorClipartAvailable()
+    drawing = convertSvgToDrawing(SIMPLE_SVG)
+    assert (drawing.width, drawing.height) == (40, 20)
+    assert convertSvgToDrawing(FILTERED_SVG) is None
+
+    with TemporaryDirectory() as temporaryDirectory:
+        clipartPath = os.path.join(temporaryDirectory, 'corner.svg')
+        Path(clipartPath).write_bytes(SIMPLE_SVG)
+        forms = VectorClipartForms()
+        pdfBuffer = BytesIO()
+        pdf = canvas.Canvas(pdfBuffer, pageCompression=0)
+        form = forms.getForm(pdf, clipartPath, [], lambda: SIMPLE_SVG)
+        forms.drawForm(pdf, form, 400, 100, False, False)
+        pdf.save()
+        pdfData = pdfBuffer.getvalue()
+
+        assert form[1:] == (40, 20)
+        assert pdfData.count(b'/Subtype /Form') == 1
+        assert b'1 0 0 rg' in pdfData
+        assert b'/Subtype /Image' not in pdfData
+
+
+def test_withoutSvglibClipartIsRasterised(monkeypatch):
+    if importlib.util.find_spec('svglib') is None:
+        assert not isVectorClipartAvailable()
+    # As if svglib could not be imported.
+    monkeypatch.setattr(vectorClipart, 'svg2rlg', None)
+    assert not isVectorClipartAvailable()
+    assert convertSvgToDrawing(SIMPLE_SVG) is None
+    with TemporaryDirectory() as temporaryDirectory:
+        clipartPath = os.path.join(temporaryDirectory, 'corner.svg')
+        Path(clipartPath).write_bytes(SIMPLE_SVG)
+        forms = VectorClipartForms()
+        assert forms.getForm(canvas.Canvas(BytesIO()), clipartPath, [], lambda: SIMPLE_SVG) is None
+        assert forms.forms_created == 0
+
+
+if __name__ == '__main__':
+    test_unsupportedFeaturesAreRasterised()
+    test_clipartIsEmbeddedOnceAndPlacedByReference()
+    test_unconvertibleClipartIsRememberedAsRaster()
+    if importlib.util.find_spec('svglib') is not None:
+        test_svglibConversion()
+    with pytest.MonkeyPatch.context() as m:
+        test_withoutSvglibClipartIsRasterised(m)
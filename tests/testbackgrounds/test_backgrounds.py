@@ -12,6 +12,7 @@ sys.path.insert(0, str(PROJECT_ROOT))
 from testutils import configureTestImportPaths
 configureTestImportPaths(__file__)
 from datetime import datetime
+import pymupdf
 from pikepdf import Pdf, PdfImage
 
 from compare_pdf import ComparePDF, ShowDiffsStyle # type: ignore
@@ -20,6 +21,16 @@ from cewe2pdf import convertMcf # type: ignore
 from testutils import getLatestResultFile, getOutFileBasename
 
 
+def getPageCoveringImageKey(pdfFile, pageNumber):
+    """Return the resource name of the image which is drawn over the whole page"""
+    with pymupdf.open(pdfFile) as document:
+        page = document[pageNumber]
+        for image in page.get_images(full=True):
+            if page.get_image_bbox(image) == page.rect:
+                return '/' + image[7]
+    return None
+
+
 def tryToBuildBook(inFile, outFile, latestResultFile, keepDoublePages, expectedPages, expectedEqualBackgroundPageLists):
     if os.path.exists(outFile) == True:
         os.remove(outFile)
@@ -40,7 +51,9 @@ def tryToBuildBook(inFile, outFile, latestResultFile, keepDoublePages, expectedP
         if p == 0:
             # the test album has just one actual photo image, on the front cover
             assert imagecount == 2, f"Expected 2 images on front cover (background + picture), found {imagecount}"
-            coverBackgroundImageKey = imagekeys[1] # should be the same on both cover pages
+            # The image names are digests of their data, so their order says nothing. The
+            # background is the image placed over the whole page, the same on both cover pages
+            coverBackgroundImageKey = getPageCoveringImageKey(outFile, p)
         elif p == 1 and keepDoublePages:
             assert imagecount == 1, f"Expected 1 image on page 2 (both backgrounds are black), found {imagecount}"
         elif p == numPages - 1 and keepDoublePages:
@@ -83,7 +96,9 @@ def tryToBuildBook(inFile, outFile, latestResultFile, keepDoublePages, expectedP
         # compare our result with the latest one
         print(f"Compare {outFile} with {latestResultFile}")
         files = [outFile, latestResultFile]
-        compare = ComparePDF(files, ShowDiffsStyle.Nothing)
+        # JPEG photos are now decoded by libjpeg at a reduced DCT scale, which moves single
+        # pixels by up to about 30 from the previous result; compare averages over small squares
+        compare = ComparePDF(files, ShowDiffsStyle.Nothing, tolerance=16)
         result = compare.compare()
         assert result, "Pixel comparison failed"
     else:
@@ -6,7 +6,7 @@ from reportlab.lib import colors
 from reportlab.pdfbase import pdfmetrics
 
 from borders import processDecorationBorders
-from fontHandling import getMissingFontSubstitute
+from fontHandling import getFontResolver, getStyledFaceName
 from conversionState import ConversionState
 from renderContext import RenderContext
 
@@ -83,6 +83,7 @@ def parse_html_text(html):
 def processParsedText(parsed_text, pdf, originalRadius, start_angle_deg, clockwise, maxfontsize,
                       state: ConversionState, circleCenterY=0, ellipseRadiusY=None):
     notifiedFontError = False
+    fontResolver = getFontResolver(state)
     cx, cy = (0, circleCenterY)
     current_angle = start_angle_deg
 
@@ -90,26 +91,16 @@ def processParsedText(parsed_text, pdf, originalRadius, start_angle_deg, clockwi
         # Adjust font style based on <b> and <i> attributes. This reliance on a naming convention
         # is a bit weak, though there are only a few fonts / font families which do not follow it.
         # You can find those unconventional fonts by setting the config logger message level to info.
-        if is_bold and is_italic:
-            full_font = f"{font_name} Bold Italic"
-        elif is_bold:
-            full_font = f"{font_name} Bold"
-        elif is_italic:
-            full_font = f"{font_name} Italic"
-        else:
-            full_font = font_name
-
-        # Measure the character's width. This will fail with a KeyError if the
-        # font is missing, which it might be for unconventionally named fonts
-        try:
-            letter_width = pdfmetrics.stringWidth(char, full_font, font_size)
-        except KeyError:
-            fail_font = full_font
-            full_font = getMissingFontSubstitute(font_name, state) # honouring any configured font substitutions
-            if not notifiedFontError: # just one message per text art
-                logging.error(f"Unregistered font in TextArt: {fail_font}, font substitution: {full_font}")
-                notifiedFontError = True
-            letter_width = pdfmetrics.stringWidth(char, full_font, font_size)
+        # The face may be missing, which it might be for unconventionally named fonts,
+        # and is then substituted, honouring any configured font substitutions
+        full_font = fontResolver.getStyledFace(font_name, is_bold, is_italic)
+        if not notifiedFontError and full_font != getStyledFaceName(font_name, is_bold, is_italic):
+            logging.error(f"Unregistered font in TextArt: {getStyledFaceName(font_name, is_bold, is_italic)}, "
+                          f"font substitution: {full_font}")
+            notifiedFontError = True # just one message per text art
+
+        # Measure the character's width
+        letter_width = pdfmetrics.stringWidth(char, full_font, font_size)
 
         # Convert the letter width to an angular span (in degrees).  Legacy
         # TextArt follows a circle; CEWE 8 rectangle TextArt follows an
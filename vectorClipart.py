@@ -0,0 +1,117 @@
+"""Embedding clip art in the PDF as vector graphics.
+
+Clip art is SVG, but by default it is rasterised at the image resolution for
+every placement, so a full-page decoration becomes a large PNG.  With
+``vectorCliparts = True`` a clip art is converted once to ReportLab drawing
+operations, stored in the PDF as a form XObject, and each placement only
+refers to that form.  The output is then independent of the resolution.
+
+The conversion needs the optional svglib package.  SVG features which svglib
+does not render faithfully, such as filters and masks, are still rasterised.
+"""
+
+import hashlib
+import logging
+import os
+from io import BytesIO
+
+from lxml import etree
+from reportlab.graphics import renderPDF
+
+try:
+    from svglib.svglib import svg2rlg # the absence of svglib is handled so pylint: disable=import-error
+except ModuleNotFoundError:
+    svg2rlg = None
+
+# SVG elements, and presentation attributes referring to them, which make a
+# clip art fall back to rasterisation.
+UNSUPPORTED_SVG_ELEMENTS = frozenset(('filter', 'mask', 'pattern', 'foreignObject', 'switch'))
+UNSUPPORTED_SVG_ATTRIBUTES = ('filter', 'mask')
+
+
+def isVectorClipartAvailable():
+    """Return True if the optional svglib package can be used."""
+    return svg2rlg is not None
+
+
+def isSvgVectorSupported(svgData):
+    """Return True if nothing in *svgData* requires the clip art to be rasterised."""
+    try:
+        root = etree.fromstring(svgData, etree.XMLParser(resolve_entities=False, huge_tree=True))
+    except etree.XMLSyntaxError:
+        return False
+    for element in root.iter():
+        if not isinstance(element.tag, str):
+            continue
+        if etree.QName(element).localname in UNSUPPORTED_SVG_ELEMENTS:
+            return False
+        style = element.get('style', '')
+        for attribute in UNSUPPORTED_SVG_ATTRIBUTES:
+            if element.get(attribute) not in (None, 'none') or f'{attribute}:' in style.replace(' ', ''):
+                return False
+    return True
+
+
+def convertSvgToDrawing(svgData):
+    """Return a ReportLab Drawing for *svgData*, or None if it must be rasterised."""
+    if svg2rlg is None or not isSvgVectorSupported(svgData):
+        return None
+    try:
+        drawing = svg2rlg(BytesIO(svgData))
+    except Exception as ex: # pylint: disable=broad-exception-caught
+        logging.debug(f"Clip art cannot be converted to vector graphics: {ex}")
+        return None
+    if drawing is None or drawing.width <= 0 or drawing.height <= 0:
+        return None
+    return drawing
+
+
+class VectorClipartForms:
+    """The form XObjects of the clip art embedded as vectors in one PDF.
+
+    A clip art is identified by its file, modification time and colour
+    replacements.  Clip art which cannot be drawn as vectors is remembered
+    too, so it is only examined once.
+    """
+
+    def __init__(self):
+        self.forms_created = 0
+        self.placements = 0
+        self._forms = {}
+
+    def getForm(self, pdf, clipartPath, colorReplacements, loadSvgData, convert=convertSvgToDrawing):
+        """Return ``(formName, width, height)`` for a clip art, or None to rasterise it.
+
+        *loadSvgData* is called without arguments, only the first time the
+        clip art is needed, to return its colour-replaced SVG data.
+        """
+        clipartPath = os.path.abspath(clipartPath)
+        key = (clipartPath, os.stat(clipartPath).st_mtime_ns, tuple(colorReplacements))
+        if key in self._forms:
+            return self._forms[key]
+        form = None
+        svgData = loadSvgData()
+        drawing = convert(svgData) if svgData else None
+        if drawing is not None:
+            formName = f'clipart_{hashlib.sha1(svgData).hexdigest()}'
+            if not pdf.hasForm(formName):
+                pdf.beginForm(formName, 0, 0, drawing.width, drawing.height)
+                renderPDF.draw(drawing, pdf, 0, 0)
+                pdf.endForm()
+                self.forms_created += 1
+            form = (formName, drawing.width, drawing.height)
+        self._forms[key] = form
+        return form
+
+    def drawForm(self, pdf, form, width, height, flipX, flipY):
+        """Draw a form from getForm centred on the origin, at *width* x *height* points."""
+        formName, formWidth, formHeight = form
+        pdf.saveState()
+        pdf.scale((-1 if flipX else 1) * width / formWidth, (-1 if flipY else 1) * height / formHeight)
+        pdf.translate(-0.5 * formWidth, -0.5 * formHeight)
+        pdf.doForm(formName)
+        pdf.restoreState()
+        self.placements += 1
+
+    def summaryText(self):
+        return f'Vector clipart: {self.forms_created} forms, {self.placements} placements'
@@ -0,0 +1,150 @@
+"""Indexes of CEWE decoration XML files, kept between conversions.
+
+A CEWE installation delivers its cliparts and passepartouts as thousands of
+small XML files.  Finding them means walking large directory trees and
+parsing every file, which takes seconds in every conversion although the
+files rarely change.  An index stores the directory listings and what was
+read from each XML file in an SQLite database in the app data folder, see
+:mod:`sqliteStore`.  A later conversion only lists directories whose
+modification time changed and only parses XML files whose modification time
+or size changed.
+"""
+
+from abc import ABC, abstractmethod
+from fnmatch import fnmatch
+import json
+import os
+
+from sqliteStore import SqliteStore
+
+
+class XmlFileIndex(SqliteStore, ABC):
+    """Records read from XML files, found in stored directory listings.
+
+    A subclass implements :meth:`parseFile`, which returns a list of
+    JSON-compatible records for one file, or None if the file cannot be
+    read.  Unreadable files are not recorded, so they are tried, and
+    reported, again in the next conversion.
+
+    A subclass changes DATABASE_FORMAT when its records change meaning.
+    """
+
+    DESCRIPTION = 'XML file index'
+    TABLES = ('CREATE TABLE directories (path TEXT PRIMARY KEY, mtime_ns INTEGER, '
+              'subdirectories TEXT, xml_files TEXT)',
+              'CREATE TABLE xml_files (path TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER, records TEXT)')
+
+    def __init__(self, databasePath=None):
+        super().__init__(databasePath)
+        self.directories_listed = 0
+        self.files_parsed = 0
+        self.files_reused = 0
+
+    @abstractmethod
+    def parseFile(self, xmlFile):
+        """Return the records of one XML file, or None if it cannot be read."""
+
+    def walk(self, connection, root):
+        """Yield the .xml files below *root*, like os.walk but from stored listings.
+
+        Directories are visited in sorted order, parents before their
+        subdirectories.
+        """
+        pending = [os.path.abspath(root)]
+        while pending:
+            directory = pending.pop()
+            listing = self._listDirectory(connection, directory)
+            if listing is None:
+                continue
+            subdirectories, xmlFiles = listing
+            for xmlFile in xmlFiles:
+                yield os.path.join(directory, xmlFile)
+            pending.extend(os.path.join(directory, subdirectory) for subdirectory in reversed(subdirectories))
+
+    def glob(self, connection, root, *patterns):
+        """Yield the .xml files matching ``os.path.join(root, *patterns)``, like glob.glob.
+
+        Every pattern but the last matches a directory name; the last
+        matches the name of an .xml file.
+        """
+        directories = [os.path.abspath(root)]
+        for pattern in patterns[:-1]:
+            matchingDirectories = []
+            for directory in directories:
+                listing = self._listDirectory(connection, directory)
+                if listing is not None:
+                    matchingDirectories.extend(os.path.join(directory, subdirectory) for subdirectory in listing[0]
+                                               if fnmatch(subdirectory, pattern))
+            directories = matchingDirectories
+        for directory in directories:
+            listing = self._listDirectory(connection, directory)
+            if listing is not None:
+                yield from (os.path.join(directory, xmlFile) for xmlFile in listing[1]
+                            if fnmatch(xmlFile, patterns[-1]))
+
+    def getRecords(self, connection, xmlFile):
+        """Return the records of one XML file, parsing it only if it changed."""
+        xmlFile = os.path.abspath(xmlFile)
+        try:
+            stat = os.stat(xmlFile)
+        except OSError:
+            return []
+        row = connection.execute('SELECT mtime_ns, size, records FROM xml_files WHERE path = ?',
+                                 (xmlFile,)).fetchone()
+        if row is not None and row[:2] == (stat.st_mtime_ns, stat.st_size):
+            self.files_reused += 1
+            return json.loads(row[2])
+
+        self.files_parsed += 1
+        records = self.parseFile(xmlFile)
+        if records is None:
+            connection.execute('DELETE FROM xml_files WHERE path = ?', (xmlFile,))
+            return []
+        connection.execute('INSERT OR REPLACE INTO xml_files VALUES (?, ?, ?, ?)',
+                           (xmlFile, stat.st_mtime_ns, stat.st_size, json.dumps(records)))
+        return records
+
+    def _listDirectory(self, connection, directory):
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+        except OSError:
+            return None
+        row = connection.execute('SELECT mtime_ns, subdirectories, xml_files FROM directories WHERE path = ?',
+                                 (directory,)).fetchone()
+        if row is not None and row[0] == mtime:
+            return json.loads(row[1]), json.loads(row[2])
+
+        self.directories_listed += 1
+        subdirectories = []
+        xmlFiles = []
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir():
+                        subdirectories.append(entry.name)
+                    elif entry.name.endswith('.xml'):
+                        xmlFiles.append(entry.name)
+        except OSError:
+            return None
+        subdirectories.sort()
+        xmlFiles.sort()
+        if row is not None:
+            for subdirectory in set(json.loads(row[1])) - set(subdirectories):
+                self._forgetDirectory(connection, os.path.join(directory, subdirectory))
+            for xmlFile in set(json.loads(row[2])) - set(xmlFiles):
+                connection.execute('DELETE FROM xml_files WHERE path = ?', (os.path.join(directory, xmlFile),))
+        connection.execute('INSERT OR REPLACE INTO directories VALUES (?, ?, ?, ?)',
+                           (directory, mtime, json.dumps(subdirectories), json.dumps(xmlFiles)))
+        return subdirectories, xmlFiles
+
+    @staticmethod
+    def _forgetDirectory(connection, directory):
+        prefix = directory + os.sep
+        for table in ('directories', 'xml_files'):
+            connection.execute(f'DELETE FROM {table} WHERE path = ? OR substr(path, 1, ?) = ?',
+                               (directory, len(prefix), prefix))
+
+    def summaryText(self):
+        location = self.database_path if self.database_path is not None else 'memory'
+        return (f'{self.directories_listed} directories listed, {self.files_parsed} XML files parsed, '
+                f'{self.files_reused} reused, index in {location}')